@@ -9,6 +9,7 @@ class Airport(object):
         self.city = city
         self.state = state
         self.centerLatLon = LatLon(lat, lon)
+        self.nVector = self.centerLatLon.toVector()  # Precomputed for distance calculations
         self.alt = alt
         self.runways = []
     # end def __init__()
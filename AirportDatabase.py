@@ -0,0 +1,281 @@
+#!/usr/bin/env python
+
+import csv
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import numpy as np
+from Airport import Airport
+from AirportIndex import AirportIndex, KDTree
+from LatLon import LatLon
+from Runway import Runway
+
+
+logger = logging.getLogger(__name__)
+
+AIRPORTS_CSV = 'data/Airports.csv'
+RUNWAYS_CSV = 'data/AirportsDetailed.csv'
+COMPILED_DIR = 'data/compiled'
+FORMAT_VERSION = 3  # Bump whenever the layout of the compiled arrays changes
+
+MANIFEST_FILE = 'manifest.json'
+AIRPORTS_FILE = 'airports.npy'
+RUNWAYS_FILE = 'runways.npy'
+LATLON_TREE_FILE = 'latlon_tree.npy'
+LATLON_ORDER_FILE = 'latlon_order.npy'
+VECTOR_TREE_FILE = 'vector_tree.npy'
+VECTOR_ORDER_FILE = 'vector_order.npy'
+
+
+class AirportDatabase(object):
+    '''
+    Read-only airport/runway database backed by NumPy arrays that are compiled from
+        data/Airports.csv and data/AirportsDetailed.csv and memory-mapped at startup.
+
+    The arrays, including the k-d trees of the AirportIndex built over them, are
+        memory-mapped and queried in place, so loading takes a few milliseconds and
+        every process that loads the database shares the same pages instead of holding
+        its own copy. Airport and Runway objects are only created for the airports
+        that are actually looked up.
+
+    Behaves like the airport code -> Airport dictionary loadAirportData used to build.
+    '''
+
+    def __init__(self, directory=COMPILED_DIR):
+        self.directory = directory
+        self.airportRows = self.mmap(AIRPORTS_FILE)
+        self.runwayRows = self.mmap(RUNWAYS_FILE)
+
+        self.materialized = {}  # position -> Airport
+        self.positions = None  # code -> position, built on the first lookup by code
+
+        self.index = AirportIndex(
+            AirportList(self),
+            self.airportRows['lat'],
+            self.airportRows['lon'],
+            self.airportRows['alt'],
+            latLonTree=KDTree(self.mmap(LATLON_TREE_FILE), self.mmap(LATLON_ORDER_FILE), metric='l1'),
+            vectorTree=KDTree(self.mmap(VECTOR_TREE_FILE), self.mmap(VECTOR_ORDER_FILE), metric='euclidean')
+        )
+    # end def __init__()
+
+    def mmap(self, filename):
+        return np.load(os.path.join(self.directory, filename), mmap_mode='r')
+    # end def mmap()
+
+    @classmethod
+    def load(cls, airportsCsv=AIRPORTS_CSV, runwaysCsv=RUNWAYS_CSV, directory=COMPILED_DIR):
+        '''
+        Loads the compiled database, compiling it first if it is missing or the CSVs changed.
+        @return: the AirportDatabase
+        '''
+        if not isCurrent(airportsCsv, runwaysCsv, directory):
+            logger.info("Compiling airport database into %s", directory)
+            compileDatabase(airportsCsv, runwaysCsv, directory)
+        return cls(directory)
+    # end def load()
+
+    def airportAt(self, position):
+        '''
+        @return: the Airport (with its runways) stored at the given position
+        '''
+        airport = self.materialized.get(position)
+        if airport is None:
+            row = self.airportRows[position]
+            airport = Airport(
+                row['code'], row['name'], row['city'], row['state'],
+                float(row['lat']), float(row['lon']), float(row['alt'])
+            )
+            start = int(row['runwayStart'])
+            for r in self.runwayRows[start:start + int(row['runwayCount'])]:
+                airport.addRunway(Runway(
+                    r['airportCode'], float(r['alt']), r['runwayCode'],
+                    float(r['magHeading']), float(r['trueHeading']), float(r['lat']), float(r['lon']),
+                    corners=[LatLon(float(lat), float(lon)) for lat, lon in r['corners']]
+                ))
+            self.materialized[position] = airport
+        return airport
+    # end def airportAt()
+
+    def __len__(self):
+        return len(self.airportRows)
+    # end def __len__()
+
+    def __getitem__(self, code):
+        if self.positions is None:
+            self.positions = dict((c, i) for i, c in enumerate(self.airportRows['code'].tolist()))
+        return self.airportAt(self.positions[code])
+    # end def __getitem__()
+
+    def __contains__(self, code):
+        try:
+            self[code]
+        except KeyError:
+            return False
+        return True
+    # end def __contains__()
+
+    def values(self):
+        return [self.airportAt(i) for i in xrange(len(self))]
+    # end def values()
+
+    def iteritems(self):
+        for i in xrange(len(self)):
+            airport = self.airportAt(i)
+            yield airport.code, airport
+    # end def iteritems()
+
+# end class AirportDatabase
+
+
+class AirportList(object):
+    '''
+    Sequence view of an AirportDatabase by position, as used by AirportIndex.
+    '''
+
+    def __init__(self, database):
+        self.database = database
+    # end def __init__()
+
+    def __len__(self):
+        return len(self.database)
+    # end def __len__()
+
+    def __getitem__(self, position):
+        return self.database.airportAt(position)
+    # end def __getitem__()
+
+# end class AirportList
+
+
+def fileHash(path):
+    with open(path, 'rb') as infile:
+        return hashlib.sha1(infile.read()).hexdigest()
+# end def fileHash()
+
+
+def isCurrent(airportsCsv, runwaysCsv, directory):
+    '''
+    @return: whether directory holds a database compiled from the current contents of the CSVs
+    '''
+    try:
+        with open(os.path.join(directory, MANIFEST_FILE), 'r') as infile:
+            manifest = json.load(infile)
+    except (IOError, ValueError):
+        return False
+
+    return manifest.get('version') == FORMAT_VERSION and \
+        manifest.get('leafSize') == KDTree.LEAF_SIZE and \
+        manifest.get('airports') == fileHash(airportsCsv) and \
+        manifest.get('runways') == fileHash(runwaysCsv)
+# end def isCurrent()
+
+
+def compileDatabase(airportsCsv=AIRPORTS_CSV, runwaysCsv=RUNWAYS_CSV, directory=COMPILED_DIR):
+    '''
+    Parses the airport and runway CSVs and writes the compiled arrays into directory.
+    The new files are written to a temporary directory first and moved into place once complete.
+    '''
+    with open(airportsCsv, 'rb') as infile:
+        reader = csv.reader(infile)
+        reader.next()  # Trash line of data headers
+        # Later rows replace earlier ones with the same code, and positions follow
+        # the dictionary's iteration order, exactly like the dictionary the CSV was
+        # originally loaded into; nearest airport ties keep resolving the same way.
+        airportsByCode = {}
+        for row in reader:
+            airportsByCode[row[0]] = row
+    codes = airportsByCode.keys()
+    positions = dict((code, i) for i, code in enumerate(codes))
+
+    runwaysByAirport = [[] for _ in codes]
+    with open(runwaysCsv, 'rb') as infile:
+        reader = csv.reader(infile)
+        reader.next()  # Trash line of data headers
+        for row in reader:
+            runwaysByAirport[positions[row[2]]].append(row)
+
+    airportRows = [airportsByCode[code] for code in codes]
+    runwayRows = [row for runways in runwaysByAirport for row in runways]
+
+    airportDtype = [
+        ('code', stringType(airportRows, 0)),
+        ('name', stringType(airportRows, 1)),
+        ('city', stringType(airportRows, 2)),
+        ('state', stringType(airportRows, 3)),
+        ('lat', np.float64),
+        ('lon', np.float64),
+        ('alt', np.float64),
+        ('runwayStart', np.int32),
+        ('runwayCount', np.int32),
+    ]
+    runwayDtype = [
+        ('airportCode', stringType(runwayRows, 2)),
+        ('runwayCode', stringType(runwayRows, 10)),
+        ('alt', np.float64),
+        ('magHeading', np.float64),
+        ('trueHeading', np.float64),
+        ('lat', np.float64),
+        ('lon', np.float64),
+        ('corners', np.float64, (4, 2)),  # (lat, lon) of the Nw, Ne, Se and Sw corners
+    ]
+
+    airports = np.zeros(len(airportRows), dtype=airportDtype)
+    start = 0
+    for i, row in enumerate(airportRows):
+        #                code,   name,   city,  state,      latitude,     longitude,      altitude
+        airports[i] = (row[0], row[1], row[2], row[3], float(row[4]), float(row[5]), float(row[6]),
+                       start, len(runwaysByAirport[i]))
+        start += len(runwaysByAirport[i])
+
+    runways = np.zeros(len(runwayRows), dtype=runwayDtype)
+    for i, row in enumerate(runwayRows):
+        #       airportCode, runwayCode,           TDZE,         magHdg,        trueHdg,      centerLat,      centerLon
+        runways[i] = (row[2], row[10], float(row[13]), float(row[11]), float(row[12]), float(row[25]), float(row[26]),
+                      # (lat, lon) of the Nw, Ne, Se and Sw corners
+                      [[float(row[k]), float(row[k + 1])] for k in (17, 19, 23, 21)])
+
+    index = AirportIndex(None, airports['lat'], airports['lon'], airports['alt'])
+
+    parent = os.path.dirname(os.path.abspath(directory))
+    staging = tempfile.mkdtemp(prefix='.compiling-', dir=parent)
+    try:
+        os.chmod(staging, 0o755)
+        np.save(os.path.join(staging, AIRPORTS_FILE), airports)
+        np.save(os.path.join(staging, RUNWAYS_FILE), runways)
+        np.save(os.path.join(staging, LATLON_TREE_FILE), index.latLonTree.coordinates)
+        np.save(os.path.join(staging, LATLON_ORDER_FILE), index.latLonTree.order)
+        np.save(os.path.join(staging, VECTOR_TREE_FILE), index.vectorTree.coordinates)
+        np.save(os.path.join(staging, VECTOR_ORDER_FILE), index.vectorTree.order)
+        with open(os.path.join(staging, MANIFEST_FILE), 'w') as outfile:
+            json.dump({
+                'version': FORMAT_VERSION,
+                'leafSize': KDTree.LEAF_SIZE,
+                'airports': fileHash(airportsCsv),
+                'runways': fileHash(runwaysCsv),
+            }, outfile)
+
+        if os.path.isdir(directory):
+            shutil.rmtree(directory)
+        os.rename(staging, directory)
+    except:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+# end def compileDatabase()
+
+
+def stringType(rows, column):
+    return 'S%d' % max([1] + [len(row[column]) for row in rows])
+# end def stringType()
+
+
+'''
+Running this module directly (re)compiles the airport database, e.g. as a deployment build step.
+'''
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    compileDatabase()
+    logger.info("Compiled %s and %s into %s", AIRPORTS_CSV, RUNWAYS_CSV, COMPILED_DIR)
@@ -0,0 +1,496 @@
+import math
+import numpy as np
+import LatLonArray
+
+
+class KDTree(object):
+    '''
+    Static k-d tree over a fixed set of points.
+
+    The tree is stored implicitly in two arrays: self.order is a permutation of the
+        point indices and self.coordinates holds the points' coordinates in that order.
+        The median m of every sub-range [lo, hi) is the splitting node of that
+        sub-range and [lo, m) and [m + 1, hi) are its children; ranges of at most
+        LEAF_SIZE points are leaves, which are scanned with whole-array operations.
+
+    Nothing but these two arrays is read by a query, so they can be memory-mapped and
+        shared between processes without any per-process copy.
+
+    Ties between equally distant points are always broken in favour of the lowest
+        original index, so a query returns exactly what a linear scan that only
+        replaces its best match on a strictly smaller distance would return.
+    '''
+
+    LEAF_SIZE = 64
+
+    def __init__(self, coordinates, order, metric='l1'):
+        '''
+        @param: coordinates k x n array of the points' coordinates, in tree order
+        @param: order array of the points' original indices, in tree order
+        @param: metric 'l1' (sum of absolute differences) or 'euclidean'
+        '''
+        if metric not in ('l1', 'euclidean'):
+            raise ValueError("Unknown k-d tree metric: %s" % metric)
+        self.metric = metric
+        # Plain ndarray views, since slicing a np.memmap is several times slower
+        self.coordinates = np.asarray(coordinates)
+        self.order = np.asarray(order)
+        self.dimensions = len(coordinates)
+        self.size = len(order)
+        self.axes = [self.coordinates[axis] for axis in xrange(self.dimensions)]
+    # end def __init__()
+
+    @classmethod
+    def build(cls, points, metric='l1'):
+        '''
+        Builds the tree by recursively sorting each sub-range on the splitting axis of its depth.
+        @param: points k x n array of the points' coordinates, in their original order
+        @return: the KDTree
+        '''
+        axes = [np.asarray(coordinate, dtype=np.float64).tolist() for coordinate in points]
+        order = range(len(axes[0]) if len(axes) > 0 else 0)
+
+        def partition(lo, hi, depth):
+            if hi - lo <= cls.LEAF_SIZE:
+                return
+            axis = axes[depth % len(axes)]
+            order[lo:hi] = sorted(order[lo:hi], key=lambda idx: (axis[idx], idx))
+            mid = (lo + hi) >> 1
+            partition(lo, mid, depth + 1)
+            partition(mid + 1, hi, depth + 1)
+        # end def partition()
+
+        partition(0, len(order), 0)
+        order = np.array(order, dtype=np.int32)
+        coordinates = np.array([np.asarray(axis)[order] for axis in axes], dtype=np.float64)
+        return cls(coordinates, order, metric)
+    # end def build()
+
+    def nearest(self, query):
+        '''
+        Finds the point closest to query under the tree's metric.
+        @param: query a coordinate tuple with the same dimensions as the tree's points
+        @return: (distance, index) where index is the point's position in the original list
+            (for the euclidean metric, the distance is squared)
+        '''
+        best = [float('inf'), -1]
+        if self.size > 0:
+            self.search(query, 0, self.size, 0, best)
+        return best[0], best[1]
+    # end def nearest()
+
+    def search(self, query, lo, hi, depth, best):
+        if hi - lo <= self.LEAF_SIZE:
+            self.scanLeaf(query, lo, hi, best)
+            return
+
+        mid = (lo + hi) >> 1
+        axis = depth % self.dimensions
+        diff = query[axis] - float(self.axes[axis][mid])
+        gap = abs(diff) if self.metric == 'l1' else diff * diff
+
+        self.consider(query, mid, best)
+        if diff < 0:
+            self.search(query, lo, mid, depth + 1, best)
+            if gap <= best[0]:
+                self.search(query, mid + 1, hi, depth + 1, best)
+        else:
+            self.search(query, mid + 1, hi, depth + 1, best)
+            if gap <= best[0]:
+                self.search(query, lo, mid, depth + 1, best)
+    # end def search()
+
+    def scanLeaf(self, query, lo, hi, best):
+        distances = self.distances(query, lo, hi)
+        closest = float(distances.min())
+        if closest > best[0]:
+            return
+        idx = int(self.order[lo:hi][distances == closest].min())
+        if closest < best[0] or idx < best[1]:
+            best[0] = closest
+            best[1] = idx
+    # end def scanLeaf()
+
+    def consider(self, query, m, best):
+        d = 0
+        for axis in xrange(self.dimensions):
+            diff = float(self.axes[axis][m]) - query[axis]
+            d += abs(diff) if self.metric == 'l1' else diff * diff
+        idx = int(self.order[m])
+        if d < best[0] or (d == best[0] and idx < best[1]):
+            best[0] = d
+            best[1] = idx
+    # end def consider()
+
+    def distances(self, query, lo, hi):
+        '''
+        @return: array of the distances from query to the points in tree positions [lo, hi)
+        '''
+        total = None
+        for axis in xrange(self.dimensions):
+            diff = self.axes[axis][lo:hi] - query[axis]
+            term = np.abs(diff) if self.metric == 'l1' else diff * diff
+            total = term if total is None else total + term
+        return total
+    # end def distances()
+
+    def withinBox(self, lower, upper):
+        '''
+        Finds every point inside the axis-aligned box [lower, upper] (bounds inclusive).
+        @param: lower coordinate tuple of the box's lower corner
+        @param: upper coordinate tuple of the box's upper corner
+        @return: array of the original indices of the points in the box, in ascending order
+        '''
+        found = []
+        if self.size > 0:
+            self.collect(lower, upper, 0, self.size, 0, found)
+        if len(found) == 0:
+            return np.empty(0, dtype=np.intp)
+        return np.sort(np.concatenate(found)).astype(np.intp)
+    # end def withinBox()
+
+    def collect(self, lower, upper, lo, hi, depth, found):
+        if hi - lo <= self.LEAF_SIZE:
+            self.collectRange(lower, upper, lo, hi, found)
+            return
+
+        mid = (lo + hi) >> 1
+        axis = depth % self.dimensions
+        split = float(self.axes[axis][mid])
+
+        self.collectRange(lower, upper, mid, mid + 1, found)
+        if lower[axis] <= split:
+            self.collect(lower, upper, lo, mid, depth + 1, found)
+        if upper[axis] >= split:
+            self.collect(lower, upper, mid + 1, hi, depth + 1, found)
+    # end def collect()
+
+    def collectRange(self, lower, upper, lo, hi, found):
+        inside = np.ones(hi - lo, dtype=bool)
+        for axis in xrange(self.dimensions):
+            coordinate = self.axes[axis][lo:hi]
+            inside &= (coordinate >= lower[axis]) & (coordinate <= upper[axis])
+        found.append(self.order[lo:hi][inside])
+    # end def collectRange()
+
+# end class KDTree
+
+
+class CeilingGrid(object):
+    '''
+    Coarse lat/lon grid that holds, for every cell, the highest elevation of the airports
+        within reach of any point in the cell, so that a sample too high above that to be
+        on an approach to any of them can be ruled out without finding its nearest airport.
+
+    Every airport is entered into all the cells overlapped by the bounding box of the
+        spherical cap of radius reach around it, which spans reach of latitude and
+        asin(sin(reach) / cos(lat)) of longitude either way (both grown by a little, so
+        rounding can only ever add cells). Cells are CELL_DEGREES on a side, wrap around
+        in longitude and are stored sparsely, as sorted keys searched with np.searchsorted
+        for single points and arrays of them alike.
+    '''
+
+    CELL_DEGREES = 0.1
+    LON_CELLS = 3600  # 360 / CELL_DEGREES
+    SAFETY = 1.001  # Growth of every airport's bounding box
+
+    def __init__(self, lats, lons, alts, reach):
+        '''
+        @param: lats latitudes of the airports
+        @param: lons longitudes of the airports
+        @param: alts elevations of the airports, in the same order
+        @param: reach the distance of an airport that still counts, in radians
+        '''
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        alts = np.asarray(alts, dtype=np.float64)
+
+        dLat = np.degrees(reach) * self.SAFETY
+        ratio = np.sin(reach) / np.maximum(np.cos(np.radians(np.minimum(np.abs(lats) + dLat, 90.0))), 1e-12)
+        dLon = np.where(ratio < 1, np.degrees(np.arcsin(np.minimum(ratio, 1.0))) * self.SAFETY, 180.0)
+
+        lat0, lat1 = self.cell(lats - dLat), self.cell(lats + dLat)
+        lon0, lon1 = self.cell(lons - dLon), np.minimum(self.cell(lons + dLon), self.cell(lons - dLon) + self.LON_CELLS - 1)
+
+        keys, highest = [], []
+        for dy in xrange(int((lat1 - lat0).max()) + 1 if len(lats) > 0 else 0):
+            for dx in xrange(int((lon1 - lon0).max()) + 1):
+                inside = (lat0 + dy <= lat1) & (lon0 + dx <= lon1)
+                keys.append(self.key(lat0[inside] + dy, lon0[inside] + dx))
+                highest.append(alts[inside])
+        # end for
+
+        if len(keys) > 0:
+            keys, highest = np.concatenate(keys), np.concatenate(highest)
+        self.keys, inverse = np.unique(np.asarray(keys, dtype=np.int64), return_inverse=True)
+        self.highest = np.full(len(self.keys), -np.inf)
+        np.maximum.at(self.highest, inverse, np.asarray(highest, dtype=np.float64))
+    # end def __init__()
+
+    def cell(self, degrees):
+        return np.floor(degrees / self.CELL_DEGREES).astype(np.int64)
+    # end def cell()
+
+    def key(self, latCell, lonCell):
+        return (latCell + self.LON_CELLS) * self.LON_CELLS + lonCell % self.LON_CELLS
+    # end def key()
+
+    def highestAt(self, lat, lon):
+        '''
+        @return: the highest elevation of the airports within reach of the point, -inf if there is none
+        '''
+        key = self.key(int(math.floor(lat / self.CELL_DEGREES)), int(math.floor(lon / self.CELL_DEGREES)))
+        position = int(self.keys.searchsorted(key))
+        if position < len(self.keys) and self.keys.item(position) == key:
+            return self.highest.item(position)
+        return -np.inf
+    # end def highestAt()
+
+    def highestMany(self, lats, lons):
+        '''
+        Vectorized form of highestAt() for arrays of points.
+        @return: array of the highest elevation of the airports within reach of every point
+        '''
+        keys = self.key(self.cell(np.asarray(lats, dtype=np.float64)), self.cell(np.asarray(lons, dtype=np.float64)))
+        if len(self.keys) == 0:
+            return np.full(len(keys), -np.inf)
+        positions = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        return np.where(self.keys[positions] == keys, self.highest[positions], -np.inf)
+    # end def highestMany()
+
+# end class CeilingGrid
+
+
+class AirportIndex(object):
+    '''
+    Spatial index over the airports loaded by loadAirportData.
+
+    Two nearest-airport queries are supported, both in sub-linear time:
+        - the default mode reproduces FlightAnalyzer's original heuristic, which picks
+          the airport with the smallest |dLat| + |dLon|, using a 2-d tree over lat/lon
+        - the great circle mode returns the airport with the smallest true distance,
+          using a 3-d tree over the airports' n-vectors (the straight-line distance
+          between two n-vectors grows monotonically with the great circle distance)
+    '''
+
+    def __init__(self, airports, lats, lons, alts, latLonTree=None, vectorTree=None, positions=None):
+        '''
+        @param: airports sequence of Airport objects, indexed by position
+        @param: lats latitudes of the airports, in the same order
+        @param: lons longitudes of the airports, in the same order
+        @param: alts elevations of the airports, in the same order
+        @param: latLonTree, vectorTree previously built k-d trees to use instead of building them
+        @param: positions array of the positions in airports of the points indexed, if only some of them are, see around()
+        '''
+        self.airports = airports
+
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.lons = np.asarray(lons, dtype=np.float64)
+        self.alts = np.asarray(alts, dtype=np.float64)
+        self.positions = np.arange(len(self.lats)) if positions is None else positions
+
+        self.latLonTree = KDTree.build([self.lats, self.lons], metric='l1') if latLonTree is None else latLonTree
+
+        # Only built once the first great circle query needs it
+        self._vectorTree = vectorTree
+        self.ceilingGrids = {}  # reach -> CeilingGrid, built on first use
+    # end def __init__()
+
+    @property
+    def vectorTree(self):
+        if self._vectorTree is None:
+            self._vectorTree = KDTree.build(LatLonArray.toVectors(self.lats, self.lons), metric='euclidean')
+        return self._vectorTree
+    # end def vectorTree()
+
+    def ceilingGrid(self, reach):
+        '''
+        @param: reach the distance of an airport that still counts, in radians
+        @return: the CeilingGrid of the highest airport within reach of every point
+        '''
+        grid = self.ceilingGrids.get(reach)
+        if grid is None:
+            grid = self.ceilingGrids[reach] = CeilingGrid(self.lats, self.lons, self.alts, reach)
+        return grid
+    # end def ceilingGrid()
+
+    @classmethod
+    def fromDict(cls, airports):
+        '''
+        Builds the index over a dictionary of airport code -> Airport.
+        '''
+        # Keep the dictionary's iteration order so that ties resolve to the
+        # same airport a linear scan over airports.iteritems() would pick
+        airportList = airports.values()
+        return cls(
+            airportList,
+            [a.centerLatLon.lat for a in airportList],
+            [a.centerLatLon.lon for a in airportList],
+            [a.alt for a in airportList]
+        )
+    # end def fromDict()
+
+    def __len__(self):
+        return len(self.lats)
+    # end def __len__()
+
+    def around(self, lats, lons, maxFraction=0.5):
+        '''
+        Builds the index over only the airports that can be the nearest() (|dLat| + |dLon| mode)
+            of a point inside the bounding box of the passed in points, e.g. a flight's trajectory.
+
+        Any point of the box is at most half its height plus half its width from the box's
+            center, so its nearest airport is at most that plus the center's own nearest
+            distance away, in either coordinate. The airports inside the box grown by that
+            margin are kept in their original order, so ties resolve to the same airport
+            as they do in the whole index.
+        @param: lats array of latitudes
+        @param: lons array of longitudes
+        @param: maxFraction largest share of the airports worth building a subset for
+        @return: the AirportIndex of those airports, which shares this index's airports, or
+            this index itself if there are more of them than maxFraction
+        '''
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        if len(lats) == 0 or len(self) == 0:
+            return self
+
+        latMin, latMax = lats.min(), lats.max()
+        lonMin, lonMax = lons.min(), lons.max()
+        d0, _ = self.latLonTree.nearest(((latMin + latMax) / 2, (lonMin + lonMax) / 2))
+        margin = d0 + (latMax - latMin) / 2 + (lonMax - lonMin) / 2 + 1e-9
+
+        subset = self.latLonTree.withinBox((latMin - margin, lonMin - margin), (latMax + margin, lonMax + margin))
+        if len(subset) > maxFraction * len(self):
+            return self
+        return AirportIndex(
+            self.airports, self.lats[subset], self.lons[subset], self.alts[subset], positions=self.positions[subset]
+        )
+    # end def around()
+
+    def nearest(self, point, greatCircle=False):
+        '''
+        Finds the airport closest to the passed in point.
+        @param: point the LatLon to search around
+        @param: greatCircle use the true great circle distance instead of |dLat| + |dLon|
+        @return: the closest Airport, or None if the index is empty
+        '''
+        position = self.nearestPosition(point, greatCircle)
+        return None if position < 0 else self.airports[position]
+    # end def nearest()
+
+    def nearestPosition(self, point, greatCircle=False):
+        '''
+        @return: the position in self.airports of the airport closest to the passed in point, see nearest(),
+            or -1 if the index is empty
+        '''
+        if greatCircle:
+            v = point.toVector()
+            _, idx = self.vectorTree.nearest((v.x, v.y, v.z))
+        else:
+            _, idx = self.latLonTree.nearest((point.lat, point.lon))
+        return -1 if idx < 0 else int(self.positions[idx])
+    # end def nearestPosition()
+
+    def distanceToNearest(self, point):
+        '''
+        @param: point the LatLon to measure from
+        @return: the great circle distance from the point to the closest airport, in radians (inf if the index is empty)
+        '''
+        v = point.toVector()
+        squared, _ = self.vectorTree.nearest((v.x, v.y, v.z))
+        # The squared length of the chord between the two n-vectors
+        return 2 * math.asin(min(1.0, math.sqrt(squared) / 2)) if squared != float('inf') else squared
+    # end def distanceToNearest()
+
+    def distancesToNearest(self, vectors, chunkSize=128):
+        '''
+        Vectorized form of distanceToNearest() for arrays of points.
+
+        Points are handled in chunks like in nearestPoints(), in n-vector space: the chord
+            to the first point's closest airport, plus the chunk's extent along every axis,
+            bounds the chord to any other point's closest airport.
+        @param: vectors 3 x n array of the points' n-vectors
+        @return: array of the great circle distances from every point to the closest airport, in radians
+        '''
+        result = np.full(vectors.shape[1], np.inf)
+        if len(self) == 0:
+            return result
+
+        for lo in xrange(0, vectors.shape[1], chunkSize):
+            hi = min(lo + chunkSize, vectors.shape[1])
+            chunk = vectors[:, lo:hi]
+            lower, upper = chunk.min(axis=1), chunk.max(axis=1)
+
+            squared, _ = self.vectorTree.nearest(tuple(chunk[:, 0].tolist()))
+            radius = math.sqrt(squared) + (upper - lower).sum() + 1e-9
+
+            candidates = self.vectorTree.withinBox(tuple(lower - radius), tuple(upper + radius))
+            airportVectors = LatLonArray.toVectors(self.lats[candidates], self.lons[candidates])
+
+            # Summed in the same order as KDTree.distances(), so the minimums are the same numbers
+            total = None
+            for axis in xrange(3):
+                diff = airportVectors[axis] - chunk[axis][:, np.newaxis]
+                total = diff * diff if total is None else total + diff * diff
+            result[lo:hi] = total.min(axis=1)
+        # end for
+
+        # The squared lengths of the chords between the n-vectors
+        return 2 * np.arcsin(np.minimum(1.0, np.sqrt(result) / 2))
+    # end def distancesToNearest()
+
+    def nearestMany(self, lats, lons, chunkSize=128):
+        '''
+        Vectorized form of nearest() (|dLat| + |dLon| mode) for arrays of points.
+
+        Points are handled in chunks of consecutive samples. For each chunk the
+            nearest airport of its first point bounds how far away any other point's
+            nearest airport can be, so only the airports inside the chunk's bounding
+            box grown by that bound are compared against the whole chunk at once.
+        @param: lats array of latitudes
+        @param: lons array of longitudes
+        @return: array with, for every point, the position in self.airports of its nearest airport
+        '''
+        return self.positions[self.nearestPoints(lats, lons, chunkSize)]
+    # end def nearestMany()
+
+    def nearestPoints(self, lats, lons, chunkSize=128):
+        '''
+        @return: array with, for every point, the position of its nearest airport among the points indexed
+        '''
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        result = np.empty(len(lats), dtype=np.intp)
+
+        for lo in xrange(0, len(lats), chunkSize):
+            hi = min(lo + chunkSize, len(lats))
+            chunkLats = lats[lo:hi]
+            chunkLons = lons[lo:hi]
+
+            latMin, latMax = chunkLats.min(), chunkLats.max()
+            lonMin, lonMax = chunkLons.min(), chunkLons.max()
+
+            # Every point is at most (latMax - latMin) + (lonMax - lonMin) from the
+            # first point, so its nearest airport is at most that plus d0 away.
+            # The small slack absorbs rounding in the bound itself.
+            d0, _ = self.latLonTree.nearest((chunkLats[0], chunkLons[0]))
+            radius = d0 + (latMax - latMin) + (lonMax - lonMin) + 1e-9
+
+            candidates = self.latLonTree.withinBox(
+                (latMin - radius, lonMin - radius),
+                (latMax + radius, lonMax + radius)
+            )
+
+            differences = np.abs(self.lats[candidates] - chunkLats[:, np.newaxis]) + \
+                np.abs(self.lons[candidates] - chunkLons[:, np.newaxis])
+
+            # argmin returns the first of equal minimums and candidates are in
+            # ascending order, so ties resolve exactly like nearest() does
+            result[lo:hi] = candidates[np.argmin(differences, axis=1)]
+        # end for
+
+        return result
+    # end def nearestPoints()
+
+# end class AirportIndex
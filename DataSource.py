@@ -0,0 +1,598 @@
+#!/usr/bin/env python
+
+import contextlib
+import logging
+import sqlite3
+import sys
+import numpy as np
+from FlightColumns import FlightColumns
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SOURCE = 'mysql:dev'
+
+""" SQL STATEMENTS """
+fetchFlightIDsSQL = "SELECT flight_id FROM flight_analyses WHERE approach_analysis = 0;"
+fetchFlightSizesSQL = "SELECT flight, COUNT(*) AS row_count FROM main WHERE flight IN (%s) GROUP BY flight;"
+fetchAircraftTypesSQL = "SELECT id, aircraft_type FROM flight_id WHERE id IN (%s);"
+fetchFlightsDataSQL = '''
+    SELECT
+        flight, time, msl_altitude, indicated_airspeed, vertical_airspeed, heading, latitude, longitude, pitch_attitude, eng_1_rpm
+    FROM
+        main
+    WHERE
+        flight IN (%s)
+    ORDER BY flight ASC, time ASC;
+'''
+fetchNewFlightsDataSQL = '''
+    SELECT
+        flight, time, msl_altitude, indicated_airspeed, vertical_airspeed, heading, latitude, longitude, pitch_attitude, eng_1_rpm
+    FROM
+        main
+    WHERE
+        %s
+    ORDER BY flight ASC, time ASC;
+'''
+fetchSampleCountsSQL = "SELECT flight, COUNT(*) FROM main WHERE (%s) AND %s GROUP BY flight;"
+selectThresholdsSQL = "SELECT * FROM exceedance_thresholds WHERE aircraft_id = %s;"
+selectAllThresholdsSQL = "SELECT * FROM exceedance_thresholds ORDER BY aircraft_id;"
+selectThresholdsStampSQL = "SELECT COUNT(*), SUM(aircraft_id), %s FROM exceedance_thresholds;"
+
+insertKeysList = [
+    "flight_id", "approach_id", "airport_id", "runway_id",
+    "approach_start", "approach_end", "landing_start", "landing_end", "landing_type",
+    "unstable", "all_heading", "f1_heading", "all_crosstrack", "f2_crosstrack", "all_ias", "a_ias", "all_vsi", "s_vsi"
+]
+insertKeysSQL = ', '.join(insertKeysList)
+insertUpdateValuesSQL = ', '.join(["{0}=VALUES({0})".format(key) for key in insertKeysList])
+insertValuesPlaceholders = '(%s)' % ', '.join(["%s"] * len(insertKeysList))
+updateAnalysesSQL = "UPDATE flight_analyses SET approach_analysis = 1 WHERE flight_id IN (%s);"
+
+FLIGHT_DATA_COLUMNS = [
+    'flight', 'time', 'msl_altitude', 'indicated_airspeed', 'vertical_airspeed', 'heading', 'latitude', 'longitude', 'pitch_attitude', 'eng_1_rpm'
+]
+STREAM_BATCH = 10000  # Rows taken from a streaming cursor at a time
+SIZE_QUERY_BATCH = 1000  # Flight IDs per row count query
+
+""" SCHEMA OF THE TABLES THE ANALYSIS USES, FOR SQLITE """
+SQLITE_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS main (
+        flight INTEGER NOT NULL,
+        time REAL,
+        msl_altitude REAL,
+        indicated_airspeed REAL,
+        vertical_airspeed REAL,
+        heading REAL,
+        latitude REAL,
+        longitude REAL,
+        pitch_attitude REAL,
+        eng_1_rpm REAL
+    );
+    CREATE INDEX IF NOT EXISTS main_flight_time ON main (flight, time);
+
+    CREATE TABLE IF NOT EXISTS flight_id (
+        id INTEGER PRIMARY KEY,
+        aircraft_type INTEGER
+    );
+
+    CREATE TABLE IF NOT EXISTS flight_analyses (
+        flight_id INTEGER PRIMARY KEY,
+        approach_analysis INTEGER NOT NULL DEFAULT 0
+    );
+
+    CREATE TABLE IF NOT EXISTS approaches (
+        flight_id INTEGER NOT NULL,
+        approach_id INTEGER NOT NULL,
+        airport_id TEXT,
+        runway_id TEXT,
+        approach_start INTEGER,
+        approach_end INTEGER,
+        landing_start INTEGER,
+        landing_end INTEGER,
+        landing_type TEXT,
+        unstable INTEGER,
+        all_heading REAL,
+        f1_heading REAL,
+        all_crosstrack REAL,
+        f2_crosstrack REAL,
+        all_ias REAL,
+        a_ias REAL,
+        all_vsi REAL,
+        s_vsi REAL,
+        PRIMARY KEY (flight_id, approach_id)
+    );
+
+    CREATE TABLE IF NOT EXISTS exceedance_thresholds (
+        aircraft_id INTEGER PRIMARY KEY,
+        approach_min_ias REAL,
+        approach_max_ias REAL,
+        approach_max_heading_error REAL,
+        approach_min_vas REAL,
+        approach_max_crosstrack_error REAL,
+        approach_min_distance REAL,
+        approach_min_altitude_agl REAL,
+        approach_final_max_altitude_agl REAL,
+        approach_final_min_altitude_agl REAL,
+        full_stop_speed_indicator REAL,
+        touch_and_go_elevation_indicator REAL,
+        runway_selection_indicator REAL
+    );
+'''
+
+
+class DataSourceError(Exception):
+    '''
+    Raised for any error reported by the database behind a DataSource.
+    '''
+
+    def __init__(self, message, query=None):
+        Exception.__init__(self, message)
+        self.query = query  # The last query that was executed
+    # end def __init__()
+
+# end class DataSourceError
+
+
+class DataSource(object):
+    '''
+    Where the flights are read from and the results of their analysis are written to.
+
+    Every query is written here once, with %s placeholders; subclasses only connect to
+        their database and adapt the few statements whose syntax differs. A DataSource
+        holds a single connection, so every process and thread opens its own with
+        openDataSource().
+    '''
+
+    insertBatch = 500  # Approaches per INSERT statement
+
+    def __init__(self, connection, driverError):
+        self.connection = connection
+        self.driverError = driverError
+        self.lastQuery = None
+    # end def __init__()
+
+    def cursor(self, streaming=False):
+        '''
+        @param: streaming whether rows should be read from the server as they are fetched
+        @return: a cursor returning tuple rows
+        '''
+        return self.connection.cursor()
+    # end def cursor()
+
+    def prepare(self, sql):
+        '''
+        @return: sql with its %s placeholders converted for the database's driver
+        '''
+        return sql
+    # end def prepare()
+
+    def describe(self, error):
+        return str(error)
+    # end def describe()
+
+    def insertApproachesSQL(self, count):
+        '''
+        @return: statement that inserts or replaces count rows of the approaches table
+        '''
+        return "INSERT INTO approaches (%s) VALUES %s ON DUPLICATE KEY UPDATE %s;" % (
+            insertKeysSQL, ', '.join([insertValuesPlaceholders] * count), insertUpdateValuesSQL
+        )
+    # end def insertApproachesSQL()
+
+    def execute(self, cursor, sql, params=()):
+        self.lastQuery = sql
+        cursor.execute(self.prepare(sql), params)
+        return cursor
+    # end def execute()
+
+    @contextlib.contextmanager
+    def errors(self):
+        '''
+        Raises the errors of the database's driver as DataSourceErrors.
+        '''
+        try:
+            yield
+        except self.driverError, e:
+            raise DataSourceError(self.describe(e), self.lastQuery)
+    # end def errors()
+
+    def fetchFlightIDs(self):
+        '''
+        @return: list of the IDs of all the flights that have not been analyzed for approaches yet
+        '''
+        with self.errors():
+            return [row[0] for row in self.execute(self.cursor(), fetchFlightIDsSQL).fetchall()]
+    # end def fetchFlightIDs()
+
+    def fetchFlightSizes(self, flightIDs):
+        '''
+        @param: flightIDs list of the flight IDs to count
+        @return: list of (flightID, number of rows in main) tuples, in the same order as flightIDs
+        '''
+        sizes = {}
+        with self.errors():
+            for lo in xrange(0, len(flightIDs), SIZE_QUERY_BATCH):
+                batch = list(flightIDs[lo:lo + SIZE_QUERY_BATCH])
+                cursor = self.execute(self.cursor(), fetchFlightSizesSQL % placeholders(batch), batch)
+                for flightID, rowCount in cursor.fetchall():
+                    sizes[str(flightID)] = int(rowCount)
+            # end for
+        return [(flightID, sizes.get(str(flightID), 0)) for flightID in flightIDs]
+    # end def fetchFlightSizes()
+
+    def fetchAircraftTypes(self, flightIDs):
+        '''
+        @param: flightIDs list of the flight IDs to look up
+        @return: dict of flight ID -> aircraft type, keyed by the IDs as passed in
+        '''
+        requested = dict((str(flightID), flightID) for flightID in flightIDs)
+        with self.errors():
+            cursor = self.execute(self.cursor(), fetchAircraftTypesSQL % placeholders(flightIDs), list(flightIDs))
+            return dict((requested[str(flightID)], aircraftType) for flightID, aircraftType in cursor.fetchall())
+    # end def fetchAircraftTypes()
+
+    def streamFlights(self, flightIDs):
+        '''
+        Streams the data of all the flights with a single query. The rows are converted to
+            NumPy arrays a batch at a time and split into a FlightColumns per flight, so
+            neither a dict per row nor the whole result set is ever held in memory.
+        Rows that contain NULL values are filtered out, same as for FlightColumns.fromRows().
+
+        A streaming query has to be read to the end before the connection can run
+            another one, so the DataSource should not be used for anything else meanwhile.
+        @param: flightIDs list of the flight IDs to fetch
+        @return: generator of (flightID, FlightColumns) for every one of flightIDs, in
+            ascending order of ID for the flights with data and then the ones without any
+        '''
+        requested = dict((str(flightID), flightID) for flightID in flightIDs)
+        with self.errors():
+            cursor = self.execute(self.cursor(streaming=True), fetchFlightsDataSQL % placeholders(flightIDs), list(flightIDs))
+            try:
+                current, currentID, pieces = None, None, []
+                while True:
+                    rows = cursor.fetchmany(STREAM_BATCH)
+                    if len(rows) == 0:
+                        break
+
+                    # NULLs become NaN, which fromArray() filters out
+                    batch = np.array(rows, dtype=np.float64)
+                    flights = batch[:, 0]
+                    boundaries = np.flatnonzero(flights[1:] != flights[:-1]) + 1
+                    for lo, hi in zip(np.concatenate(([0], boundaries)), np.concatenate((boundaries, [len(batch)]))):
+                        if flights[lo] != current:
+                            if current is not None:
+                                yield self.flight(requested, currentID, pieces)
+                            current, currentID, pieces = flights[lo], rows[lo][0], []
+                        pieces.append(batch[lo:hi])
+                    # end for
+                # end while
+
+                if current is not None:
+                    yield self.flight(requested, currentID, pieces)
+            finally:
+                cursor.close()
+        # end with
+
+        # Flights without any rows are still analyzed (and marked as such)
+        for flightID in requested.values():
+            yield flightID, FlightColumns.fromArray(np.empty((0, len(FLIGHT_DATA_COLUMNS))), FLIGHT_DATA_COLUMNS)
+    # end def streamFlights()
+
+    def streamSamples(self, flightIDs, after=None):
+        '''
+        Streams the data of all the flights with a single query, like streamFlights(), but hands
+            out every flight's rows one at a time as they are read from the cursor. Only the batch
+            of STREAM_BATCH rows being read is held in memory, not even a whole flight.
+        Rows that contain NULL values are filtered out, same as for FlightColumns.fromRows().
+
+        A flight's samples have to be read before the next flight is taken from the generator;
+            whatever the caller left of them is skipped then.
+        @param: flightIDs list of the flight IDs to fetch
+        @param: after dict of flight ID -> time of the last sample already read, to only stream
+            the rows that came after it for those flights
+        @return: generator of (flightID, samples) for every one of flightIDs, in the same order
+            as streamFlights(), where samples is an iterator of the flight's rows as dicts with
+            the keys of FlightColumns.COLUMNS and float values
+        '''
+        requested = dict((str(flightID), flightID) for flightID in flightIDs)
+        columns = [(name, FLIGHT_DATA_COLUMNS.index(name)) for name in FlightColumns.COLUMNS]
+        if after:
+            conditions, params = [], []
+            for flightID in flightIDs:
+                if flightID in after:
+                    conditions.append("(flight = %s AND time > %s)")
+                    params.extend([flightID, after[flightID]])
+                else:
+                    conditions.append("flight = %s")
+                    params.append(flightID)
+            # end for
+            sql = fetchNewFlightsDataSQL % ' OR '.join(conditions)
+        else:
+            sql, params = fetchFlightsDataSQL % placeholders(flightIDs), list(flightIDs)
+
+        with self.errors():
+            cursor = self.execute(self.cursor(streaming=True), sql, params)
+            try:
+                rows = fetchRows(cursor)
+                ahead = [next(rows, None)]  # The row read ahead, the first one the current flight's samples have not reached
+
+                def samples(flight):
+                    with self.errors():
+                        while ahead[0] is not None and ahead[0][0] == flight:
+                            row = ahead[0]
+                            ahead[0] = next(rows, None)
+                            if None not in row:
+                                yield dict((name, float(row[k])) for name, k in columns)
+                        # end while
+                # end def samples()
+
+                while ahead[0] is not None:
+                    flight = ahead[0][0]
+                    flightSamples = samples(flight)
+                    yield requested.pop(str(flight)), flightSamples
+                    for _ in flightSamples:
+                        pass
+                # end while
+            finally:
+                cursor.close()
+        # end with
+
+        # Flights without any rows are still analyzed (and marked as such)
+        for flightID in requested.values():
+            yield flightID, iter([])
+    # end def streamSamples()
+
+    def fetchSampleCounts(self, until):
+        '''
+        @param: until dict of flight ID -> time of the last sample read
+        @return: dict of flight ID -> number of the flight's rows up to that time that streamSamples()
+            hands out (those without NULL values), keyed by the IDs as passed in
+        '''
+        counts = {}
+        flightIDs = list(until.keys())
+        notNull = ' AND '.join('%s IS NOT NULL' % column for column in FLIGHT_DATA_COLUMNS)
+        with self.errors():
+            for lo in xrange(0, len(flightIDs), SIZE_QUERY_BATCH):
+                batch = flightIDs[lo:lo + SIZE_QUERY_BATCH]
+                sql = fetchSampleCountsSQL % (' OR '.join(["(flight = %s AND time <= %s)"] * len(batch)), notNull)
+                params = [value for flightID in batch for value in (flightID, until[flightID])]
+                for flightID, count in self.execute(self.cursor(), sql, params).fetchall():
+                    counts[str(flightID)] = int(count)
+            # end for
+        return dict((flightID, counts.get(str(flightID), 0)) for flightID in flightIDs)
+    # end def fetchSampleCounts()
+
+    def flight(self, requested, flightID, pieces):
+        array = pieces[0] if len(pieces) == 1 else np.concatenate(pieces)
+        return requested.pop(str(flightID)), FlightColumns.fromArray(array, FLIGHT_DATA_COLUMNS)
+    # end def flight()
+
+    def fetchThresholds(self, aircraftType):
+        '''
+        @param: aircraftType the aircraft type to look up
+        @return: dict of the aircraft type's row of exceedance_thresholds, or None if it has none
+        '''
+        with self.errors():
+            cursor = self.execute(self.cursor(), selectThresholdsSQL, (aircraftType,))
+            row = cursor.fetchone()
+            return None if row is None else dict(zip([column[0] for column in cursor.description], row))
+    # end def fetchThresholds()
+
+    def fetchAllThresholds(self):
+        '''
+        @return: list of the dicts of every row of exceedance_thresholds, see ThresholdProfiles
+        '''
+        with self.errors():
+            cursor = self.execute(self.cursor(), selectAllThresholdsSQL)
+            columns = [column[0] for column in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+    # end def fetchAllThresholds()
+
+    def fetchThresholdsStamp(self, columns):
+        '''
+        @param: columns list of the columns of exceedance_thresholds to cover
+        @return: tuple of the number of rows and of the count, sum and sum weighted by aircraft_id of
+            every column, which changes when the rows do: one row computed by the database, where
+            fetchAllThresholds() transfers the whole table
+        '''
+        aggregates = ', '.join(
+            "COUNT({0}), SUM({0}), SUM(aircraft_id * {0})".format(column) for column in columns
+        )
+        with self.errors():
+            return tuple(self.execute(self.cursor(), selectThresholdsStampSQL % aggregates).fetchone())
+    # end def fetchThresholdsStamp()
+
+    def writeResults(self, flightIDs, approachRows):
+        '''
+        Inserts the approaches of the flights and marks the flights as analyzed, in one
+            transaction, which is rolled back if anything fails.
+        @param: flightIDs list of the analyzed flights, which may be empty to only insert approaches
+        @param: approachRows list of the flights' rows for the approaches table, ordered like insertKeysList
+        '''
+        cursor = self.cursor()
+        try:
+            with self.errors():
+                for lo in xrange(0, len(approachRows), self.insertBatch):
+                    batch = approachRows[lo:lo + self.insertBatch]
+                    self.execute(cursor, self.insertApproachesSQL(len(batch)), [value for row in batch for value in row])
+                # end for
+                if len(flightIDs) > 0:
+                    self.execute(cursor, updateAnalysesSQL % placeholders(flightIDs), list(flightIDs))
+                self.connection.commit()
+        except DataSourceError:
+            self.connection.rollback()
+            raise
+    # end def writeResults()
+
+    def insertFlight(self, cursor, flightID, aircraftType, rows):
+        '''
+        Stores a flight's data, replacing any data already stored for it, and marks it as not analyzed yet.
+            Does not commit.
+        @param: cursor the cursor to execute the statements on
+        @param: flightID the flight's id
+        @param: aircraftType the flight's aircraft type
+        @param: rows list of the flight's rows for the main table, ordered like FLIGHT_DATA_COLUMNS
+        '''
+        self.execute(cursor, "DELETE FROM main WHERE flight = %s;", (flightID,))
+        self.appendRows(cursor, rows)
+        self.execute(cursor, "REPLACE INTO flight_id (id, aircraft_type) VALUES (%s, %s);", (flightID, aircraftType))
+        self.execute(cursor, "REPLACE INTO flight_analyses (flight_id, approach_analysis) VALUES (%s, 0);", (flightID,))
+    # end def insertFlight()
+
+    def appendRows(self, cursor, rows):
+        '''
+        Appends rows of flight data to the main table. Does not commit.
+        @param: cursor the cursor to execute the statement on
+        @param: rows list of rows for the main table, ordered like FLIGHT_DATA_COLUMNS
+        '''
+        cursor.executemany(
+            self.prepare("INSERT INTO main (%s) VALUES (%s);" % (', '.join(FLIGHT_DATA_COLUMNS), placeholders(FLIGHT_DATA_COLUMNS))),
+            rows
+        )
+    # end def appendRows()
+
+    def close(self):
+        self.connection.close()
+    # end def close()
+
+# end class DataSource
+
+
+class MySQLDataSource(DataSource):
+    '''
+    The production MySQL database, with the credentials of the given environment in config/db_config.py.
+    '''
+
+    def __init__(self, environment):
+        import config.db_config as db_config
+        import MySQLdb as mysql
+        self.mysql = mysql
+        DataSource.__init__(self, mysql.connect(**db_config.credentials[environment]), mysql.Error)
+    # end def __init__()
+
+    def cursor(self, streaming=False):
+        return self.connection.cursor(self.mysql.cursors.SSCursor if streaming else self.mysql.cursors.Cursor)
+    # end def cursor()
+
+    def describe(self, error):
+        return "MySQL Error [%d]: %s" % (error.args[0], error.args[1]) if len(error.args) == 2 else str(error)
+    # end def describe()
+
+# end class MySQLDataSource
+
+
+class SQLiteDataSource(DataSource):
+    '''
+    An SQLite file with the same tables as the MySQL database, which are created if it does not have them yet.
+    '''
+
+    insertBatch = 50  # Older SQLite versions allow at most 999 parameters per statement
+
+    def __init__(self, path):
+        connection = sqlite3.connect(path, timeout=60)
+        # Let a streaming read run while results are written on another connection
+        connection.execute("PRAGMA journal_mode=WAL;")
+        connection.executescript(SQLITE_SCHEMA)
+        DataSource.__init__(self, connection, sqlite3.Error)
+    # end def __init__()
+
+    def prepare(self, sql):
+        return sql.replace('%s', '?')
+    # end def prepare()
+
+    def describe(self, error):
+        return "SQLite Error: %s" % error
+    # end def describe()
+
+    def insertApproachesSQL(self, count):
+        # (flight_id, approach_id) is the primary key, so replacing a row is the same as updating it
+        return "INSERT OR REPLACE INTO approaches (%s) VALUES %s;" % (
+            insertKeysSQL, ', '.join([insertValuesPlaceholders] * count)
+        )
+    # end def insertApproachesSQL()
+
+# end class SQLiteDataSource
+
+
+def openDataSource(spec=DEFAULT_SOURCE):
+    '''
+    Opens a new connection to a data source.
+    @param: spec 'mysql:<environment>' for the MySQL database configured in config/db_config.py,
+        or 'sqlite:<path>' for an SQLite file
+    @return: the DataSource
+    '''
+    kind, _, location = spec.partition(':')
+    if kind == 'mysql':
+        return MySQLDataSource(location or 'dev')
+    elif kind == 'sqlite' and location:
+        return SQLiteDataSource(location)
+    raise ValueError("Unknown data source: %s" % spec)
+# end def openDataSource()
+
+
+def copyFlights(source, target, flightIDs):
+    '''
+    Copies the flights' data, aircraft types and the thresholds of those aircraft types
+        from one data source to another, with the flights marked as not analyzed yet.
+        This is how a production run is reproduced offline against an SQLite file.
+    @param: source the DataSource to copy from
+    @param: target the DataSource to copy to
+    @param: flightIDs list of the flights to copy
+    '''
+    aircraftTypes = source.fetchAircraftTypes(flightIDs)
+    with target.errors():
+        cursor = target.cursor()
+        for flightID in flightIDs:
+            with source.errors():
+                rows = source.execute(source.cursor(), fetchFlightsDataSQL % placeholders([flightID]), [flightID]).fetchall()
+            target.insertFlight(cursor, flightID, aircraftTypes.get(flightID), rows)
+        # end for
+
+        for aircraftType in set(aircraftTypes.values()):
+            thresholds = source.fetchThresholds(aircraftType)
+            if thresholds is not None:
+                columns = sorted(thresholds.keys())
+                target.execute(
+                    cursor, "REPLACE INTO exceedance_thresholds (%s) VALUES (%s);" % (', '.join(columns), placeholders(columns)),
+                    [thresholds[column] for column in columns]
+                )
+        # end for
+        target.connection.commit()
+# end def copyFlights()
+
+
+def fetchRows(cursor):
+    '''
+    @return: generator of the rows of a cursor, fetched STREAM_BATCH at a time
+    '''
+    while True:
+        rows = cursor.fetchmany(STREAM_BATCH)
+        if len(rows) == 0:
+            break
+        for row in rows:
+            yield row
+    # end while
+# end def fetchRows()
+
+
+def placeholders(values):
+    return ', '.join(['%s'] * len(values))
+# end def placeholders()
+
+
+'''
+Running this module directly copies flights between data sources, e.g. from production into an
+    SQLite file to reproduce a run offline: DataSource.py <source> <target> [flight_id ...]
+    Without any flight_ids, all the flights that have not been analyzed yet are copied.
+'''
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    if len(sys.argv) < 3:
+        sys.exit("Usage: %s <source> <target> [flight_id ...]" % sys.argv[0])
+
+    source = openDataSource(sys.argv[1])
+    target = openDataSource(sys.argv[2])
+    flightIDs = sys.argv[3:] or source.fetchFlightIDs()
+    copyFlights(source, target, flightIDs)
+    logger.info("Copied %d flights from %s to %s", len(flightIDs), sys.argv[1], sys.argv[2])
@@ -0,0 +1,100 @@
+import json
+import logging
+import os
+
+
+DEBUG = logging.DEBUG  # unstable_sample, one for every unstable sample of a final approach
+INFO = logging.INFO    # approach_detected, runway_selected, landing_classified and approach_result, one per approach
+LEVELS = {'debug': DEBUG, 'info': INFO}
+DEFAULT_BUFFER_EVENTS = 1000  # Events a JSONLEventSink holds before appending them to its file
+
+
+class EventSink(object):
+    '''
+    Receives the structured events of the analysis: what used to be printed about every
+        approach, runway, unstable sample, landing and result row.
+
+    This base class is the null sink, which discards everything. Its debug and info flags
+        say whether events of those levels are wanted, and the analyzers check them before
+        building an event, so a disabled event costs an attribute lookup and nothing else.
+    '''
+
+    def __init__(self, level=None):
+        '''
+        @param: level the lowest level of the events to keep, DEBUG or INFO, None for none
+        '''
+        self.debug = level is not None and level <= DEBUG
+        self.info = level is not None and level <= INFO
+    # end def __init__()
+
+    def emit(self, event, **fields):
+        '''
+        @param: event the event's type
+        @param: fields the event's data, as JSON-serializable values
+        '''
+        pass
+    # end def emit()
+
+    def flush(self):
+        pass
+    # end def flush()
+
+    def close(self):
+        self.flush()
+    # end def close()
+
+# end class EventSink
+
+
+class JSONLEventSink(EventSink):
+    '''
+    Appends the events to a file as JSON lines, with the event's type under "event" and the
+        id of the process that emitted it under "pid".
+
+    The lines are buffered and every flush appends them with a single write to a file opened
+        with O_APPEND, so the workers can share one file without their lines interleaving.
+    '''
+
+    def __init__(self, path, level=INFO, bufferEvents=DEFAULT_BUFFER_EVENTS):
+        '''
+        @param: path the file to append the events to
+        @param: level the lowest level of the events to keep
+        @param: bufferEvents the number of events to buffer before appending them
+        '''
+        EventSink.__init__(self, level)
+        self.fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0644)
+        self.bufferEvents = bufferEvents
+        self.buffer = []
+        self.pid = os.getpid()
+    # end def __init__()
+
+    def emit(self, event, **fields):
+        fields['event'] = event
+        fields['pid'] = self.pid
+        self.buffer.append(json.dumps(fields, sort_keys=True))
+        if len(self.buffer) >= self.bufferEvents:
+            self.flush()
+    # end def emit()
+
+    def flush(self):
+        if len(self.buffer) > 0:
+            os.write(self.fd, '\n'.join(self.buffer) + '\n')
+            self.buffer = []
+    # end def flush()
+
+    def close(self):
+        self.flush()
+        os.close(self.fd)
+    # end def close()
+
+# end class JSONLEventSink
+
+
+def openEventSink(path=None, level=INFO):
+    '''
+    @param: path the file to append the events to, None to discard them
+    @param: level the lowest level of the events to keep
+    @return: the EventSink
+    '''
+    return EventSink() if path is None else JSONLEventSink(path, level)
+# end def openEventSink()
@@ -1,4 +1,11 @@
-import MySQLdb as mysql
+from AirportIndex import AirportIndex
+from DataSource import insertKeysList
+from Events import EventSink
+from LatLon import LatLon, angleBetween, crossTrackAngle
+from Metrics import StageMetrics
+from ResultWriter import ResultWriter
+from RunwayCorridors import RunwayCorridors
+from Thresholds import Thresholds
 
 
 ''' GLOBAL EXCEEDANCE THRESHOLDS '''
@@ -16,70 +23,127 @@ APPROACH_FINAL_MIN_ALTITUDE_AGL = 50
 FULL_STOP_SPEED_INDICATOR = 35
 TOUCH_AND_GO_ELEVATION_INDICATOR = 5
 RUNWAY_SELECTION_INDICATOR = 20
+# The thresholds of aircraft types without a row in exceedance_thresholds, see ThresholdProfiles
+DEFAULT_THRESHOLDS = Thresholds(
+    APPROACH_MIN_IAS, APPROACH_MAX_IAS, APPROACH_MAX_HEADING_ERROR, APPROACH_MIN_VSI, APPROACH_MAX_CROSSTRACK_ERROR,
+    APPROACH_MIN_DISTANCE, APPROACH_MIN_ALTITUDE_AGL, APPROACH_FINAL_MAX_ALTITUDE_AGL, APPROACH_FINAL_MIN_ALTITUDE_AGL,
+    FULL_STOP_SPEED_INDICATOR, TOUCH_AND_GO_ELEVATION_INDICATOR, RUNWAY_SELECTION_INDICATOR
+)
+RUNWAY_CORRIDOR_LENGTH = 1.5  # Miles a runway's approach corridor extends before its threshold, see RunwayCorridors
+RUNWAY_CORRIDOR_MARGIN = 1000  # Feet a runway's approach corridor extends beyond either side of it
 
-selectThresholdsSQL = "SELECT * FROM exceedance_thresholds WHERE aircraft_id = %s;"
+''' BOUNDS ON HOW SOON AN APPROACH CAN BE DETECTED, SEE FlightAnalyzer.lookAhead() '''
+MAX_GROUND_SPEED = 300  # mph
+MAX_DESCENT_RATE = 6000  # ft/min, also covering the noise between two altitude samples
+MAX_LOOK_AHEAD = 60  # Seconds skipped at most between two checks for an approach
+LANDING_REARM_SAMPLES = 15  # Samples skipped after a landing before checking for the next approach
 
-insertKeysList = [
-    "flight_id", "approach_id", "airport_id", "runway_id",
-    "approach_start", "approach_end", "landing_start", "landing_end", "landing_type",
-    "unstable", "all_heading", "f1_heading", "all_crosstrack", "f2_crosstrack", "all_ias", "a_ias", "all_vsi", "s_vsi"
-]
-insertKeysSQL = ', '.join(insertKeysList)
-insertUpdateValuesSQL = ', '.join(["{0}=VALUES({0})".format(key) for key in insertKeysList])
-insertValuesPlaceholders = ', '.join(["%s"] * len(insertKeysList))
-insertSQL = "INSERT INTO approaches (%s) VALUES (%s) ON DUPLICATE KEY UPDATE %s;" % (insertKeysSQL, insertValuesPlaceholders, insertUpdateValuesSQL)
-
-updateAnalysesSQL = "UPDATE flight_analyses SET approach_analysis = 1 WHERE flight_id = %s"
+RUNWAY_FRAME_TOLERANCE = 0.01  # Feet a final approach's RunwayFrame may be off by, or the spherical functions are used
 
 
 class FlightAnalyzer(object):
 
-    def __init__(self, db, cursor, airports, skipOutput=False):
-        self.db = db
-        self.cursor = cursor
+    streaming = False  # Whether analyze() takes an iterator of the samples streamed from the DataSource, see StreamingAnalysis
+
+    def __init__(self, source, airports, skipOutput=False, airportIndex=None, writer=None, metrics=None, events=None,
+                 thresholds=DEFAULT_THRESHOLDS):
+        self.source = source  # DataSource the results are written to
+        # Without a shared writer, every flight is written in a transaction of its own
+        self.writer = ResultWriter(source, flushFlights=1) if writer is None else writer
         self.airports = airports
+        self.airportIndex = AirportIndex.fromDict(airports) if airportIndex is None else airportIndex
+        self.flightAirports = self.airportIndex  # The airports detectAirport() looks among for the flight being analyzed
+        self.corridors = {}  # airport code -> RunwayCorridors of the airports approached so far
+        self.thresholds = None  # Thresholds the flights are analyzed with, see setThresholds()
+        self.setThresholds(thresholds)
         self.skipOutputToDB = skipOutput
+        self.metrics = StageMetrics() if metrics is None else metrics  # How long every stage took
+        self.events = EventSink() if events is None else events  # Where to report approaches, landings and unstable samples
         self.approaches = {}
         self.approachID = 0
     # end def __init__()
 
+    def loadFlightData(self, columns):
+        '''
+        Converts a flight's FlightColumns into the representation analyze() works on:
+            a list of one row dict per sample, each with its LatLon attached and
+            whether it is an approach candidate, see approachCandidates().
+        @param: columns the FlightColumns holding the flight's valid rows
+        @return: the flight data to pass into analyze()
+        '''
+        flightData = columns.toRecords()
+        for row, candidate in zip(flightData, self.approachCandidates(columns).tolist()):
+            row['LatLon'] = LatLon(row['latitude'], row['longitude'])
+            row['candidate'] = candidate
+        return flightData
+    # end def loadFlightData()
+
+    def approachCandidates(self, columns):
+        '''
+        Marks the samples where an approach could be detected, in one pass over the flight.
+        An approach needs the nearest airport within APPROACH_MIN_DISTANCE and the aircraft
+            less than APPROACH_MIN_ALTITUDE_AGL above it, so a sample at least that high above
+            every airport within APPROACH_MIN_DISTANCE of it cannot start one. The runs of
+            candidates are the only windows the search for approaches has to look into.
+        @param: columns the FlightColumns of the flight
+        @return: boolean array of whether every sample is a candidate
+        '''
+        t = self.thresholds
+        highest = self.ceilingGrid.highestMany(columns.latitude, columns.longitude)
+        return columns.msl_altitude - highest < t.minAltitudeAGL
+    # end def approachCandidates()
+
     def analyze(self, flightID, aircraftType, data, skipAnalysis=False):
         self.flightID = flightID
         self.flightData = data
         self.dataLength = len(data)
 
         if not skipAnalysis and self.dataLength > 0:
-            # self.setThresholds(aircraftType)
-            start = self.findInitialTakeOff()
-            self.analyzeApproaches(start)
+            with self.metrics.timed('flight_airports'):
+                self.flightAirports = self.airportsAround(data)
+            with self.metrics.timed('find_initial_takeoff'):
+                start = self.findInitialTakeOff()
+            with self.metrics.timed('analyze_approaches'):
+                self.analyzeApproaches(start)
 
         if not self.skipOutputToDB:
-            self.outputToDB()
+            with self.metrics.timed('output_to_db'):
+                self.outputToDB()
 
         # Reset global variables for next analysis
         self.clearApproaches()
         self.resetApproachID()
+        self.flightAirports = self.airportIndex
 
         # Return the dict of approaches
         return self.approaches
     # end def analyze()
 
-    def setThresholds(self, aircraftType):
-        self.cursor.execute(selectThresholdsSQL, (aircraftType,))
-        row = self.cursor.fetchone()
-
-        APPROACH_MIN_IAS = row['approach_min_ias']
-        APPROACH_MAX_IAS = row['approach_max_ias']
-        APPROACH_MAX_HEADING_ERROR = row['approach_max_heading_error']
-        APPROACH_MIN_VSI = row['approach_min_vas']
-        APPROACH_MAX_CROSSTRACK_ERROR = row['approach_max_crosstrack_error']
-        APPROACH_MIN_DISTANCE = row['approach_min_distance']
-        APPROACH_MIN_ALTITUDE_AGL = row['approach_min_altitude_agl']
-        APPROACH_FINAL_MAX_ALTITUDE_AGL = row['approach_final_max_altitude_agl']
-        APPROACH_FINAL_MIN_ALTITUDE_AGL = row['approach_final_min_altitude_agl']
-        FULL_STOP_SPEED_INDICATOR = row['full_stop_speed_indicator']
-        TOUCH_AND_GO_ELEVATION_INDICATOR = row['touch_and_go_elevation_indicator']
-        RUNWAY_SELECTION_INDICATOR = row['runway_selection_indicator']
+    def airportsAround(self, data):
+        '''
+        Narrows the airports down to the ones that can be nearest to some sample of the flight,
+            so that detectAirport() finds the same airports among far fewer of them.
+        @param: data the flight data passed into analyze()
+        @return: the AirportIndex of those airports, see AirportIndex.around()
+        '''
+        return self.airportIndex.around([row['latitude'] for row in data], [row['longitude'] for row in data])
+    # end def airportsAround()
+
+    def setThresholds(self, thresholds):
+        '''
+        Sets the Thresholds the flights analyzed from now on are analyzed with, see ThresholdProfiles.
+        Must be called before loadFlightData(), which marks the approach candidates by them.
+        @param: thresholds the Thresholds of the flights' aircraft type
+        '''
+        if thresholds is self.thresholds:
+            return
+        self.thresholds = thresholds
+        # The highest airport close enough to every point, which rules out approaches above it
+        self.ceilingGrid = self.airportIndex.ceilingGrid(float(thresholds.minDistance) / EARTH_RADIUS_MILES)
+        # The highest airport that can be reached within MAX_LOOK_AHEAD from every point
+        self.lookAheadGrid = self.airportIndex.ceilingGrid(
+            (thresholds.minDistance + MAX_GROUND_SPEED * MAX_LOOK_AHEAD / 3600.0) / EARTH_RADIUS_MILES
+        )
     # end def setThresholds()
 
     def clearApproaches(self):
@@ -138,17 +202,27 @@ class FlightAnalyzer(object):
         @param startingIndex the time index after the initial takeoff
         @author: Wyatt Hedrick, Kelton Karboviak
         '''
+        t = self.thresholds
         i = startingIndex
         while i < self.dataLength:
+            # Cruise and pattern work away from the candidate windows cost a lookup per check
+            if not self.flightData[i]['candidate']:
+                i = self.nextApproachCheck(i)
+                continue
+
             airplaneMSL = self.flightData[i]['msl_altitude']
             airplanePoint = self.flightData[i]['LatLon']
 
             airport = self.detectAirport(airplanePoint)
-            distance = airplanePoint.distanceTo(airport.centerLatLon, EARTH_RADIUS_MILES)
+            distance = self.distanceToAirport(airplanePoint, airport)
             hAGL = airplaneMSL - airport.alt
 
-            if distance < APPROACH_MIN_DISTANCE and hAGL < APPROACH_MIN_ALTITUDE_AGL:
-                print "Airplane is approaching %s, %s: %s" % (airport.city, airport.state, airport.code)
+            if distance < t.minDistance and hAGL < t.minAltitudeAGL:
+                if self.events.info:
+                    self.events.emit(
+                        'approach_detected', flight=self.flightID, approach=self.approachID + 1, index=i,
+                        airport=airport.code, city=airport.city, state=airport.state
+                    )
 
                 # hdgDiff = self.headingDifference(airport.magHeading, self.flightData[i]['heading'])
                 # if hdgDiff > 90:
@@ -160,65 +234,74 @@ class FlightAnalyzer(object):
                 self.approaches[thisApproachID] = {}
                 self.approaches[thisApproachID]['unstable'] = []
 
-                while hAGL > APPROACH_FINAL_MAX_ALTITUDE_AGL and hAGL < APPROACH_MIN_ALTITUDE_AGL and i < self.dataLength:
+                while hAGL > t.finalMaxAltitudeAGL and hAGL < t.minAltitudeAGL and i < self.dataLength:
                     airplaneMSL = self.flightData[i]['msl_altitude']
                     hAGL = airplaneMSL - airport.alt
                     i += 1
                 # end while
 
-                # Decrement by 1 so that we are guaranteed that i < dataLength
-                start = i - 1
+                # Decrement by 1 so that we are guaranteed that i < dataLength, but not
+                # before the first sample, which can start an approach if the thresholds
+                # allow one 500 ft or more above the departure airport
+                start = max(i - 1, 0)
 
                 airplaneHdg = self.flightData[start]['heading']
                 airplanePoint = self.flightData[start]['LatLon']
 
                 runway = self.detectRunway(airplanePoint, airplaneHdg, airport)
+                frame = self.runwayFrame(runway, airport)
 
                 # Decide whether the point used to calculate the aircraft's
                 # distance should be the airport or runway.
                 # If runway is None, then we have to use the airport
                 # referencePoint = airport.centerLatLon if runway is None else runway.centerLatLon
 
-                print "Runway:", "Unknown" if runway is None else runway.runwayCode
+                if self.events.info:
+                    self.events.emit(
+                        'runway_selected', flight=self.flightID, approach=thisApproachID + 1,
+                        runway=None if runway is None else runway.runwayCode
+                    )
 
                 temp_list = []
                 allValues = [ [], [], [], [] ]
                 unstableReasons = [ [], [], [], [] ]  # F1, F2, A, S
-                while distance < APPROACH_MIN_DISTANCE and hAGL <= APPROACH_FINAL_MAX_ALTITUDE_AGL and hAGL >= APPROACH_FINAL_MIN_ALTITUDE_AGL and i < self.dataLength:
+                while distance < t.minDistance and hAGL <= t.finalMaxAltitudeAGL and hAGL >= t.finalMinAltitudeAGL and i < self.dataLength:
                     airplaneHdg = self.flightData[i]['heading']
                     airplaneIAS = self.flightData[i]['indicated_airspeed']
                     airplaneVSI = self.flightData[i]['vertical_airspeed']
 
                     if runway is not None:
                         headingError = 180 - abs(abs(runway.magHeading - airplaneHdg) - 180)
-                        cond_F1 = headingError <= APPROACH_MAX_HEADING_ERROR
-                        crossTrackError = self.crossTrackToCenterLine(airplanePoint, runway)
-                        cond_F2 = abs(crossTrackError) <= APPROACH_MAX_CROSSTRACK_ERROR
+                        cond_F1 = headingError <= t.maxHeadingError
+                        crossTrackError = self.crossTrackToCenterLine(airplanePoint, runway, frame)
+                        cond_F2 = abs(crossTrackError) <= t.maxCrossTrackError
                     else:
                         cond_F1 = cond_F2 = True
                     # end if/else
 
-                    cond_A = airplaneIAS >= APPROACH_MIN_IAS and airplaneIAS <= APPROACH_MAX_IAS
-                    cond_S = airplaneVSI >= APPROACH_MIN_VSI
+                    cond_A = airplaneIAS >= t.minIAS and airplaneIAS <= t.maxIAS
+                    cond_S = airplaneVSI >= t.minVSI
 
                     # Check to see if any parameters went unstable.
                     # if a condition is false, that means it was unstable
                     airplaneIsUnstable = not (cond_F1 and cond_F2 and cond_A and cond_S)
 
                     if airplaneIsUnstable:
-                        print "F1=%s, F2=%s, A=%s, S=%s" % (cond_F1, cond_F2, cond_A, cond_S)
+                        if self.events.debug:
+                            self.events.emit(
+                                'unstable_sample', flight=self.flightID, approach=thisApproachID + 1, index=i,
+                                F1=cond_F1, F2=cond_F2, A=cond_A, S=cond_S,
+                                runway_heading=None if runway is None else runway.magHeading, heading=airplaneHdg,
+                                heading_error=None if runway is None else headingError,
+                                crosstrack=None if runway is None else crossTrackError, ias=airplaneIAS, vsi=airplaneVSI
+                            )
                         if not cond_F1:
-                            print "\tRunway Heading: %s" % runway.magHeading
-                            print "\tAirplane Heading: %s" % airplaneHdg
                             unstableReasons[0].append(headingError)
                         if not cond_F2:
-                            print "\tCrossTrackToCenterLine: %s" % crossTrackError
                             unstableReasons[1].append(crossTrackError)
                         if not cond_A:
-                            print "\tIndicated Airspeed: %s knots" % (airplaneIAS)
                             unstableReasons[2].append(airplaneIAS)
                         if not cond_S:
-                            print "\tVertical Airspeed: %s ft/min" % (airplaneVSI)
                             unstableReasons[3].append(airplaneVSI)
                         temp_list.append(i)
                     elif len(temp_list) > 0:
@@ -237,13 +320,13 @@ class FlightAnalyzer(object):
 
                     airplaneMSL = self.flightData[i]['msl_altitude']
                     airplanePoint = self.flightData[i]['LatLon']
-                    distance = airplanePoint.distanceTo(airport.centerLatLon, EARTH_RADIUS_MILES)
+                    distance = self.distanceToAirport(airplanePoint, airport, frame)
                     hAGL = airplaneMSL - airport.alt
 
                     i += 1
                 # end while
 
-                end = start if start == i - 1 else i - 1
+                end = max(start, i - 1)
 
                 if len(temp_list) > 0:
                     self.approaches[thisApproachID]['unstable'].append( (temp_list[0], temp_list[-1]) )
@@ -262,13 +345,51 @@ class FlightAnalyzer(object):
                 self.approaches[thisApproachID]['IAS'] = allValues[2]
                 self.approaches[thisApproachID]['VSI'] = allValues[3]
 
-                i = self.analyzeLanding(end, airport, thisApproachID)
+                with self.metrics.timed('analyze_landing'):
+                    i = self.analyzeLanding(end, airport, thisApproachID)
+                i += LANDING_REARM_SAMPLES
+                continue
             # end if
 
-            i += 15
+            i = self.nextApproachCheck(i)
         # end while
     # end def analyzeApproaches()
 
+    def nextApproachCheck(self, i):
+        '''
+        Skips the samples that cannot start an approach, see lookAhead().
+        @param: i the index of a sample that did not start one
+        @return: the index of the first sample after it that is lookAhead() seconds later or more
+        '''
+        row = self.flightData[i]
+        until = row['time'] + self.lookAhead(row['LatLon'], row['msl_altitude'])
+        i += 1
+        while i < self.dataLength and self.flightData[i]['time'] < until:
+            i += 1
+        return i
+    # end def nextApproachCheck()
+
+    def lookAhead(self, airplanePoint, airplaneMSL):
+        '''
+        Bounds how soon after a sample an approach can be detected, flying no faster than
+            MAX_GROUND_SPEED and descending no faster than MAX_DESCENT_RATE: it takes that
+            long at least to get APPROACH_MIN_DISTANCE close to the closest airport, and to
+            get below APPROACH_MIN_ALTITUDE_AGL above the highest one that can be reached.
+        Far from any airport or high above them the checks are MAX_LOOK_AHEAD apart, while
+            close to the approach gates every sample is checked.
+        @param: airplanePoint the LatLon of the airplane
+        @param: airplaneMSL the altitude of the airplane
+        @return: the seconds, at most MAX_LOOK_AHEAD, that can be skipped without missing an approach
+        '''
+        t = self.thresholds
+        highest = self.lookAheadGrid.highestAt(airplanePoint.lat, airplanePoint.lon)
+        seconds = (airplaneMSL - highest - t.minAltitudeAGL) / MAX_DESCENT_RATE * 60.0
+        if seconds < MAX_LOOK_AHEAD:
+            distance = self.airportIndex.distanceToNearest(airplanePoint) * EARTH_RADIUS_MILES
+            seconds = max(seconds, (distance - t.minDistance) / MAX_GROUND_SPEED * 3600.0)
+        return min(seconds, MAX_LOOK_AHEAD)
+    # end def lookAhead()
+
     def analyzeLanding(self, start, airport, thisApproachID):
         '''
         This function will analyze the time after the final approach and before the plane reaches a height of 150 feet (or until the flight ends if it is the final landing).
@@ -276,20 +397,21 @@ class FlightAnalyzer(object):
         @param: airport the airport that the airplane is attempting to land at
         @author: Wyatt Hedrick
         '''
+        t = self.thresholds
         i = start
         airplaneMSL = self.flightData[i]['msl_altitude']
         hAGL = airplaneMSL - airport.alt
         elevations = []
-        avgElevation = TOUCH_AND_GO_ELEVATION_INDICATOR + 1
+        avgElevation = t.touchAndGoElevation + 1
 
         fullStop = touchAndGo = False
 
-        while hAGL < APPROACH_MIN_ALTITUDE_AGL and i < self.dataLength - 1:
+        while hAGL < t.minAltitudeAGL and i < self.dataLength - 1:
             if not fullStop:
                 airplaneIAS = self.flightData[i]['indicated_airspeed']
-                if airplaneIAS <= FULL_STOP_SPEED_INDICATOR:
+                if airplaneIAS <= t.fullStopSpeed:
                     fullStop = True
-                elif avgElevation <= TOUCH_AND_GO_ELEVATION_INDICATOR:
+                elif avgElevation <= t.touchAndGoElevation:
                     touchAndGo = True
                 # end if/elif
             # end if
@@ -315,21 +437,22 @@ class FlightAnalyzer(object):
 
         if fullStop:
             self.approaches[thisApproachID]['landing-type'] = 'stop-and-go'
-            print "Full Stop!!!!"
         elif touchAndGo:
             self.approaches[thisApproachID]['landing-type'] = 'touch-and-go'
-            print "Touch and Go!!!!"
         else:
             self.approaches[thisApproachID]['landing-type'] = 'go-around'
-            print "Go Around?!?!?!"
 
         self.approaches[thisApproachID]['landing-start'] = start
         self.approaches[thisApproachID]['landing-end'] = end
-        print ""
+        if self.events.info:
+            self.events.emit(
+                'landing_classified', flight=self.flightID, approach=thisApproachID + 1,
+                landing_type=self.approaches[thisApproachID]['landing-type'], start=start, end=end
+            )
         return end
     # end def analyzeLanding()
 
-    def crossTrackToCenterLine(self, airplanePoint, runway):
+    def crossTrackToCenterLine(self, airplanePoint, runway, frame=None):
         '''
         This function calculates the distance the airplane is from the center line in feet based on the passed in coordinates of the airplane and the runway the plane is attempting to land at.
 
@@ -338,37 +461,53 @@ class FlightAnalyzer(object):
         @param: airplaneLat the latitude of the airplane
         @param: airplaneLon the longitude of the airplane
         @param: runway the runway object representing the closest runway to the airplane
+        @param: frame the runway's RunwayFrame, see runwayFrame(), to use instead of the great circle
         @return: the distance in feet between the airplane and the center line of the runway
         @author: Wyatt Hedrick, Kelton Karboviak
         '''
-        return airplanePoint.crossTrackDistanceTo(runway.centerLatLon, runway.trueHeading, EARTH_RADIUS_FEET)
+        p = airplanePoint.toVector()
+        if frame is not None:
+            return frame.crossTrack(p.x, p.y, p.z) * EARTH_RADIUS_FEET
+
+        # Same as airplanePoint.crossTrackDistanceTo(runway.centerLatLon, runway.trueHeading, EARTH_RADIUS_FEET),
+        # using the center line's great circle precomputed when the runway was loaded
+        gc = runway.centerLine
+        return crossTrackAngle(p.x, p.y, p.z, gc.x, gc.y, gc.z) * EARTH_RADIUS_FEET
     # end def crossTrackToCenterLine()
 
+    def distanceToAirport(self, airplanePoint, airport, frame=None):
+        '''
+        This function calculates the distance in miles between the airplane and the center of the airport.
+        Same as airplanePoint.distanceTo(airport.centerLatLon, EARTH_RADIUS_MILES), using the
+            airport's n-vector precomputed when the airport was loaded.
+        @param: airplanePoint the LatLon of the airplane
+        @param: airport the airport object to measure the distance to
+        @param: frame the RunwayFrame of a final approach to the airport, see runwayFrame(), to measure in instead
+        @return: the distance in miles
+        '''
+        p = airplanePoint.toVector()
+        if frame is not None:
+            return frame.distanceToAirport(p.x, p.y, p.z) * EARTH_RADIUS_MILES
+        a = airport.nVector
+        return angleBetween(p.x, p.y, p.z, a.x, a.y, a.z) * EARTH_RADIUS_MILES
+    # end def distanceToAirport()
+
     def detectAirport(self, airplanePoint):
         '''
         This function detects the airport that is closest to the passed in coordinates.
-        It performs this by scanning the airportData dictionary and calculating which
-            airport as the lowest total difference between lat/lon.
-        @param: lat the latitude of the plane
-        @param: lon the longitude of the plane
+        It performs this by querying the airport index for the airport that has
+            the lowest total difference between lat/lon, among the flight's airports.
+        @param: airplanePoint the LatLon of the plane
         @author: Wyatt Hedrick
         '''
-        ourAirport = None
-        closestDifference = 0
-        for key, airport in self.airports.iteritems():
-            dLat = abs(airport.centerLatLon.lat - airplanePoint.lat)  # getting difference in lat and lon
-            dLon = abs(airport.centerLatLon.lon - airplanePoint.lon)
-            totalDifference = dLat + dLon  # adding the differences so we can compare and see which airport is the closest
-            if ourAirport is None or totalDifference < closestDifference:  # if it is the first time or we found a closer airport
-                ourAirport = airport
-                closestDifference = totalDifference
-        # end for
-        return ourAirport
+        return self.flightAirports.nearest(airplanePoint)
     # end def detectAirport()
 
     def detectRunway(self, airplanePoint, airplaneHdg, airport):
         '''
-        This function will detect the runway that the airplane is going to attempt to land at.
+        This function will detect the runway that the airplane is going to attempt to land at:
+            the one whose approach corridor it is in, see RunwayCorridors, or else the one with
+            the closest center among those within RUNWAY_SELECTION_INDICATOR of its heading.
         @param: airplaneLat the latitude of the airplane
         @param: airplaneLon the longitude of the airplane
         @param: airplaneHdg the heading of the heading
@@ -376,10 +515,15 @@ class FlightAnalyzer(object):
         @return: the runway object representing the runway the airplane is attempting to land on
         @author: Wyatt Hedrick, Kelton Karboviak
         '''
-        ourRunway = None
+        t = self.thresholds
+        ourRunway = self.runwayCorridors(airport).runwayAt(airplanePoint, airplaneHdg, t.runwaySelection)
+        if ourRunway is not None:
+            return ourRunway
+
+        # Outside of every approach corridor, fall back on the runway with the closest center
         closestDifference = 0
         for runway in airport.runways:
-            if 180 - abs(abs(runway.magHeading - airplaneHdg) - 180) <= RUNWAY_SELECTION_INDICATOR:
+            if 180 - abs(abs(runway.magHeading - airplaneHdg) - 180) <= t.runwaySelection:
                 dLat = abs(runway.centerLatLon.lat - airplanePoint.lat)  # getting difference in lat and lon
                 dLon = abs(runway.centerLatLon.lon - airplanePoint.lon)
                 totalDifference = dLat + dLon
@@ -390,50 +534,93 @@ class FlightAnalyzer(object):
         return ourRunway
     # end def detectRunway()
 
+    def runwayCorridors(self, airport):
+        '''
+        @return: the RunwayCorridors of the airport's runways, built the first time the airport is approached
+        '''
+        corridors = self.corridors.get(airport.code)
+        if corridors is None:
+            corridors = self.corridors[airport.code] = RunwayCorridors(
+                airport, float(RUNWAY_CORRIDOR_LENGTH) / EARTH_RADIUS_MILES, float(RUNWAY_CORRIDOR_MARGIN) / EARTH_RADIUS_FEET
+            )
+        return corridors
+    # end def runwayCorridors()
+
+    def runwayFrame(self, runway, airport):
+        '''
+        Projects the final approach to the runway chosen by detectRunway() into the runway's local
+            tangent plane, where its cross track errors and distances to the airport are cheap.
+        @param: runway the runway the airplane is attempting to land on, or None
+        @param: airport the airport of the approach
+        @return: the RunwayFrame, or None if there is no runway or the frame can be off by more than
+            RUNWAY_FRAME_TOLERANCE within APPROACH_MIN_DISTANCE of the airport
+        '''
+        t = self.thresholds
+        if runway is None:
+            return None
+        frame = self.runwayCorridors(airport).frameOf(runway)
+        if frame.maxError(float(t.minDistance) / EARTH_RADIUS_MILES) * EARTH_RADIUS_FEET > RUNWAY_FRAME_TOLERANCE:
+            return None
+        return frame
+    # end def runwayFrame()
+
     def outputToDB(self):
         '''
         Outputs the approach analysis information to the approaches table
-            within the database.
+            within the database, through the analyzer's ResultWriter.
         @return: None
         @author: Kelton Karboviak
         '''
-        values = []
-        for id, approach in self.approaches.iteritems():
-            valuesTup = (
-                self.flightID,
-                id + 1,
-                approach['airport-code'],
-                approach['runway-code'],
-                approach['approach-start'],
-                approach['approach-end'],
-                approach['landing-start'],
-                approach['landing-end'],
-                approach['landing-type'],
-                int( len(approach['unstable']) > 0 ),
-                None if len(approach['HDG']) == 0 else sum(approach['HDG']) / len(approach['HDG']),
-                None if len(approach['F1']) == 0 else sum(approach['F1']) / len(approach['F1']),
-                None if len(approach['CTR']) == 0 else sum(approach['CTR']) / len(approach['CTR']),
-                None if len(approach['F2']) == 0 else sum(approach['F2']) / len(approach['F2']),
-                None if len(approach['IAS']) == 0 else sum(approach['IAS']) / len(approach['IAS']),
-                None if len(approach['A']) == 0 else sum(approach['A']) / len(approach['A']),
-                None if len(approach['VSI']) == 0 else sum(approach['VSI']) / len(approach['VSI']),
-                None if len(approach['S']) == 0 else sum(approach['S']) / len(approach['S']),
-            )
-            values.append(valuesTup)
-        # end for
-
-        # print insertSQL % str(values)  # TEST TEST TEST
-        print '\n'.join([str(tup) for tup in values])
-
-        try:
-            # self.cursor.execute( insertSQL % ', '.join(values) )
-            if len(values) > 0:  # Check to see if flight has any approaches to insert
-                self.cursor.executemany(insertSQL, values)
-            self.cursor.execute( updateAnalysesSQL, (self.flightID,) )
-            self.db.commit()
-        except mysql.Error, e:
-            print "MySQL Error [%d]: %s\n" % (e.args[0], e.args[1])
-            print "Last Executed Query: ", self.cursor._last_executed
-            self.db.rollback()
+        values = [approachRow(self.flightID, id, approach) for id, approach in self.approaches.iteritems()]
+        self.outputRows(self.flightID, values)
     # end def outputToDB()
+
+    def outputRows(self, flightID, values, finished=True):
+        '''
+        Reports a flight's rows for the approaches table as approach_result events and hands them to the ResultWriter.
+        @param: flightID the flight the rows belong to
+        @param: values list of the rows, ordered like insertKeysList
+        @param: finished whether the flight's analysis is done, so it is marked analyzed along with the rows
+        '''
+        if self.events.info:
+            for valuesTup in values:
+                self.events.emit(
+                    'approach_result', flight=valuesTup[0], approach=valuesTup[1], **dict(zip(insertKeysList[2:], valuesTup[2:]))
+                )
+
+        if finished:
+            self.writer.add(flightID, values)
+        else:
+            self.writer.addApproaches(values)
+    # end def outputRows()
 # end class FlightAnalyzer
+
+
+def approachRow(flightID, id, approach):
+    '''
+    @param: flightID the flight the approach belongs to
+    @param: id the approach's key in the approaches dict
+    @param: approach the approach's dict, as filled in by analyzeApproaches() and analyzeLanding()
+    @return: the approach's row for the approaches table, ordered like insertKeysList
+    '''
+    return (
+        flightID,
+        id + 1,
+        approach['airport-code'],
+        approach['runway-code'],
+        approach['approach-start'],
+        approach['approach-end'],
+        approach['landing-start'],
+        approach['landing-end'],
+        approach['landing-type'],
+        int( len(approach['unstable']) > 0 ),
+        None if len(approach['HDG']) == 0 else sum(approach['HDG']) / len(approach['HDG']),
+        None if len(approach['F1']) == 0 else sum(approach['F1']) / len(approach['F1']),
+        None if len(approach['CTR']) == 0 else sum(approach['CTR']) / len(approach['CTR']),
+        None if len(approach['F2']) == 0 else sum(approach['F2']) / len(approach['F2']),
+        None if len(approach['IAS']) == 0 else sum(approach['IAS']) / len(approach['IAS']),
+        None if len(approach['A']) == 0 else sum(approach['A']) / len(approach['A']),
+        None if len(approach['VSI']) == 0 else sum(approach['VSI']) / len(approach['VSI']),
+        None if len(approach['S']) == 0 else sum(approach['S']) / len(approach['S']),
+    )
+# end def approachRow()
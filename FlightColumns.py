@@ -0,0 +1,59 @@
+import numpy as np
+
+
+class FlightColumns(object):
+    '''
+    Columnar representation of a flight's data: one contiguous float64 array per
+        column of the main table, all indexed by sample number.
+    '''
+
+    COLUMNS = [
+        'time', 'msl_altitude', 'indicated_airspeed', 'vertical_airspeed', 'heading', 'latitude', 'longitude'
+    ]
+
+    def __init__(self, **columns):
+        for name in self.COLUMNS:
+            setattr(self, name, np.ascontiguousarray(columns[name], dtype=np.float64))
+    # end def __init__()
+
+    def __len__(self):
+        return len(self.time)
+    # end def __len__()
+
+    @classmethod
+    def fromRows(cls, rows):
+        '''
+        Builds the columns from the dict rows returned by a DictCursor.
+        Rows that contain NULL values are filtered out, same as for the row-based analyzer.
+        @param: rows the rows fetched with fetchFlightDataSQL
+        @return: a FlightColumns holding the valid rows
+        '''
+        rows = [row for row in rows if None not in row.values()]
+        return cls(**dict((name, [row[name] for row in rows]) for name in cls.COLUMNS))
+    # end def fromRows()
+
+    @classmethod
+    def fromArray(cls, array, names):
+        '''
+        Builds the columns from a 2-d array with one row per sample, as read by DataSource.streamFlights()
+            (DataSource.streamSamples() hands out the same rows one dict at a time instead).
+        Rows with a NaN (a NULL value in the DB) in any column are filtered out.
+        @param: array n x len(names) float64 array
+        @param: names the names of the array's columns, which must include all of COLUMNS
+        @return: a FlightColumns holding the valid rows
+        '''
+        valid = ~np.isnan(array).any(axis=1)
+        if not valid.all():
+            array = array[valid]
+        return cls(**dict((name, array[:, names.index(name)]) for name in cls.COLUMNS))
+    # end def fromArray()
+
+    def toRecords(self):
+        '''
+        @return: list of one dict per sample, with the same keys and values as the rows of a DictCursor
+        '''
+        columns = [getattr(self, name).tolist() for name in self.COLUMNS]
+        return [dict(zip(self.COLUMNS, values)) for values in zip(*columns)]
+    # end def toRecords()
+
+# end class FlightColumns
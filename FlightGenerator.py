@@ -0,0 +1,312 @@
+import math
+import random
+import numpy as np
+import LatLonArray
+from FlightAnalysis import APPROACH_MIN_DISTANCE, EARTH_RADIUS_FEET, EARTH_RADIUS_MILES
+from FlightColumns import FlightColumns
+
+
+KNOTS_TO_FEET_PER_SECOND = 1.68781
+
+LANDING_TYPES = ['touch-and-go', 'full-stop', 'go-around']
+UNSTABLE_FINALS = ['fast', 'slow', 'sink', 'offset', 'crab']
+
+
+class FlightGenerator(object):
+    '''
+    Generates synthetic flight data of pattern work around real runways, for benchmarking.
+
+    A flight takes off, flies a number of closed left-hand traffic circuits and ends
+        with a full stop. Every circuit flies upwind, crosswind, downwind, base and final
+        and ends in a touch-and-go, full stop or go-around. Finals are stable, or with
+        probability unstableRate one of fast, slow, sinking too fast, offset from the
+        center line or crabbed. Optionally the last circuit is preceded by a cross-country
+        leg, which makes the flight longer without adding approaches.
+
+    The aircraft is simulated in a flat frame aligned with the runway, following each leg
+        of the circuit with a limited turn rate, acceleration and climb/descent rate. The
+        samples are converted to latitude/longitude around the runway's center and get
+        a little sensor noise.
+    '''
+
+    TURN_RATE = 3.0  # Standard rate turn, degrees per second
+    ACCELERATION = 2.0  # Knots per second
+    MAX_CLIMB = 900  # Feet per minute
+    MAX_DESCENT = 1500  # Feet per minute
+    LOOKAHEAD = 1500  # Feet ahead on the leg's course that the aircraft steers towards
+
+    PATTERN_ALTITUDE = 1000  # Feet AGL
+    PATTERN_WIDTH = 4500  # Feet between the runway and the downwind leg
+    UPWIND_LENGTH = 5000  # Feet past the runway center before turning crosswind
+    FINAL_LENGTH = 8000  # Feet between the base turn and the runway center
+    STEEP_FINAL_LENGTH = 2500  # Feet from the runway center that a sinking final starts descending
+    GO_AROUND_ALTITUDE = 60  # Feet AGL
+    CRUISE_ALTITUDE = 3500  # Feet AGL
+
+    def __init__(self, runways, seed=0, sampleRate=1.0, unstableRate=0.3):
+        '''
+        @param: runways list of the Runways to fly the circuits at
+        @param: seed seed of the random choices and the sensor noise
+        @param: sampleRate samples per second
+        @param: unstableRate probability of an unstable final
+        '''
+        self.runways = [runway for runway in runways if runway.trueHeading > 0]
+        self.random = random.Random(seed)
+        self.sampleRate = sampleRate
+        self.unstableRate = unstableRate
+    # end def __init__()
+
+    @classmethod
+    def forDatabase(cls, database, **kwargs):
+        '''
+        @param: database the AirportDatabase, whose runways from data/AirportsDetailed.csv are flown at
+        @return: a FlightGenerator
+        '''
+        runways = []
+        for position in np.flatnonzero(database.airportRows['runwayCount'] > 0):
+            airport = database.airportAt(int(position))
+            # Skip runways whose approaches would never be detected: too far from the airport's
+            # center, or closer to another airport than to their own
+            runways.extend(
+                runway for runway in airport.runways
+                if runway.centerLatLon.distanceTo(airport.centerLatLon, EARTH_RADIUS_MILES) < APPROACH_MIN_DISTANCE / 2.0
+                and database.index.nearest(runway.centerLatLon).code == airport.code
+            )
+        # end for
+        return cls(runways, **kwargs)
+    # end def forDatabase()
+
+    def flight(self, circuits=6, cruiseMinutes=0.0, runway=None):
+        '''
+        Generates a flight.
+        @param: circuits the number of traffic circuits to fly
+        @param: cruiseMinutes length of the cross-country leg before the last circuit, 0 for none
+        @param: runway the Runway to fly at, a random one if None
+        @return: (runway, FlightColumns) of the flight
+        '''
+        if runway is None:
+            runway = self.random.choice(self.runways)
+
+        track = Track(self, 1.0 / self.sampleRate)
+        track.hold(30)
+        track.takeOff()
+
+        for circuit in xrange(circuits):
+            if circuit == circuits - 1:
+                landingType = 'full-stop'
+                if cruiseMinutes > 0:
+                    track.crossCountry(cruiseMinutes)
+            else:
+                landingType = self.random.choice(LANDING_TYPES)
+            final = self.random.choice(UNSTABLE_FINALS) if self.random.random() < self.unstableRate else 'stable'
+            track.circuit(final, landingType)
+        # end for
+
+        return runway, track.columns(runway, self.random)
+    # end def flight()
+
+    def flights(self, count, **kwargs):
+        '''
+        @return: generator of count flights, see flight()
+        '''
+        for _ in xrange(count):
+            yield self.flight(**kwargs)
+    # end def flights()
+
+# end class FlightGenerator
+
+
+class Track(object):
+    '''
+    The simulated aircraft and the samples recorded so far, in the runway's frame: u is
+        the distance along the runway from its center and v the distance to the right of
+        it (both in feet), and headings are relative to the runway's heading.
+    '''
+
+    def __init__(self, generator, dt):
+        self.generator = generator
+        self.dt = dt
+        self.u = self.v = 0.0
+        self.agl = 0.0
+        self.heading = 0.0
+        self.ias = 0.0
+        self.vsi = 0.0
+        self.crab = 0.0  # Difference between the heading flown and the direction of travel
+        self.samples = []
+    # end def __init__()
+
+    def step(self, heading, ias, vsi, seconds=None):
+        '''
+        Flies towards the given heading and speed at the given vertical speed, for one sample or for seconds.
+        '''
+        g = self.generator
+        for _ in xrange(1 if seconds is None else max(1, int(round(seconds / self.dt)))):
+            turn = (heading - self.heading + 180) % 360 - 180
+            self.heading += max(-g.TURN_RATE * self.dt, min(g.TURN_RATE * self.dt, turn))
+            self.ias += max(-g.ACCELERATION * self.dt, min(g.ACCELERATION * self.dt, ias - self.ias))
+            self.vsi = vsi if self.agl + vsi / 60.0 * self.dt > 0 else -self.agl / self.dt * 60.0
+            self.agl += self.vsi / 60.0 * self.dt
+
+            distance = self.ias * KNOTS_TO_FEET_PER_SECOND * self.dt
+            self.u += distance * math.cos(math.radians(self.heading))
+            self.v += distance * math.sin(math.radians(self.heading))
+            self.samples.append((self.u, self.v, self.agl, self.heading + self.crab, self.ias, self.vsi))
+        # end for
+    # end def step()
+
+    def hold(self, seconds):
+        self.step(self.heading, 0, 0, seconds)
+    # end def hold()
+
+    def takeOff(self):
+        '''
+        Accelerates along the current heading and lifts off at 60 knots.
+        '''
+        while self.ias < 60:
+            self.step(self.heading, 65, 0)
+    # end def takeOff()
+
+    def fly(self, u, v, agl, ias, origin=None, lead=0.0, untilAGL=None):
+        '''
+        Flies the leg from origin to (u, v), tracking the straight line between them
+            and climbing or descending to arrive at agl.
+        @param: origin (u, v) the leg starts at, the current position if None
+        @param: lead distance before (u, v) at which to stop, to turn onto the next leg in time
+        @param: untilAGL stop as soon as the aircraft descends to this height
+        '''
+        g = self.generator
+        u0, v0 = (self.u, self.v) if origin is None else origin
+        course = math.degrees(math.atan2(v - v0, u - u0))
+        length = math.hypot(u - u0, v - v0)
+        cosC, sinC = math.cos(math.radians(course)), math.sin(math.radians(course))
+
+        while True:
+            along = (self.u - u0) * cosC + (self.v - v0) * sinC
+            across = -(self.u - u0) * sinC + (self.v - v0) * cosC
+            remaining = length - along
+            if remaining <= lead or (untilAGL is not None and self.agl <= untilAGL):
+                break
+
+            correction = math.degrees(math.atan2(across, g.LOOKAHEAD))
+            timeToGo = max(remaining / max(self.ias * KNOTS_TO_FEET_PER_SECOND, 1.0), self.dt)
+            vsi = max(-g.MAX_DESCENT, min(g.MAX_CLIMB, (agl - self.agl) / timeToGo * 60.0))
+            self.step(course - correction, ias, vsi)
+        # end while
+    # end def fly()
+
+    def legs(self, waypoints, untilAGL=None):
+        '''
+        Flies through a list of (u, v, agl, ias) waypoints, starting each turn early enough
+            to roll out on the next leg.
+        @param: untilAGL stop the last leg as soon as the aircraft descends to this height
+        '''
+        origin = (self.u, self.v)
+        for i, (u, v, agl, ias) in enumerate(waypoints):
+            lead = 0.0
+            if i + 1 < len(waypoints):
+                nu, nv = waypoints[i + 1][:2]
+                course = math.atan2(v - origin[1], u - origin[0])
+                turn = abs((math.degrees(math.atan2(nv - v, nu - u) - course) + 180) % 360 - 180)
+                radius = ias * KNOTS_TO_FEET_PER_SECOND / math.radians(self.generator.TURN_RATE)
+                lead = radius * math.tan(math.radians(min(turn, 120)) / 2)
+            self.fly(u, v, agl, ias, origin=origin, lead=lead, untilAGL=untilAGL if i + 1 == len(waypoints) else None)
+            origin = (u, v)
+        # end for
+    # end def legs()
+
+    def crossCountry(self, minutes):
+        '''
+        Climbs out to cruise altitude, flies away for half of minutes and comes back
+            to join the downwind leg.
+        '''
+        g = self.generator
+        distance = 110 * KNOTS_TO_FEET_PER_SECOND * minutes * 60 / 2 / math.sqrt(2)
+        self.legs([
+            (max(self.u + 2000, g.UPWIND_LENGTH), 0, 700, 75),
+            (g.UPWIND_LENGTH + distance, -distance, g.CRUISE_ALTITUDE, 110),
+            (g.UPWIND_LENGTH, -g.PATTERN_WIDTH, g.PATTERN_ALTITUDE, 95),
+        ])
+    # end def crossCountry()
+
+    def circuit(self, final, landingType):
+        '''
+        Flies a traffic circuit from the current position, ending with the given final and landing.
+        @param: final 'stable' or one of UNSTABLE_FINALS
+        @param: landingType one of LANDING_TYPES
+        '''
+        g = self.generator
+        offset = 120 if final == 'offset' else 0  # Feet right of the center line
+        finalIAS = {'fast': 84, 'slow': 50}.get(final, 65)
+        self.crab = 15.0 if final == 'crab' else 0.0  # Crabbing into a crosswind, all the way to the runway
+
+        if self.v > -g.PATTERN_WIDTH / 2:  # Still on the runway's center line, not joining downwind
+            self.legs([
+                (max(self.u + 2000, g.UPWIND_LENGTH), 0, 700, 75),
+                (g.UPWIND_LENGTH, -g.PATTERN_WIDTH, g.PATTERN_ALTITUDE, 85),
+            ])
+        waypoints = [
+            (-g.FINAL_LENGTH, -g.PATTERN_WIDTH, g.PATTERN_ALTITUDE, 90),
+            (-g.FINAL_LENGTH, offset, 600, 75),
+        ]
+        if final == 'sink':  # Stays high on final, then dives for the runway
+            waypoints.append((-g.STEEP_FINAL_LENGTH, offset, 600, finalIAS))
+        waypoints.append((0, offset, 0, finalIAS))
+        self.legs(waypoints, untilAGL=g.GO_AROUND_ALTITUDE if landingType == 'go-around' else None)
+        self.crab = 0.0
+
+        if landingType == 'go-around':
+            self.step(0, 75, g.MAX_CLIMB, 20)
+        elif landingType == 'touch-and-go':
+            self.step(0, 50, 0, 10)
+            self.takeOff()
+        else:
+            while self.ias > 10:
+                self.step(0, 0, 0)
+            self.step(0, 10, 0, 30)
+            self.takeOff()
+    # end def circuit()
+
+    def columns(self, runway, rnd):
+        '''
+        Converts the samples to the columns of a flight at runway, with sensor noise.
+        @return: the FlightColumns
+        '''
+        u, v, agl, heading, ias, vsi = [np.array(values) for values in zip(*self.samples)]
+        n = len(u)
+        noise = lambda sigma: np.array([rnd.gauss(0, sigma) for _ in xrange(n)])
+
+        # Runway relative to compass headings, true for the position and magnetic for the heading channel
+        trueHeading = runway.trueHeading + heading
+        variation = runway.trueHeading - runway.magHeading
+        east = u * math.sin(math.radians(runway.trueHeading)) + v * math.cos(math.radians(runway.trueHeading))
+        north = u * math.cos(math.radians(runway.trueHeading)) - v * math.sin(math.radians(runway.trueHeading))
+        lat, lon = LatLonArray.destinationPoint(
+            np.full(n, runway.centerLatLon.lat), np.full(n, runway.centerLatLon.lon),
+            np.hypot(east, north) + noise(5.0), np.degrees(np.arctan2(east, north)), EARTH_RADIUS_FEET
+        )
+
+        return FlightColumns(
+            time=np.arange(n) * self.dt,
+            msl_altitude=runway.alt + agl + noise(3.0),
+            indicated_airspeed=ias + noise(1.5),
+            vertical_airspeed=vsi + noise(50.0),
+            heading=(trueHeading - variation + noise(1.0)) % 360,
+            latitude=lat,
+            longitude=lon,
+        )
+    # end def columns()
+
+# end class Track
+
+
+def flightRows(flightID, columns):
+    '''
+    @return: list of the flight's rows for the main table, ordered like DataSource.FLIGHT_DATA_COLUMNS
+    '''
+    n = len(columns)
+    return zip(
+        [flightID] * n, columns.time.tolist(), columns.msl_altitude.tolist(), columns.indicated_airspeed.tolist(),
+        columns.vertical_airspeed.tolist(), columns.heading.tolist(), columns.latitude.tolist(), columns.longitude.tolist(),
+        [0.0] * n, [2400.0] * n
+    )
+# end def flightRows()
@@ -20,10 +20,15 @@ class LatLon(object):
      * Note on a spherical model earth, an n-vector is equivalent to a normalized version of an (ECEF)
      * cartesian coordinate.
      *
+     * Points are treated as immutable: the n-vector of a point is computed on first use and
+     * reused by every later calculation involving that point.
+     *
      * @module   latlon-vectors
      * @requires vector3d
     '''
 
+    __slots__ = ('lat', 'lon', '_vector')
+
     def __init__(self, lat, lon):
         '''
          * Creates a LatLon point on spherical model earth.
@@ -37,6 +42,7 @@ class LatLon(object):
         '''
         self.lat = lat
         self.lon = lon
+        self._vector = None
     # end def __init__()
 
     def __str__(self):
@@ -52,20 +58,25 @@ class LatLon(object):
         '''
          * Converts ‘this’ lat/lon point to Vector3d n-vector (normal to earth's surface).
          *
+         * The n-vector is cached on the point, so callers must not modify the returned vector.
+         *
          * @returns {Vector3d} Normalized n-vector representing lat/lon point.
          *
          * @example
          *   var p = new LatLon(45, 45);
          *   var v = p.toVector(); // [0.5000,0.5000,0.7071]
         '''
-        rLat = math.radians(self.lat)
-        rLon = math.radians(self.lon)
+        if self._vector is None:
+            rLat = math.radians(self.lat)
+            rLon = math.radians(self.lon)
 
-        x = math.cos(rLat) * math.cos(rLon)
-        y = math.cos(rLat) * math.sin(rLon)
-        z = math.sin(rLat)
+            x = math.cos(rLat) * math.cos(rLon)
+            y = math.cos(rLat) * math.sin(rLon)
+            z = math.sin(rLat)
 
-        return Vector3d(x, y, z)
+            self._vector = Vector3d(x, y, z)
+
+        return self._vector
     # end def toVector()
 
     def greatCircle(self, bearing):
@@ -110,7 +121,7 @@ class LatLon(object):
         p1 = self.toVector()
         p2 = point.toVector()
 
-        delta = p1.angleTo(p2)
+        delta = angleBetween(p1.x, p1.y, p1.z, p2.x, p2.y, p2.z)
         d = delta * radius
 
         return d
@@ -222,12 +233,7 @@ class LatLon(object):
             # great circle defined by point + bearing
             gc = pathStart.greatCircle(pathBrngEnd)
 
-        alpha = gc.angleTo(p, p.cross(gc))  # (signed) angle between point & great circle normal vector
-        alpha = -math.pi / 2 - alpha if alpha < 0 else math.pi / 2 - alpha  # (signed) angle between point & great circle
-
-        d = alpha * radius
-
-        return d
+        return crossTrackAngle(p.x, p.y, p.z, gc.x, gc.y, gc.z) * radius
     # end def crossTrackDistanceTo()
 
     def toString(self, precision=5):
@@ -261,3 +267,53 @@ def toLatLonS(self):
 
 # Assign toLatLonS function prototype to Vector3d class
 Vector3d.toLatLonS = toLatLonS
+
+
+def angleBetween(x1, y1, z1, x2, y2, z2):
+    '''
+     * Angle between two vectors given by their components, without building any Vector3d.
+     *
+     * Same as Vector3d(x1, y1, z1).angleTo(Vector3d(x2, y2, z2)).
+     *
+     * @returns {number} Angle (in radians) between the two vectors.
+    '''
+    # cross product
+    x = y1*z2 - z1*y2
+    y = z1*x2 - x1*z2
+    z = x1*y2 - y1*x2
+
+    sinTheta = math.sqrt(x*x + y*y + z*z)
+    cosTheta = x1*x2 + y1*y2 + z1*z2
+
+    return math.atan2(sinTheta, cosTheta)
+# end def angleBetween()
+
+
+def crossTrackAngle(x, y, z, gcx, gcy, gcz):
+    '''
+     * (Signed) angle from the n-vector (x, y, z) to the great circle with normal (gcx, gcy, gcz),
+     * without building any Vector3d.
+     *
+     * Multiplied by the earth's radius this is the same as LatLon.crossTrackDistanceTo().
+     *
+     * @returns {number} Angle (in radians) to the great circle (-ve if to left, +ve if to right of path).
+    '''
+    # gc.cross(p)
+    cx = gcy*z - gcz*y
+    cy = gcz*x - gcx*z
+    cz = gcx*y - gcy*x
+
+    # p.cross(gc), the reference used to sign the angle
+    sx = y*gcz - z*gcy
+    sy = z*gcx - x*gcz
+    sz = x*gcy - y*gcx
+
+    sinTheta = math.sqrt(cx*cx + cy*cy + cz*cz)
+    cosTheta = gcx*x + gcy*y + gcz*z
+
+    if cx*sx + cy*sy + cz*sz < 0:
+        sinTheta = -sinTheta
+
+    alpha = math.atan2(sinTheta, cosTheta)  # (signed) angle between point & great circle normal vector
+    return -math.pi / 2 - alpha if alpha < 0 else math.pi / 2 - alpha  # (signed) angle between point & great circle
+# end def crossTrackAngle()
@@ -0,0 +1,252 @@
+# coding: utf-8
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -  #
+#  Vector-based spherical geodetic (latitude/longitude) functions    (c) Chris Veness 2011-2016  #
+#                                                                                   MIT Licence  #
+# www.movable-type.co.uk/scripts/latlong-vectors.html                                            #
+# www.movable-type.co.uk/scripts/geodesy/docs/module-latlon-nvector-spherical.html               #
+# - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -  #
+
+'''
+ * Batch (array) versions of the LatLon and Vector3d functions.
+ *
+ * Every function takes NumPy arrays of latitudes/longitudes (or anything that broadcasts
+ * against them, such as a single path start point or bearing) and evaluates the same
+ * n-vector formulas as the scalar LatLon methods, element by element, so the results
+ * match the scalar ones to within floating point rounding.
+ *
+ * Vectors are passed around as 3 x n arrays: v[0], v[1] and v[2] are the x, y and z
+ * components, so a single vector is just an array of shape (3,).
+ *
+ * @module   latlon-array
+ * @requires numpy
+'''
+
+import numpy as np
+
+
+DEFAULT_RADIUS = 6371000  # (Mean) radius of earth in meters
+
+
+def toVectors(lat, lon):
+    '''
+     * Converts lat/lon points to n-vectors (normal to earth's surface).
+     *
+     * @param   {ndarray} lat - Latitudes in degrees.
+     * @param   {ndarray} lon - Longitudes in degrees.
+     * @returns {ndarray} 3 x n array of normalized n-vectors, same as LatLon.toVector().
+    '''
+    rLat = np.radians(lat)
+    rLon = np.radians(lon)
+
+    x = np.cos(rLat) * np.cos(rLon)
+    y = np.cos(rLat) * np.sin(rLon)
+    z = np.sin(rLat)
+
+    return np.array([x, y, z])
+# end def toVectors()
+
+
+def toLatLons(v):
+    '''
+     * Converts (geocentric) cartesian vectors to (spherical) latitude/longitude points.
+     *
+     * @param   {ndarray} v - 3 x n array of vectors.
+     * @returns {tuple}   (lat, lon) arrays in degrees, same as Vector3d.toLatLonS().
+    '''
+    rLat = np.arctan2(v[2], np.sqrt(v[0]*v[0] + v[1]*v[1]))
+    rLon = np.arctan2(v[1], v[0])
+    return np.degrees(rLat), np.degrees(rLon)
+# end def toLatLons()
+
+
+def cross(v1, v2):
+    '''
+     * Cross (vector) products of two arrays of vectors.
+     *
+     * @returns {ndarray} 3 x n array, same as Vector3d.cross().
+    '''
+    x = v1[1]*v2[2] - v1[2]*v2[1]
+    y = v1[2]*v2[0] - v1[0]*v2[2]
+    z = v1[0]*v2[1] - v1[1]*v2[0]
+
+    return np.array([x, y, z])
+# end def cross()
+
+
+def dot(v1, v2):
+    '''
+     * Dot (scalar) products of two arrays of vectors.
+     *
+     * @returns {ndarray} Array of dot products, same as Vector3d.dot().
+    '''
+    return v1[0]*v2[0] + v1[1]*v2[1] + v1[2]*v2[2]
+# end def dot()
+
+
+def lengths(v):
+    '''
+     * Lengths (magnitudes or norms) of an array of vectors.
+     *
+     * @returns {ndarray} Array of magnitudes, same as Vector3d.length().
+    '''
+    return np.sqrt(v[0]*v[0] + v[1]*v[1] + v[2]*v[2])
+# end def lengths()
+
+
+def units(v):
+    '''
+     * Normalizes an array of vectors – vectors that are already unit or zero magnitude are left as is.
+     *
+     * @returns {ndarray} 3 x n array of normalized vectors, same as Vector3d.unit().
+    '''
+    norm = lengths(v)
+    return v / np.where((norm == 1) | (norm == 0), 1, norm)
+# end def units()
+
+
+def angleBetween(v1, v2, vSign=None):
+    '''
+     * Calculates the angles between two arrays of vectors.
+     *
+     * @param   {ndarray} v1 - 3 x n array of vectors.
+     * @param   {ndarray} v2 - 3 x n array of vectors.
+     * @param   {ndarray} [vSign] - If supplied (and out of plane of v1 and v2), angle is signed +ve if
+     *     v1->v2 is clockwise looking along vSign, -ve in opposite direction (otherwise unsigned angle).
+     * @returns {ndarray} Angles (in radians), same as Vector3d.angleTo().
+    '''
+    c = cross(v1, v2)
+    sinTheta = lengths(c)
+    cosTheta = dot(v1, v2)
+
+    if vSign is not None:
+        # use vSign as reference to get sign of sinTheta
+        sinTheta = np.where(dot(c, vSign) < 0, -sinTheta, sinTheta)
+
+    return np.arctan2(sinTheta, cosTheta)
+# end def angleBetween()
+
+
+def greatCircles(lat, lon, bearing):
+    '''
+     * N-vectors normal to the great circles obtained by heading on the given bearings from the given points.
+     *
+     * @param   {ndarray} lat - Latitudes in degrees.
+     * @param   {ndarray} lon - Longitudes in degrees.
+     * @param   {ndarray} bearing - Compass bearings in degrees.
+     * @returns {ndarray} 3 x n array of great circle normals, same as LatLon.greatCircle().
+    '''
+    rLat = np.radians(lat)
+    rLon = np.radians(lon)
+    theta = np.radians(bearing)
+
+    x =  np.sin(rLon) * np.cos(theta) - np.sin(rLat) * np.cos(rLon) * np.sin(theta)
+    y = -np.cos(rLon) * np.cos(theta) - np.sin(rLat) * np.sin(rLon) * np.sin(theta)
+    z =  np.cos(rLat) * np.sin(theta)
+
+    return np.array([x, y, z])
+# end def greatCircles()
+
+
+def distanceTo(lat1, lon1, lat2, lon2, radius=None):
+    '''
+     * Returns the distances from the first points to the second points.
+     *
+     * @param   {ndarray} lat1, lon1 - Latitudes/longitudes of start points.
+     * @param   {ndarray} lat2, lon2 - Latitudes/longitudes of destination points.
+     * @param   {number}  [radius=6371e3] - (Mean) radius of earth (defaults to radius in meters).
+     * @returns {ndarray} Distances in same units as radius, same as LatLon.distanceTo().
+    '''
+    radius = DEFAULT_RADIUS if radius is None else radius
+    return vectorDistances(toVectors(lat1, lon1), toVectors(lat2, lon2), radius)
+# end def distanceTo()
+
+
+def vectorDistances(v1, v2, radius=None):
+    '''
+     * Same as distanceTo() for points already converted to n-vectors.
+    '''
+    radius = DEFAULT_RADIUS if radius is None else radius
+    return angleBetween(v1, v2) * radius
+# end def vectorDistances()
+
+
+def bearingTo(lat1, lon1, lat2, lon2):
+    '''
+     * Returns the (initial) bearings from the first points to the second points, in compass degrees.
+     *
+     * @param   {ndarray} lat1, lon1 - Latitudes/longitudes of start points.
+     * @param   {ndarray} lat2, lon2 - Latitudes/longitudes of destination points.
+     * @returns {ndarray} Initial bearings in degrees from North (0°..360°), same as LatLon.bearingTo().
+    '''
+    p1 = toVectors(lat1, lon1)
+    p2 = toVectors(lat2, lon2)
+
+    northPole = np.array([0.0, 0.0, 1.0]).reshape((3,) + (1,) * (p1.ndim - 1))
+
+    c1 = cross(p1, p2)         # great circle through p1 & p2
+    c2 = cross(p1, northPole)  # great circle through p1 & north pole
+
+    # bearing is (signed) angle between c1 & c2
+    bearing = np.degrees( angleBetween(c1, c2, p1) )
+
+    return (bearing + 360) % 360  # normalize to [0, 360]
+# end def bearingTo()
+
+
+def destinationPoint(lat, lon, distance, bearing, radius=None):
+    '''
+     * Returns the destination points having travelled the given distances on the given initial bearings.
+     *
+     * @param   {ndarray} lat, lon - Latitudes/longitudes of start points.
+     * @param   {ndarray} distance - Distances travelled, in same units as earth radius (default: meters).
+     * @param   {ndarray} bearing - Initial bearings in degrees from north.
+     * @param   {number}  [radius=6371e3] - (Mean) radius of earth (defaults to radius in meters).
+     * @returns {tuple}   (lat, lon) arrays of destination points, same as LatLon.destinationPoint().
+    '''
+    radius = DEFAULT_RADIUS if radius is None else radius
+
+    delta = np.asarray(distance, dtype=np.float64) / radius  # angular distances in radians
+
+    # get great circles obtained by starting from the points on the given bearings
+    c = greatCircles(lat, lon, bearing)
+
+    p1 = toVectors(lat, lon)
+
+    x = p1 * np.cos(delta)               # component of p2 parallel to p1
+    y = cross(c, p1) * np.sin(delta)     # component of p2 perpendicular to p1
+
+    return toLatLons(units(x + y))
+# end def destinationPoint()
+
+
+def crossTrackDistanceTo(lat, lon, pathStartLat, pathStartLon, pathBrng, radius=None):
+    '''
+     * Returns (signed) distances from the points to the great circles defined by start-points and bearings.
+     *
+     * @param   {ndarray} lat, lon - Latitudes/longitudes of the points.
+     * @param   {ndarray} pathStartLat, pathStartLon - Start points of the great circle paths.
+     * @param   {ndarray} pathBrng - Initial bearings from the great circle start points.
+     * @param   {number}  [radius=6371e3] - (Mean) radius of earth (defaults to radius in meters).
+     * @returns {ndarray} Distances to the great circles (-ve if to left, +ve if to right of path),
+     *     same as LatLon.crossTrackDistanceTo() with a bearing.
+    '''
+    gc = greatCircles(pathStartLat, pathStartLon, pathBrng)
+    return crossTrackToGreatCircle(toVectors(lat, lon), gc, radius)
+# end def crossTrackDistanceTo()
+
+
+def crossTrackToGreatCircle(p, gc, radius=None):
+    '''
+     * Same as crossTrackDistanceTo() for points already converted to n-vectors and
+     * great circles given by their normals (eg from greatCircles()).
+    '''
+    radius = DEFAULT_RADIUS if radius is None else radius
+
+    if gc.ndim < p.ndim:
+        gc = gc.reshape(gc.shape + (1,) * (p.ndim - gc.ndim))
+
+    alpha = angleBetween(gc, p, cross(p, gc))  # (signed) angle between point & great circle normal vector
+    alpha = np.where(alpha < 0, -np.pi / 2 - alpha, np.pi / 2 - alpha)  # (signed) angle between point & great circle
+
+    return alpha * radius
+# end def crossTrackToGreatCircle()
@@ -0,0 +1,279 @@
+#!/usr/bin/env python
+
+import argparse
+import logging
+import time
+from DataSource import openDataSource, fetchFlightsDataSQL, placeholders
+from StreamingAnalysis import ApproachTracker
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POLL_SECONDS = 2.0  # Seconds between two polls for new rows
+DEFAULT_IDLE_SECONDS = 300.0  # Seconds without new rows after which a flight is considered over
+POLL_BATCH = 200  # Flights per query for new rows, two parameters each
+
+
+class FollowedFlight(object):
+    '''
+    What a LiveMonitor keeps about a flight between polls.
+    '''
+
+    def __init__(self, analyzer, flightID, thresholds, now, written=None):
+        self.tracker = ApproachTracker(analyzer, flightID)  # Where the analysis of the flight stands
+        self.thresholds = thresholds  # Thresholds of the flight's aircraft type, set on the analyzer before feeding it
+        self.lastTime = None  # time of the last sample read, None until there is one
+        self.samplesRead = 0  # Number of samples read, all of them at or before lastTime
+        self.lastArrival = now  # When new samples of the flight were last read (or it was first seen)
+        self.written = {} if written is None else written  # approach_id -> the last row output for it
+    # end def __init__()
+
+    def restarted(self, analyzer, now):
+        '''
+        @return: a FollowedFlight that analyzes the flight again from its first sample, without
+            outputting the approaches this one already output again unless they changed
+        '''
+        return FollowedFlight(analyzer, self.tracker.flightID, self.thresholds, now, self.written)
+    # end def restarted()
+
+# end class FollowedFlight
+
+
+class LiveMonitor(object):
+    '''
+    Follows the flights that are still being ingested, analyzing the rows appended to main
+        since the last poll.
+
+    Every poll reads, for each flight that is not analyzed yet, only the rows after the last
+        sample it read before, and feeds them to the flight's ApproachTracker, which keeps
+        where the analysis of the flight stands between polls. The approaches completed by
+        the new samples are written (and reported as events) at the end of the poll, with
+        the flight still unanalyzed. Once no new rows arrived for idleSeconds the flight is
+        over: its last approach is completed and it is marked analyzed along with it.
+
+    Rows are read by their time, so a row committed after a poll already read past its time
+        arrives late. Before reading a flight's new rows, every poll counts its rows up to the
+        last sample read (an index range of main per flight); if there are more than were
+        read, the flight is analyzed again from its first sample. Only the approaches that
+        come out different from the ones output before are written and reported again, so
+        every landing is reported once unless a late row changed it.
+
+    A monitor that is stopped leaves the flights it was following unanalyzed, and the next
+        one starts them over from their first sample, replacing the approaches written so far
+        with the same ones.
+    '''
+
+    def __init__(self, source, analyzer, pollSeconds=DEFAULT_POLL_SECONDS, idleSeconds=DEFAULT_IDLE_SECONDS,
+                 flightIDs=None, reporter=None, profiles=None):
+        '''
+        @param: source the DataSource to read the rows from, which must not be the one the analyzer writes to
+        @param: analyzer the StreamingFlightAnalyzer to analyze and write with
+        @param: pollSeconds seconds between two polls
+        @param: idleSeconds seconds without new rows after which a flight is over
+        @param: flightIDs list of the flights to follow until they are over, None to follow all the flights not analyzed yet
+        @param: reporter the MetricsReporter holding the analyzer's metrics, if any
+        @param: profiles the ThresholdProfiles of the aircraft types, refreshed every poll; None analyzes
+            every flight with the analyzer's thresholds
+        '''
+        self.source = source
+        self.analyzer = analyzer
+        self.pollSeconds = pollSeconds
+        self.idleSeconds = idleSeconds
+        self.flightIDs = None if flightIDs is None else list(flightIDs)
+        self.reporter = reporter
+        self.profiles = profiles
+        self.flights = {}  # flight ID -> FollowedFlight
+        self.finished = set()  # Flights over, which are not picked up again even if they could not be marked analyzed
+    # end def __init__()
+
+    def run(self):
+        '''
+        Polls every pollSeconds until interrupted, or until all the given flights are over.
+        '''
+        while True:
+            started = time.time()
+            self.poll()
+            if self.flightIDs is not None and len(self.flightIDs) == 0:
+                break
+            time.sleep(max(0.0, self.pollSeconds - (time.time() - started)))
+        # end while
+    # end def run()
+
+    def poll(self):
+        '''
+        Analyzes the rows appended since the last poll and writes the approaches they completed.
+        '''
+        now = time.time()
+        flightIDs = self.source.fetchFlightIDs() if self.flightIDs is None else self.flightIDs
+        flightIDs = [flightID for flightID in flightIDs if flightID not in self.finished]
+
+        # Flights analyzed by someone else meanwhile are not followed any longer
+        for flightID in set(self.flights) - set(flightIDs):
+            del self.flights[flightID]
+        newFlightIDs = [flightID for flightID in flightIDs if flightID not in self.flights]
+        if self.profiles is not None and len(newFlightIDs) > 0:
+            self.profiles = self.profiles.refreshed(self.source)
+            aircraftTypes = self.source.fetchAircraftTypes(newFlightIDs)
+        for flightID in newFlightIDs:
+            logger.info("Following Flight ID [%s]", flightID)
+            if self.profiles is None:
+                thresholds = self.analyzer.thresholds
+            else:
+                thresholds = self.profiles.forAircraft(aircraftTypes.get(flightID))
+            self.flights[flightID] = FollowedFlight(self.analyzer, flightID, thresholds, now)
+        # end for
+
+        for lo in xrange(0, len(flightIDs), POLL_BATCH):
+            batch = flightIDs[lo:lo + POLL_BATCH]
+            after = dict((flightID, self.flights[flightID].lastTime) for flightID in batch if self.flights[flightID].lastTime is not None)
+            for flightID, count in self.source.fetchSampleCounts(after).iteritems():
+                flight = self.flights[flightID]
+                if count > flight.samplesRead:
+                    logger.warning("Flight ID [%s] has %d rows that arrived late, analyzing it again", flightID, count - flight.samplesRead)
+                    self.flights[flightID] = flight.restarted(self.analyzer, now)
+                    del after[flightID]
+            # end for
+            for flightID, samples in self.source.streamSamples(batch, after):
+                self.follow(flightID, samples, now)
+        # end for
+
+        for flightID in flightIDs:
+            if now - self.flights[flightID].lastArrival >= self.idleSeconds:
+                self.finish(flightID)
+        # end for
+
+        self.analyzer.writer.flush()
+        self.analyzer.events.flush()
+        if self.reporter is not None:
+            self.reporter.reportIfDue()
+    # end def poll()
+
+    def follow(self, flightID, samples, now):
+        '''
+        Feeds a flight's new samples to its tracker and outputs the approaches they completed.
+        @param: flightID the flight
+        @param: samples iterator of the flight's samples read after its last one
+        @param: now when the poll started
+        '''
+        flight = self.flights[flightID]
+        self.analyzer.setThresholds(flight.thresholds)
+        fed = 0
+        t0 = time.time()
+        for sample in self.analyzer.loadFlightData(samples):
+            flight.tracker.feed(sample)
+            flight.lastTime = sample['time']
+            flight.samplesRead += 1
+            fed += 1
+        # end for
+        if fed == 0:
+            return
+
+        self.analyzer.metrics.observe('analyze_approaches', time.time() - t0)
+        self.analyzer.metrics.count('samples_analyzed', fed)
+        flight.lastArrival = now
+
+        rows = self.newRows(flight)
+        if len(rows) > 0 and not self.analyzer.skipOutputToDB:
+            self.analyzer.outputRows(flightID, rows, finished=False)
+    # end def follow()
+
+    def newRows(self, flight):
+        '''
+        @return: the rows of the approaches the flight's tracker completed, without those output already
+        '''
+        rows = [row for row in flight.tracker.takeRows() if flight.written.get(row[1]) != row]
+        for row in rows:
+            flight.written[row[1]] = row
+        return rows
+    # end def newRows()
+
+    def finish(self, flightID):
+        '''
+        Ends a flight that is over, marking it analyzed with its last approaches.
+        '''
+        flight = self.flights.pop(flightID)
+        tracker = flight.tracker
+        self.analyzer.setThresholds(flight.thresholds)
+        tracker.finish()
+        if not self.analyzer.skipOutputToDB:
+            self.analyzer.outputRows(flightID, self.newRows(flight))
+        self.finished.add(flightID)
+        if self.flightIDs is not None:
+            self.flightIDs.remove(flightID)
+
+        self.analyzer.metrics.count('flights_analyzed')
+        logger.info("Flight ID [%s] is over after %d samples", flightID, tracker.index + 1)
+    # end def finish()
+
+# end class LiveMonitor
+
+
+def replayFlights(source, target, flightIDs, speed=1.0, interval=1.0):
+    '''
+    Appends flights from one data source to another as if they were being ingested live,
+        which is how a LiveMonitor is tried out against an SQLite file. All the flights start
+        at once and every interval seconds the rows that are due by their time column (in
+        seconds) are appended and committed.
+    @param: source the DataSource to copy from
+    @param: target the DataSource to append to
+    @param: flightIDs list of the flights to replay
+    @param: speed how many times faster than recorded to replay the flights
+    @param: interval seconds between two commits
+    '''
+    aircraftTypes = source.fetchAircraftTypes(flightIDs)
+    pending = []  # (flightID, time of its first row, rows not appended yet) for every flight
+    with source.errors():
+        for flightID in flightIDs:
+            rows = source.execute(source.cursor(), fetchFlightsDataSQL % placeholders([flightID]), [flightID]).fetchall()
+            rows = [row for row in rows if row[1] is not None]
+            pending.append((flightID, rows[0][1] if len(rows) > 0 else None, rows))
+    # end with
+
+    with target.errors():
+        cursor = target.cursor()
+        for flightID, first, rows in pending:
+            target.insertFlight(cursor, flightID, aircraftTypes.get(flightID), [])
+        target.connection.commit()
+
+        started = time.time()
+        while any(len(rows) > 0 for flightID, first, rows in pending):
+            time.sleep(interval)
+            elapsed = (time.time() - started) * speed
+            appended = 0
+            for flightID, first, rows in pending:
+                due = 0
+                while due < len(rows) and rows[due][1] - first <= elapsed:
+                    due += 1
+                # end while
+                target.appendRows(cursor, rows[:due])
+                del rows[:due]
+                appended += due
+            # end for
+            target.connection.commit()
+            logger.info("Appended %d rows", appended)
+        # end while
+    # end with
+# end def replayFlights()
+
+
+'''
+Running this module directly replays flights from one data source into another as if they were
+    being ingested live, e.g. to follow them with main.py --live -s sqlite:live.db meanwhile:
+    LiveAnalysis.py sqlite:flights.db sqlite:live.db [flight_id ...] --speed 10
+    Without any flight_ids, all the flights the source has not analyzed yet are replayed.
+'''
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description='Replays flights into a data source as if they were being ingested live.')
+    parser.add_argument('source', help='data source to copy the flights from')
+    parser.add_argument('target', help='data source to append the flights to')
+    parser.add_argument('flight_ids', metavar='flight_id', nargs='*', help='a flight_id to replay')
+    parser.add_argument('--speed', type=float, default=1.0, help='how many times faster than recorded to replay the flights (default: 1)')
+    parser.add_argument('--interval', type=float, default=1.0, help='seconds between two commits (default: 1)')
+    args = parser.parse_args()
+
+    source = openDataSource(args.source)
+    target = openDataSource(args.target)
+    flightIDs = args.flight_ids or source.fetchFlightIDs()
+    replayFlights(source, target, flightIDs, args.speed, args.interval)
+    logger.info("Replayed %d flights from %s into %s", len(flightIDs), args.source, args.target)
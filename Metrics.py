@@ -0,0 +1,217 @@
+import bisect
+import contextlib
+import logging
+import os
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+STAGES = [
+    'fetch_aircraft_types',  # One query per chunk of flights
+    'fetch_flight',          # Streaming a flight's rows out of the data source
+    'conversion',            # Turning the fetched columns into what the engine works on
+    'flight_airports',       # Narrowing the airports down to the flight's
+    'find_initial_takeoff',
+    'analyze_approaches',    # Includes analyze_landing
+    'analyze_landing',
+    'output_to_db',          # Building the rows, and writing them when the ResultWriter is due
+    'sweep',                 # Judging the final approaches under every threshold set, see ThresholdSweep
+]
+COUNTERS = {
+    'flights_analyzed': 'Flights analyzed.',
+    'flights_failed': 'Flights whose analysis raised an exception.',
+    'samples_analyzed': 'Rows of flight data analyzed.',
+}
+BUCKETS = [0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0]
+DEFAULT_METRICS_INTERVAL = 60.0  # Seconds between two summaries of the metrics during a batch
+METRIC_PREFIX = 'ngafid_approach_analysis_'
+
+
+class StageMetrics(object):
+    '''
+    How long the stages of the analysis took, as a histogram of durations per stage
+        with the same buckets as Prometheus's, and how many flights and rows were analyzed.
+
+    Each Consumer records into a StageMetrics of its own, from its main thread and its
+        Prefetcher. After every chunk the Consumer sends drain() back to the coordinator
+        along with its report, where the snapshots of all the workers are merge()d.
+    '''
+
+    def __init__(self):
+        self.lock = threading.Lock()  # The Prefetcher records the fetch stages from another thread
+        self.reset()
+    # end def __init__()
+
+    def reset(self):
+        self.buckets = dict((stage, [0] * (len(BUCKETS) + 1)) for stage in STAGES)  # The last one is +Inf
+        self.sums = dict((stage, 0.0) for stage in STAGES)
+        self.counters = dict((name, 0) for name in COUNTERS)
+    # end def reset()
+
+    def observe(self, stage, seconds):
+        with self.lock:
+            self.buckets[stage][bisect.bisect_left(BUCKETS, seconds)] += 1
+            self.sums[stage] += seconds
+    # end def observe()
+
+    @contextlib.contextmanager
+    def timed(self, stage):
+        '''
+        Context manager that records how long its block took as a duration of stage.
+        '''
+        t0 = time.time()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.time() - t0)
+    # end def timed()
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] += amount
+    # end def count()
+
+    def drain(self):
+        '''
+        @return: a snapshot of everything recorded since the last drain(), to merge() elsewhere
+        '''
+        with self.lock:
+            snapshot = (self.buckets, self.sums, self.counters)
+            self.reset()
+        return snapshot
+    # end def drain()
+
+    def merge(self, snapshot):
+        '''
+        Adds a snapshot returned by drain() to these metrics.
+        '''
+        buckets, sums, counters = snapshot
+        with self.lock:
+            for stage in STAGES:
+                self.buckets[stage] = [a + b for a, b in zip(self.buckets[stage], buckets[stage])]
+                self.sums[stage] += sums[stage]
+            for name in COUNTERS:
+                self.counters[name] += counters[name]
+        # end with
+    # end def merge()
+
+    def percentile(self, stage, fraction):
+        '''
+        @return: the upper bound of the bucket holding the given fraction of stage's durations,
+            infinity if it is past the last bucket, or None if nothing was recorded
+        '''
+        counts = self.buckets[stage]
+        total = sum(counts)
+        if total == 0:
+            return None
+        seen = 0
+        for bound, count in zip(BUCKETS + [float('inf')], counts):
+            seen += count
+            if seen >= fraction * total:
+                return bound
+        # end for
+    # end def percentile()
+
+    def summary(self, elapsed):
+        '''
+        @param: elapsed seconds over which the metrics were recorded
+        @return: list of lines summarizing the throughput and every stage
+        '''
+        lines = ["%d flights (%d failed), %d samples in %.1fs: %.2f flights/s, %.0f samples/s" % (
+            self.counters['flights_analyzed'], self.counters['flights_failed'], self.counters['samples_analyzed'], elapsed,
+            self.counters['flights_analyzed'] / elapsed if elapsed > 0 else 0.0,
+            self.counters['samples_analyzed'] / elapsed if elapsed > 0 else 0.0
+        )]
+        for stage in STAGES:
+            count = sum(self.buckets[stage])
+            if count > 0:
+                lines.append("  %-22s %8d calls, %9.2fs total, mean %9.3f ms, p50 %s, p95 %s" % (
+                    stage, count, self.sums[stage], 1000.0 * self.sums[stage] / count,
+                    formatBound(self.percentile(stage, 0.5)), formatBound(self.percentile(stage, 0.95))
+                ))
+        # end for
+        return lines
+    # end def summary()
+
+    def prometheus(self):
+        '''
+        @return: the metrics in the Prometheus text exposition format
+        '''
+        name = METRIC_PREFIX + 'stage_seconds'
+        lines = [
+            "# HELP %s Time spent in each stage of analyzing a flight." % name,
+            "# TYPE %s histogram" % name,
+        ]
+        for stage in STAGES:
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ['+Inf'], self.buckets[stage]):
+                cumulative += count
+                lines.append('%s_bucket{stage="%s",le="%s"} %d' % (name, stage, bound, cumulative))
+            lines.append('%s_sum{stage="%s"} %.6f' % (name, stage, self.sums[stage]))
+            lines.append('%s_count{stage="%s"} %d' % (name, stage, cumulative))
+        # end for
+
+        for counter in sorted(COUNTERS):
+            name = METRIC_PREFIX + counter + '_total'
+            lines.append("# HELP %s %s" % (name, COUNTERS[counter]))
+            lines.append("# TYPE %s counter" % name)
+            lines.append("%s %d" % (name, self.counters[counter]))
+        # end for
+        return '\n'.join(lines) + '\n'
+    # end def prometheus()
+
+# end class StageMetrics
+
+
+class MetricsReporter(object):
+    '''
+    Collects the metrics the workers report during a batch, logging a summary every
+        interval seconds and writing them to a Prometheus text file (e.g. for the
+        node_exporter textfile collector), if one is given, at the same time.
+    '''
+
+    def __init__(self, path=None, interval=DEFAULT_METRICS_INTERVAL):
+        '''
+        @param: path the Prometheus text file to write, None to only log the summaries
+        @param: interval seconds between two summaries
+        '''
+        self.path = path
+        self.interval = interval
+        self.metrics = StageMetrics()
+        self.startTime = self.lastReport = time.time()
+    # end def __init__()
+
+    def add(self, snapshot):
+        self.metrics.merge(snapshot)
+    # end def add()
+
+    def reportIfDue(self):
+        if time.time() - self.lastReport >= self.interval:
+            self.report()
+    # end def reportIfDue()
+
+    def report(self):
+        self.lastReport = time.time()
+        for line in self.metrics.summary(self.lastReport - self.startTime):
+            logger.info("%s", line)
+
+        if self.path is not None:
+            # Replace the file in one step, so a scrape never reads it half written
+            temporary = self.path + '.tmp'
+            with open(temporary, 'w') as outfile:
+                outfile.write(self.metrics.prometheus())
+            os.rename(temporary, self.path)
+    # end def report()
+
+# end class MetricsReporter
+
+
+def formatBound(bound):
+    if bound is None:
+        return '-'
+    if bound == float('inf'):
+        return "> %gs" % BUCKETS[-1]
+    return "<= %gms" % (1000.0 * bound) if bound < 1 else "<= %gs" % bound
+# end def formatBound()
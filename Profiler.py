@@ -0,0 +1,212 @@
+import cProfile
+import collections
+import contextlib
+import glob
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_INTERVAL = 0.005  # Seconds between two samples of the stacks
+REPORT_LINES = 40  # Functions listed in each section of the merged report
+
+
+class Profiler(object):
+    '''
+    Profiles a worker process for --profile.
+
+    The thread that calls start() and every thread that runs inside profiling() get a
+        cProfile profile of their own (cProfile only sees the thread that enabled it), so the
+        Consumer's analysis and its Prefetcher's DB fetches are both covered. At the same
+        time a StackSampler records the stacks of all the threads, which cProfile's
+        caller/callee pairs cannot reconstruct.
+
+    stop() writes <name>.prof (the threads' cProfile stats merged with pstats) and
+        <name>.collapsed (the sampled stacks) into the directory, for mergeProfiles().
+        Without a directory the Profiler does nothing.
+    '''
+
+    def __init__(self, directory, name):
+        '''
+        @param: directory where to write the profile, None to not profile
+        @param: name the file name (without extension) of the profile
+        '''
+        self.directory = directory
+        self.name = name
+        self.profiles = []
+        self.profile = None  # Profile of the thread that called start()
+        self.sampler = None
+    # end def __init__()
+
+    def start(self):
+        '''
+        Starts sampling the process's stacks and profiling the calling thread, until stop().
+        '''
+        if self.directory is None:
+            return
+
+        self.sampler = StackSampler()
+        self.sampler.start()
+        self.profile = cProfile.Profile()
+        self.profiles.append(self.profile)
+        self.profile.enable()
+    # end def start()
+
+    @contextlib.contextmanager
+    def profiling(self):
+        '''
+        Context manager that profiles another thread of the process while it runs.
+        '''
+        if self.directory is None:
+            yield
+            return
+
+        profile = cProfile.Profile()
+        self.profiles.append(profile)
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+    # end def profiling()
+
+    def stop(self):
+        '''
+        Stops profiling and writes the profile. Must be called from the thread that called start(),
+            once the other profiled threads are done.
+        '''
+        if self.directory is None:
+            return
+
+        self.profile.disable()
+        self.sampler.stop()
+        path = os.path.join(self.directory, self.name)
+        if len(self.profiles) > 0:
+            stats = pstats.Stats(self.profiles[0])
+            for profile in self.profiles[1:]:
+                stats.add(profile)
+            stats.dump_stats(path + '.prof')
+        writeCollapsed(path + '.collapsed', self.sampler.counts)
+    # end def stop()
+
+# end class Profiler
+
+
+class StackSampler(threading.Thread):
+    '''
+    Thread that samples the stacks of all the other threads of the process every interval
+        seconds, counting how often each distinct stack was seen.
+    '''
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.interval = interval
+        self.counts = collections.Counter()  # (thread name, outermost frame, ..., innermost frame) -> samples
+        self.stopped = threading.Event()
+    # end def __init__()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            names = dict((thread.ident, thread.name) for thread in threading.enumerate())
+            for ident, frame in sys._current_frames().iteritems():
+                if ident == self.ident:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append("%s (%s:%d)" % (code.co_name, os.path.basename(code.co_filename), code.co_firstlineno))
+                    frame = frame.f_back
+                # end while
+                stack.append(names.get(ident, 'Thread-%d' % ident))
+                stack.reverse()
+                self.counts[tuple(stack)] += 1
+            # end for
+        # end while
+    # end def run()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+    # end def stop()
+
+# end class StackSampler
+
+
+def writeCollapsed(path, counts):
+    '''
+    Writes stack counts in the collapsed format read by flamegraph.pl and speedscope:
+        one line per stack, its frames from the outermost in separated by ';', then the count.
+    @param: path the file to write
+    @param: counts dict of stack tuples to their number of samples
+    '''
+    with open(path, 'w') as outfile:
+        for stack, count in sorted(counts.iteritems()):
+            outfile.write("%s %d\n" % (';'.join(stack), count))
+    # end with
+# end def writeCollapsed()
+
+
+def readCollapsed(path):
+    '''
+    @return: Counter of the stack tuples in a file written by writeCollapsed() to their number of samples
+    '''
+    counts = collections.Counter()
+    with open(path, 'r') as infile:
+        for line in infile:
+            stack, _, count = line.rstrip('\n').rpartition(' ')
+            counts[tuple(stack.split(';'))] += int(count)
+    # end with
+    return counts
+# end def readCollapsed()
+
+
+def prepareDirectory(directory):
+    '''
+    Creates the profile directory, or removes the profiles a previous run left in it.
+    '''
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    for path in glob.glob(os.path.join(directory, '*.prof')) + glob.glob(os.path.join(directory, '*.collapsed')):
+        os.remove(path)
+# end def prepareDirectory()
+
+
+def mergeProfiles(directory, workerNames):
+    '''
+    Merges the workers' profiles into profile.prof (readable with pstats or snakeviz),
+        profile.collapsed (for flamegraph.pl) and the report profile.txt, which lists
+        the functions by cumulative and by internal time.
+    @param: directory where the workers wrote their profiles
+    @param: workerNames the names the workers' Profilers were given
+    '''
+    paths = [os.path.join(directory, name) for name in workerNames]
+    profiles = [path + '.prof' for path in paths if os.path.exists(path + '.prof')]
+    if len(profiles) == 0:
+        logger.warning("No worker wrote a profile to %s", directory)
+        return
+
+    report = os.path.join(directory, 'profile.txt')
+    with open(report, 'w') as outfile:
+        stats = pstats.Stats(*profiles, stream=outfile)
+        stats.dump_stats(os.path.join(directory, 'profile.prof'))
+        outfile.write("Profile of %d workers, written %s\n" % (len(profiles), time.ctime()))
+        stats.strip_dirs()
+        stats.sort_stats('cumulative').print_stats(REPORT_LINES)
+        stats.sort_stats('time').print_stats(REPORT_LINES)
+    # end with
+
+    counts = collections.Counter()
+    for path in paths:
+        if os.path.exists(path + '.collapsed'):
+            counts.update(readCollapsed(path + '.collapsed'))
+    # end for
+    writeCollapsed(os.path.join(directory, 'profile.collapsed'), counts)
+
+    logger.info("Profile of %d workers written to %s (report in %s)", len(profiles), directory, report)
+# end def mergeProfiles()
@@ -0,0 +1,107 @@
+import logging
+import time
+from DataSource import DataSourceError
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FLUSH_FLIGHTS = 50  # Flights written per transaction
+DEFAULT_FLUSH_SECONDS = 5.0  # Longest time a finished flight waits to be written
+
+
+class ResultWriter(object):
+    '''
+    Buffers the results of many flights and writes them to the DB together.
+
+    Every flush hands all the buffered flights to DataSource.writeResults(), which inserts
+        their approaches with multi-row INSERT statements, marks them as analyzed with a
+        single UPDATE and commits once, so a flight is only ever marked analyzed in the
+        same transaction that stores its approaches. If the transaction fails it is
+        rolled back and the flights stay unanalyzed, to be picked up again by the next run.
+
+    A flush happens once flushFlights flights are buffered or the oldest one has
+        waited flushSeconds, and close() flushes whatever is left.
+
+    Approaches of flights that are still being analyzed (see LiveAnalysis) can be buffered
+        with addApproaches(), and are written by the next flush without marking any flight.
+    '''
+
+    def __init__(self, source, flushFlights=DEFAULT_FLUSH_FLIGHTS, flushSeconds=DEFAULT_FLUSH_SECONDS):
+        '''
+        @param: source the DataSource to write to
+        @param: flushFlights the number of flights to buffer before writing them
+        @param: flushSeconds the longest time to buffer a flight before writing it
+        '''
+        self.source = source
+        self.flushFlights = flushFlights
+        self.flushSeconds = flushSeconds
+        self.flightIDs = []
+        self.approachRows = []
+        self.oldest = None  # When the oldest buffered flight or approach was added
+    # end def __init__()
+
+    def add(self, flightID, approachRows):
+        '''
+        Buffers a flight's results, writing the buffer if it is due.
+        @param: flightID the analyzed flight
+        @param: approachRows list of the flight's rows for the approaches table, ordered like DataSource.insertKeysList
+        '''
+        if self.empty():
+            self.oldest = time.time()
+        self.flightIDs.append(flightID)
+        self.approachRows.extend(approachRows)
+        self.flushIfDue()
+    # end def add()
+
+    def addApproaches(self, approachRows):
+        '''
+        Buffers approaches of a flight whose analysis is not done yet, which stays unanalyzed.
+        @param: approachRows list of rows for the approaches table, ordered like DataSource.insertKeysList
+        '''
+        if self.empty():
+            self.oldest = time.time()
+        self.approachRows.extend(approachRows)
+        self.flushIfDue()
+    # end def addApproaches()
+
+    def empty(self):
+        return len(self.flightIDs) == 0 and len(self.approachRows) == 0
+    # end def empty()
+
+    def flushIfDue(self):
+        if len(self.flightIDs) >= self.flushFlights or \
+                (not self.empty() and time.time() - self.oldest >= self.flushSeconds):
+            self.flush()
+    # end def flushIfDue()
+
+    def flush(self):
+        '''
+        Writes all the buffered flights in one transaction.
+        @return: whether the buffered flights were written
+        '''
+        if self.empty():
+            return True
+
+        flightIDs, approachRows = self.flightIDs, self.approachRows
+        self.flightIDs, self.approachRows = [], []
+
+        try:
+            self.source.writeResults(flightIDs, approachRows)
+        except DataSourceError, e:
+            logger.error("%s", e)
+            logger.error("Last Executed Query: %s", e.query)
+            if len(flightIDs) > 0:
+                logger.error("Flight IDs left unanalyzed: %s", ', '.join(str(flightID) for flightID in flightIDs))
+            return False
+
+        return True
+    # end def flush()
+
+    def close(self):
+        '''
+        Writes whatever is still buffered.
+        '''
+        return self.flush()
+    # end def close()
+
+# end class ResultWriter
@@ -3,12 +3,21 @@ from LatLon import LatLon
 
 class Runway(object):
 
-    def __init__(self, airportCode, alt, runwayCode, magHdg, trueHdg, lat, lon):
+    def __init__(self, airportCode, alt, runwayCode, magHdg, trueHdg, lat, lon, corners=None):
+        '''
+        @param: corners the LatLons of the runway's Nw, Ne, Se and Sw corners, if known
+        '''
         self.airportCode = airportCode
         self.alt = alt
         self.runwayCode = runwayCode
         self.magHeading = magHdg
         self.trueHeading = trueHdg
         self.centerLatLon = LatLon(lat, lon)
+        self.corners = corners
+
+        # Precomputed for distance and cross track calculations: the center's
+        # n-vector and the normal of the great circle along the center line
+        self.nVector = self.centerLatLon.toVector()
+        self.centerLine = self.centerLatLon.greatCircle(trueHdg)
     # end def __init__()
 # end class Runway
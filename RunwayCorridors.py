@@ -0,0 +1,106 @@
+import numpy as np
+from RunwayFrame import RunwayFrame
+
+
+class RunwayCorridors(object):
+    '''
+    Spatial structure over the runways of an airport, which matches the samples of a final
+        approach to the runway whose approach corridor they are flying in.
+
+    Every runway's polygon, its Nw, Ne, Se and Sw corners from data/AirportsDetailed.csv, is
+        projected into the runway's RunwayFrame once, where it spans [threshold, end] along the
+        center line and halfWidth either side of it (a runway without corners is just its
+        center). The runway's approach corridor is that rectangle extended by length before the
+        threshold, along the extended center line, and by margin on either side.
+
+    A sample is in a corridor if it is inside it and its heading is within maxHeadingError of
+        the runway's. A sample in several corridors, such as those of close parallel runways,
+        belongs to the runway whose center line is the closest, so that 35L and 35R at GFK
+        split the space between them down the middle.
+    '''
+
+    def __init__(self, airport, length, margin):
+        '''
+        @param: airport the Airport whose runways are matched
+        @param: length how far the corridors extend before the runways' thresholds, in radians
+        @param: margin how far the corridors extend beyond either side of the runways, in radians
+        '''
+        self.runways = list(airport.runways)
+        self.frames = [RunwayFrame(runway, airport) for runway in self.runways]
+        self.bounds = []  # (lowest along, highest along, half width) of every corridor
+        for runway, frame in zip(self.runways, self.frames):
+            threshold, end, halfWidth = polygonBounds(runway, frame)
+            self.bounds.append((threshold - length, end, halfWidth + margin))
+        # end for
+
+        # The same, as k x 3 axes and k bounds for assign()
+        self.alongAxes = np.array([(f.ax, f.ay, f.az) for f in self.frames], dtype=np.float64).reshape(-1, 3)
+        self.crossAxes = np.array([(f.cx, f.cy, f.cz) for f in self.frames], dtype=np.float64).reshape(-1, 3)
+        self.upAxes = np.array([(r.nVector.x, r.nVector.y, r.nVector.z) for r in self.runways], dtype=np.float64).reshape(-1, 3)
+        self.magHeadings = np.array([r.magHeading for r in self.runways], dtype=np.float64)
+        bounds = np.array(self.bounds, dtype=np.float64).reshape(-1, 3)
+        self.lows, self.highs, self.halfWidths = bounds[:, 0], bounds[:, 1], bounds[:, 2]
+    # end def __init__()
+
+    def frameOf(self, runway):
+        '''
+        @return: the RunwayFrame of one of the airport's runways
+        '''
+        return self.frames[self.runways.index(runway)]
+    # end def frameOf()
+
+    def runwayAt(self, point, heading, maxHeadingError):
+        '''
+        Same as assign() for a single sample.
+        @param: point the LatLon of the airplane
+        @param: heading the magnetic heading of the airplane
+        @param: maxHeadingError how far off the runway's heading the airplane can be, in degrees
+        @return: the Runway whose corridor the airplane is in, or None if there is none
+        '''
+        p = point.toVector()
+        position = int(self.assign(np.array([[p.x], [p.y], [p.z]]), [heading], maxHeadingError)[0])
+        return None if position < 0 else self.runways[position]
+    # end def runwayAt()
+
+    def assign(self, vectors, headings, maxHeadingError):
+        '''
+        Matches every sample to the runway whose corridor it is in, testing all the samples
+            against all the corridors at once.
+        @param: vectors 3 x n array of the samples' n-vectors
+        @param: headings array of the samples' magnetic headings
+        @param: maxHeadingError how far off the runway's heading a sample can be, in degrees
+        @return: array with, for every sample, the position in the airport's runways of the
+            runway whose corridor it is in, or -1 if there is none
+        '''
+        n = vectors.shape[1]
+        if len(self.runways) == 0 or n == 0:
+            return np.full(n, -1, dtype=np.intp)
+
+        along = np.dot(self.alongAxes, vectors)
+        cross = np.abs(np.dot(self.crossAxes, vectors))
+        headingError = 180 - np.abs(np.abs(self.magHeadings[:, np.newaxis] - np.asarray(headings, dtype=np.float64)) - 180)
+        # The other side of the earth projects onto the corridors too
+        inside = (along >= self.lows[:, np.newaxis]) & (along <= self.highs[:, np.newaxis]) & \
+            (cross <= self.halfWidths[:, np.newaxis]) & (np.dot(self.upAxes, vectors) > 0) & \
+            (headingError <= maxHeadingError)
+
+        # argmin returns the first of equal distances, so the first of the runways wins a tie
+        closest = np.argmin(np.where(inside, cross, np.inf), axis=0)
+        return np.where(inside.any(axis=0), closest, -1)
+    # end def assign()
+
+# end class RunwayCorridors
+
+
+def polygonBounds(runway, frame):
+    '''
+    @param: runway the Runway
+    @param: frame the runway's RunwayFrame
+    @return: (threshold, end, half width) of the runway's polygon in its frame, in radians
+    '''
+    if not runway.corners:
+        return 0.0, 0.0, 0.0
+    projected = [frame.project(v.x, v.y, v.z) for v in (corner.toVector() for corner in runway.corners)]
+    alongs = [along for along, _ in projected]
+    return min(alongs), max(alongs), max(abs(cross) for _, cross in projected)
+# end def polygonBounds()
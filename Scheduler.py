@@ -0,0 +1,233 @@
+import collections
+import logging
+import multiprocessing
+import Queue
+import time
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_ROWS = 100000  # Rows of flight data to aim for in every dispatched chunk
+DISPATCH_DEPTH = 2  # Chunks a worker holds at once, so it never sits idle waiting for the next one
+POLL_INTERVAL = 1.0  # Seconds between checks that the workers with outstanding chunks are still alive
+
+
+class Scheduler(object):
+    '''
+    Size-aware scheduler that hands the flights of a batch to the worker processes in chunks.
+
+    Flights are sorted largest first by their number of rows in main and grouped into
+        chunks of about chunkRows rows, so a chunk is either a single long flight or a
+        run of shorter ones. The chunks are dealt out with the LPT (longest processing
+        time first) rule: each one goes to the deque of the worker with the fewest rows
+        assigned so far, so every deque also runs from its largest chunk to its smallest.
+
+    The coordinator (the main process) owns all the deques. When a worker reports a
+        finished chunk it gets the next chunk from the front of its own deque or, once
+        that is empty, steals the last (smallest) chunk of the worker with the most rows
+        still waiting, so all workers finish at about the same time.
+    '''
+
+    def __init__(self, numWorkers, chunkRows=DEFAULT_CHUNK_ROWS, reporter=None):
+        '''
+        @param: numWorkers the number of worker processes
+        @param: chunkRows the number of rows to aim for in every chunk
+        @param: reporter the MetricsReporter to hand the workers' metrics to, if any
+        '''
+        self.numWorkers = numWorkers
+        self.chunkRows = chunkRows
+        self.reporter = reporter
+
+        # One inbox per worker for the chunks it is given, one shared outbox for the
+        # (worker, seconds busy, StageMetrics snapshot) reports
+        self.inboxes = [multiprocessing.Queue() for _ in xrange(numWorkers)]
+        self.outbox = multiprocessing.Queue()
+
+        self.deques = [collections.deque() for _ in xrange(numWorkers)]  # (rows, flightIDs) waiting per worker
+        self.waitingRows = [0] * numWorkers
+        self.dispatched = [collections.deque() for _ in xrange(numWorkers)]  # chunks sent but not reported yet
+        self.stats = [WorkerStats(n) for n in xrange(numWorkers)]
+        self.released = set()  # Workers sent None
+        self.startTime = None
+    # end def __init__()
+
+    def makeChunks(self, flightSizes):
+        '''
+        Groups the flights, largest first, into chunks of at least chunkRows rows (except the last one).
+        @param: flightSizes list of (flightID, number of rows) tuples
+        @return: list of (rows, flightIDs) chunks, largest first
+        '''
+        chunks = []
+        flightIDs, rows = [], 0
+        for flightID, size in sorted(flightSizes, key=lambda flight: flight[1], reverse=True):
+            flightIDs.append(flightID)
+            rows += size
+            if rows >= self.chunkRows:
+                chunks.append((rows, flightIDs))
+                flightIDs, rows = [], 0
+        # end for
+        if len(flightIDs) > 0:
+            chunks.append((rows, flightIDs))
+        return chunks
+    # end def makeChunks()
+
+    def deal(self, chunks):
+        '''
+        Assigns every chunk to the worker with the fewest rows so far (LPT).
+        @param: chunks list of (rows, flightIDs) chunks, largest first
+        '''
+        for chunk in chunks:
+            worker = min(xrange(self.numWorkers), key=lambda n: self.waitingRows[n])
+            self.deques[worker].append(chunk)
+            self.waitingRows[worker] += chunk[0]
+        # end for
+    # end def deal()
+
+    def nextChunk(self, worker):
+        '''
+        @return: the next (rows, flightIDs) chunk for worker, stolen from another worker
+            if its own deque is empty, or None if no chunks are left at all
+        '''
+        owner = worker
+        if len(self.deques[worker]) == 0:
+            owner = max(xrange(self.numWorkers), key=lambda n: (self.waitingRows[n], len(self.deques[n])))
+            if len(self.deques[owner]) == 0:
+                return None
+            chunk = self.deques[owner].pop()
+            self.stats[worker].stolen += 1
+        else:
+            chunk = self.deques[owner].popleft()
+
+        self.waitingRows[owner] -= chunk[0]
+        return chunk
+    # end def nextChunk()
+
+    def dispatch(self, worker):
+        '''
+        Sends the next chunk to worker.
+        @return: whether there was a chunk left to send
+        '''
+        chunk = self.nextChunk(worker)
+        if chunk is None:
+            return False
+        self.dispatched[worker].append(chunk)
+        self.inboxes[worker].put(chunk[1])
+        return True
+    # end def dispatch()
+
+    def run(self, flightSizes, workers):
+        '''
+        Schedules all the flights and returns once every chunk has been processed.
+            Each worker is sent None once there is nothing left for it to do.
+        If a worker dies with chunks outstanding (or the coordinator is interrupted), the
+            workers still running are stopped before the error is raised, see stop().
+        @param: flightSizes list of (flightID, number of rows) tuples
+        @param: workers the started worker processes, one per inbox
+        '''
+        self.deal(self.makeChunks(flightSizes))
+        self.startTime = time.time()
+
+        active = set()
+        try:
+            for worker in xrange(self.numWorkers):
+                for _ in xrange(DISPATCH_DEPTH):
+                    self.dispatch(worker)
+                if len(self.dispatched[worker]) == 0:
+                    self.release(worker)
+                else:
+                    active.add(worker)
+            # end for
+
+            while len(active) > 0:
+                if self.reporter is not None:
+                    self.reporter.reportIfDue()
+                try:
+                    worker, busy, metrics = self.outbox.get(timeout=POLL_INTERVAL)
+                except Queue.Empty:
+                    dead = [n for n in active if not workers[n].is_alive()]
+                    if len(dead) > 0:
+                        raise RuntimeError("Worker(s) %s exited with chunks outstanding" % dead)
+                    continue
+
+                rows, flightIDs = self.dispatched[worker].popleft()
+                self.stats[worker].record(len(flightIDs), rows, busy)
+                if self.reporter is not None:
+                    self.reporter.add(metrics)
+
+                self.dispatch(worker)
+                if len(self.dispatched[worker]) == 0:
+                    self.release(worker)
+                    active.remove(worker)
+            # end while
+        finally:
+            # Every worker has been released unless the batch was abandoned
+            self.stop(workers)
+    # end def run()
+
+    def stop(self, workers):
+        '''
+        Stops the workers of an abandoned batch that were not released yet, which would
+            otherwise wait for their next chunk forever and keep the process from exiting.
+            The live ones are terminated, which a Consumer turns into SystemExit so that
+            the results it buffered are still written.
+        @param: workers the worker processes, one per inbox
+        '''
+        for worker in xrange(self.numWorkers):
+            if worker not in self.released and workers[worker].is_alive():
+                logger.warning("Terminating worker %d, the batch was abandoned", worker)
+                workers[worker].terminate()
+        # end for
+    # end def stop()
+
+    def release(self, worker):
+        self.stats[worker].finished = time.time() - self.startTime
+        self.released.add(worker)
+        self.inboxes[worker].put(None)
+    # end def release()
+
+    def report(self):
+        '''
+        Logs every worker's share of the batch and utilization (the fraction of the batch's
+            run time it spent analyzing flights), and how long the last worker took after the first finished.
+        '''
+        makespan = time.time() - self.startTime
+        for stats in self.stats:
+            logger.info(
+                "Worker %2d: %5d flights, %10d rows, %4d chunks (%d stolen), busy %8.2fs, done at %8.2fs, utilization %5.1f%%",
+                stats.worker, stats.flights, stats.rows, stats.chunks, stats.stolen, stats.busy, stats.finished,
+                100.0 * stats.busy / makespan if makespan > 0 else 0.0
+            )
+        finishTimes = [stats.finished for stats in self.stats]
+        logger.info(
+            "Batch took %.2fs: first worker done at %.2fs, last at %.2fs (tail %.2fs), mean utilization %.1f%%",
+            makespan, min(finishTimes), max(finishTimes), max(finishTimes) - min(finishTimes),
+            100.0 * sum(stats.busy for stats in self.stats) / (makespan * self.numWorkers) if makespan > 0 else 0.0
+        )
+    # end def report()
+
+# end class Scheduler
+
+
+class WorkerStats(object):
+    '''
+    What a single worker processed during a batch.
+    '''
+
+    def __init__(self, worker):
+        self.worker = worker
+        self.flights = 0
+        self.rows = 0
+        self.chunks = 0
+        self.stolen = 0
+        self.busy = 0.0  # Seconds spent analyzing, as reported by the worker
+        self.finished = 0.0  # Seconds after the start of the batch that the worker was released
+    # end def __init__()
+
+    def record(self, flights, rows, busy):
+        self.flights += flights
+        self.rows += rows
+        self.chunks += 1
+        self.busy += busy
+    # end def record()
+
+# end class WorkerStats
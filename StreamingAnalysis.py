@@ -0,0 +1,398 @@
+from FlightAnalysis import FlightAnalyzer, approachRow, LANDING_REARM_SAMPLES
+from FlightColumns import FlightColumns
+from LatLon import LatLon
+
+
+''' STATES OF AN ApproachTracker '''
+TAKEOFF = 'takeoff'    # Waiting for the initial takeoff to climb 500 ft above the departure airport
+SEARCH = 'search'      # Checking the samples that can start an approach for an airport close and low enough
+DESCENT = 'descent'    # Descending through the band between the approach and final altitudes
+FINAL = 'final'        # Checking the stability of the final approach while inside its gate
+LANDING = 'landing'    # Classifying the landing until climbing back to 500 ft or the flight ends
+
+
+class StreamingFlightAnalyzer(FlightAnalyzer):
+    '''
+    FlightAnalyzer that consumes a flight's samples one at a time from an iterator, such as
+        the generator DataSource.streamSamples() reads from a server-side cursor, instead
+        of a list of all of them.
+
+    findInitialTakeOff(), analyzeApproaches() and analyzeLanding() become the states of an
+        ApproachTracker, which keeps only the sample before the current one and turns every
+        approach into its row for the DB as soon as its landing is classified. Memory thus
+        stays the same however long the flight is, while the rows written to the DB and
+        the events are the same as the loop engine's. The approach dicts are not kept
+        once their rows are built, so analyze() returns None instead of them.
+
+    Reading the rows is interleaved with analyzing them, so the analyze_approaches stage
+        also includes fetching the flight past its first row.
+    '''
+
+    streaming = True
+
+    def loadFlightData(self, samples):
+        '''
+        @param: samples iterator of the flight's sample dicts, as streamed by DataSource.streamSamples(),
+            or the FlightColumns holding them
+        @return: generator of the samples, each with its LatLon attached, to pass into analyze()
+        '''
+        if isinstance(samples, FlightColumns):
+            samples = samples.toRecords()
+        return withLatLon(samples)
+    # end def loadFlightData()
+
+    def analyze(self, flightID, aircraftType, data, skipAnalysis=False):
+        self.flightID = flightID
+        tracker = ApproachTracker(self, flightID)
+
+        if not skipAnalysis:
+            with self.metrics.timed('analyze_approaches'):
+                for sample in data:
+                    tracker.feed(sample)
+                tracker.finish()
+        # end if
+        self.dataLength = tracker.index + 1
+
+        if not self.skipOutputToDB:
+            with self.metrics.timed('output_to_db'):
+                self.outputRows(flightID, tracker.takeRows())
+    # end def analyze()
+
+# end class StreamingFlightAnalyzer
+
+
+class ApproachTracker(object):
+    '''
+    State machine that follows one flight through FlightAnalyzer.findInitialTakeOff(),
+        analyzeApproaches() and analyzeLanding() as its samples are fed to it, reaching the
+        same approaches at the same sample indices.
+
+    The loop engine looks at most one sample back: an approach detected below the final's
+        ceiling starts at the sample before, and the cross track error of a final approach
+        sample is taken at the previous sample's position. It also looks one sample ahead,
+        as a landing only checks a sample's airspeed if the flight goes on after it, which
+        the tracker does instead when the next sample arrives (or not, at finish()).
+
+    The geodesy and the events are the FlightAnalyzer's; the tracker owns everything that
+        belongs to the flight, so any number of them can follow flights side by side.
+    '''
+
+    def __init__(self, analyzer, flightID):
+        '''
+        @param: analyzer the FlightAnalyzer to look up airports and runways with and to report events to
+        @param: flightID the flight whose samples will be fed
+        '''
+        self.analyzer = analyzer
+        self.events = analyzer.events
+        self.flightID = flightID
+        self.state = TAKEOFF
+        self.handlers = {
+            TAKEOFF: self.takeOff, SEARCH: self.search, DESCENT: self.descent, FINAL: self.final, LANDING: self.landing
+        }
+        self.index = -1  # Index of the current sample
+        self.previous = None  # The sample before the current one, the last one fed once feed() returns
+        self.nextCheck = 0  # Index of the next sample to check for an approach
+        self.nextCheckTime = float('-inf')  # and the time it has to be at, see FlightAnalyzer.lookAhead()
+        self.approachID = 0
+        self.approach = None  # Dict of the approach in progress, same as the loop engine's
+        self.rows = []  # Rows for the approaches table of the approaches completed since takeRows()
+    # end def __init__()
+
+    def feed(self, sample):
+        '''
+        Advances the state machine by the flight's next sample.
+        @param: sample dict of the sample's values, with its LatLon attached
+        '''
+        self.index += 1
+        # A handler returns False when it moved on to a state that has to look at the sample too
+        while not self.handlers[self.state](sample):
+            pass
+        self.previous = sample
+    # end def feed()
+
+    def finish(self):
+        '''
+        Ends the flight after the last sample fed, completing the approach in progress.
+        '''
+        if self.state == DESCENT:
+            self.beginFinal(self.index, self.previous)
+        if self.state == FINAL:
+            self.endFinal(self.index, self.previous)
+        if self.state == LANDING:
+            self.endLanding(self.index)
+    # end def finish()
+
+    def takeRows(self):
+        '''
+        @return: list of the rows for the approaches table of the approaches completed since the last call
+        '''
+        rows = self.rows
+        self.rows = []
+        return rows
+    # end def takeRows()
+
+    def takeOff(self, sample):
+        if self.index == 0:
+            self.airport = self.analyzer.detectAirport(sample['LatLon'])
+        hAGL = sample['msl_altitude'] - self.airport.alt
+
+        if hAGL >= 500:
+            # Airborne from the first sample on, which is then checked for an approach
+            self.state = SEARCH
+            self.nextCheck = self.index if self.index == 0 else self.index + 1
+            return self.index != 0
+        return True
+    # end def takeOff()
+
+    def search(self, sample):
+        t = self.analyzer.thresholds
+        if self.index < self.nextCheck or sample['time'] < self.nextCheckTime:
+            return True
+        if sample['msl_altitude'] - self.analyzer.ceilingGrid.highestAt(sample['latitude'], sample['longitude']) >= t.minAltitudeAGL:
+            # Not an approach candidate, see FlightAnalyzer.approachCandidates()
+            self.skip(sample)
+            return True
+
+        airplanePoint = sample['LatLon']
+        airport = self.analyzer.detectAirport(airplanePoint)
+        distance = self.analyzer.distanceToAirport(airplanePoint, airport)
+        hAGL = sample['msl_altitude'] - airport.alt
+
+        if distance < t.minDistance and hAGL < t.minAltitudeAGL:
+            if self.events.info:
+                self.events.emit(
+                    'approach_detected', flight=self.flightID, approach=self.approachID + 1, index=self.index,
+                    airport=airport.code, city=airport.city, state=airport.state
+                )
+
+            self.thisApproachID = self.approachID
+            self.approachID += 1
+            self.approach = {'unstable': []}
+            self.airport = airport
+            self.distance = distance
+            self.hAGL = hAGL
+
+            if hAGL > t.finalMaxAltitudeAGL:
+                self.state = DESCENT
+                return True
+
+            if self.previous is None:
+                # Detected on the flight's first sample, which the approach then starts at, as
+                # in the loop engine: it is also the first sample of the final approach, or the
+                # one the landing starts at
+                self.beginFinal(self.index, sample)
+                return self.state != FINAL
+
+            # Already below the final's ceiling: the approach starts at the sample before,
+            # and this one is the first the final approach or the landing looks at
+            self.beginFinal(self.index - 1, self.previous)
+            return False
+        # end if
+
+        self.skip(sample)
+        return True
+    # end def search()
+
+    def skip(self, sample):
+        '''
+        Skips the samples after the current one that cannot start an approach, see FlightAnalyzer.nextApproachCheck().
+        '''
+        self.nextCheck = self.index + 1
+        self.nextCheckTime = sample['time'] + self.analyzer.lookAhead(sample['LatLon'], sample['msl_altitude'])
+    # end def skip()
+
+    def descent(self, sample):
+        t = self.analyzer.thresholds
+        self.hAGL = sample['msl_altitude'] - self.airport.alt
+        if not (self.hAGL > t.finalMaxAltitudeAGL and self.hAGL < t.minAltitudeAGL):
+            self.beginFinal(self.index, sample)
+        return True
+    # end def descent()
+
+    def beginFinal(self, start, startSample):
+        '''
+        Selects the runway at the start of the approach and enters the final approach if still inside its gate.
+        @param: start the index of the sample the approach starts at
+        @param: startSample that sample
+        '''
+        t = self.analyzer.thresholds
+        self.start = start
+        self.airplanePoint = startSample['LatLon']
+        self.runway = self.analyzer.detectRunway(self.airplanePoint, startSample['heading'], self.airport)
+        self.frame = self.analyzer.runwayFrame(self.runway, self.airport)
+        if self.events.info:
+            self.events.emit(
+                'runway_selected', flight=self.flightID, approach=self.thisApproachID + 1,
+                runway=None if self.runway is None else self.runway.runwayCode
+            )
+
+        self.unstableFirst = self.unstableLast = None  # The run of unstable samples in progress
+        self.allValues = [ [], [], [], [] ]
+        self.unstableReasons = [ [], [], [], [] ]  # F1, F2, A, S
+
+        # The gate is checked with the distance from detecting the approach, as the loop engine does
+        if self.distance < t.minDistance and self.hAGL <= t.finalMaxAltitudeAGL and self.hAGL >= t.finalMinAltitudeAGL:
+            self.state = FINAL
+        else:
+            self.endFinal(start, startSample)
+    # end def beginFinal()
+
+    def final(self, sample):
+        t = self.analyzer.thresholds
+        i = self.index
+        runway = self.runway
+        airplaneHdg = sample['heading']
+        airplaneIAS = sample['indicated_airspeed']
+        airplaneVSI = sample['vertical_airspeed']
+
+        if runway is not None:
+            headingError = 180 - abs(abs(runway.magHeading - airplaneHdg) - 180)
+            cond_F1 = headingError <= t.maxHeadingError
+            crossTrackError = self.analyzer.crossTrackToCenterLine(self.airplanePoint, runway, self.frame)
+            cond_F2 = abs(crossTrackError) <= t.maxCrossTrackError
+        else:
+            cond_F1 = cond_F2 = True
+        # end if/else
+
+        cond_A = airplaneIAS >= t.minIAS and airplaneIAS <= t.maxIAS
+        cond_S = airplaneVSI >= t.minVSI
+
+        if not (cond_F1 and cond_F2 and cond_A and cond_S):
+            if self.events.debug:
+                self.events.emit(
+                    'unstable_sample', flight=self.flightID, approach=self.thisApproachID + 1, index=i,
+                    F1=cond_F1, F2=cond_F2, A=cond_A, S=cond_S,
+                    runway_heading=None if runway is None else runway.magHeading, heading=airplaneHdg,
+                    heading_error=None if runway is None else headingError,
+                    crosstrack=None if runway is None else crossTrackError, ias=airplaneIAS, vsi=airplaneVSI
+                )
+            if not cond_F1:
+                self.unstableReasons[0].append(headingError)
+            if not cond_F2:
+                self.unstableReasons[1].append(crossTrackError)
+            if not cond_A:
+                self.unstableReasons[2].append(airplaneIAS)
+            if not cond_S:
+                self.unstableReasons[3].append(airplaneVSI)
+            if self.unstableFirst is None:
+                self.unstableFirst = i
+            self.unstableLast = i
+        elif self.unstableFirst is not None:
+            self.approach['unstable'].append( (self.unstableFirst, self.unstableLast) )
+            self.unstableFirst = None
+        # end if/elif
+
+        if runway is not None:
+            self.allValues[0].append(headingError)
+            self.allValues[1].append(crossTrackError)
+        self.allValues[2].append(airplaneIAS)
+        self.allValues[3].append(airplaneVSI)
+
+        self.airplanePoint = sample['LatLon']
+        self.distance = self.analyzer.distanceToAirport(self.airplanePoint, self.airport, self.frame)
+        self.hAGL = sample['msl_altitude'] - self.airport.alt
+
+        if not (self.distance < t.minDistance and self.hAGL <= t.finalMaxAltitudeAGL and self.hAGL >= t.finalMinAltitudeAGL):
+            self.endFinal(i, sample)
+        return True
+    # end def final()
+
+    def endFinal(self, end, endSample):
+        '''
+        Records the final approach and starts the landing at its last sample.
+        @param: end the index of the last sample of the final approach
+        @param: endSample that sample
+        '''
+        t = self.analyzer.thresholds
+        approach = self.approach
+        if self.unstableFirst is not None:
+            approach['unstable'].append( (self.unstableFirst, self.unstableLast) )
+
+        approach['airport-code'] = self.airport.code
+        approach['runway-code'] = None if self.runway is None else self.runway.runwayCode
+        approach['approach-start'] = self.start
+        approach['approach-end'] = end
+        approach['F1'], approach['F2'], approach['A'], approach['S'] = self.unstableReasons
+        approach['HDG'], approach['CTR'], approach['IAS'], approach['VSI'] = self.allValues
+        self.runway = self.frame = self.allValues = self.unstableReasons = None
+
+        self.landingStart = end
+        self.hAGL = endSample['msl_altitude'] - self.airport.alt
+        self.elevations = []
+        self.avgElevation = t.touchAndGoElevation + 1
+        self.fullStop = self.touchAndGo = False
+        self.landingIAS = endSample['indicated_airspeed']  # Only checked if the flight goes on after the sample
+
+        if self.hAGL < t.minAltitudeAGL:
+            self.state = LANDING
+        else:
+            self.endLanding(end)
+    # end def endFinal()
+
+    def landing(self, sample):
+        t = self.analyzer.thresholds
+        # The previous sample was not the flight's last after all
+        if not self.fullStop:
+            if self.landingIAS <= t.fullStopSpeed:
+                self.fullStop = True
+            elif self.avgElevation <= t.touchAndGoElevation:
+                self.touchAndGo = True
+            # end if/elif
+        # end if
+
+        self.hAGL = sample['msl_altitude'] - self.airport.alt
+        self.landingIAS = sample['indicated_airspeed']
+
+        if len(self.elevations) < 5:
+            self.elevations.append(self.hAGL)
+        else:
+            self.elevations.pop(0)
+            self.elevations.append(self.hAGL)
+            self.avgElevation = sum(self.elevations) / len(self.elevations)
+        # end if/else
+
+        if self.hAGL >= t.minAltitudeAGL:
+            self.endLanding(self.index)
+        return True
+    # end def landing()
+
+    def endLanding(self, end):
+        '''
+        Classifies the landing, turns the approach into its row and goes back to searching.
+        @param: end the index of the last sample of the landing
+        '''
+        approach = self.approach
+        if self.fullStop:
+            approach['landing-type'] = 'stop-and-go'
+        elif self.touchAndGo:
+            approach['landing-type'] = 'touch-and-go'
+        else:
+            approach['landing-type'] = 'go-around'
+
+        approach['landing-start'] = self.landingStart
+        approach['landing-end'] = end
+        if self.events.info:
+            self.events.emit(
+                'landing_classified', flight=self.flightID, approach=self.thisApproachID + 1,
+                landing_type=approach['landing-type'], start=self.landingStart, end=end
+            )
+
+        self.rows.append(approachRow(self.flightID, self.thisApproachID, approach))
+        self.approach = self.elevations = None
+        self.state = SEARCH
+        self.nextCheck = end + LANDING_REARM_SAMPLES
+        self.nextCheckTime = float('-inf')
+    # end def endLanding()
+
+# end class ApproachTracker
+
+
+def withLatLon(samples):
+    '''
+    @return: generator of the sample dicts, each with its LatLon attached
+    '''
+    for sample in samples:
+        sample['LatLon'] = LatLon(sample['latitude'], sample['longitude'])
+        yield sample
+    # end for
+# end def withLatLon()
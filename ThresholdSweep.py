@@ -0,0 +1,205 @@
+import csv
+import itertools
+import numpy as np
+from VectorizedAnalysis import VectorizedFlightAnalyzer
+
+
+# The thresholds a sweep can vary: field of Thresholds, the final approach's values in the
+# approach dict it is compared with, the stability condition it belongs to and whether a
+# sample passes it at or below (+1) or at or above (-1) the threshold
+SWEEP_FIELDS = [
+    ('maxHeadingError', 'HDG', 'F1', 1),
+    ('maxCrossTrackError', 'CTR', 'F2', 1),
+    ('minIAS', 'IAS', 'A', -1),
+    ('maxIAS', 'IAS', 'A', 1),
+    ('minVSI', 'VSI', 'S', -1),
+]
+CONDITIONS = ['F1', 'F2', 'A', 'S']
+
+
+class ThresholdGrid(object):
+    '''
+    Grid of threshold sets, every combination of the values given for some of SWEEP_FIELDS.
+        The fields without values keep those of the flight's Thresholds.
+
+    Only the stability thresholds are swept: the approaches, their runways and their final
+        approach samples are the same for every set, so a flight is analyzed once and only
+        the F1/F2/A/S conditions are evaluated for every set.
+    '''
+
+    def __init__(self, values):
+        '''
+        @param: values dict of field -> list of the values to try
+        '''
+        names = [field for field, _, _, _ in SWEEP_FIELDS]
+        for field in values:
+            if field not in names:
+                raise ValueError("Cannot sweep %s, only %s" % (field, ', '.join(names)))
+        self.fields = [field for field in names if field in values]
+        self.sets = [dict(zip(self.fields, combination)) for combination in itertools.product(*[values[f] for f in self.fields])]
+        self.factored = {}  # Thresholds -> factor() of the sets over them
+    # end def __init__()
+
+    @classmethod
+    def parse(cls, specs):
+        '''
+        @param: specs list of 'field=value,value,...' strings, e.g. from the command line
+        @return: the ThresholdGrid
+        '''
+        values = {}
+        for spec in specs:
+            field, _, listed = spec.partition('=')
+            try:
+                values[field.strip()] = [float(value) for value in listed.split(',')]
+            except ValueError:
+                raise ValueError("Expected field=value,value,... instead of %r" % spec)
+        # end for
+        return cls(values)
+    # end def parse()
+
+    def __len__(self):
+        return len(self.sets)
+    # end def __len__()
+
+    def factor(self, thresholds):
+        '''
+        Splits the sets, over the given Thresholds, into the distinct values of every field.
+        The values are multiplied by the field's direction, so that a sample passes every
+            field's condition at the values at or above its own.
+        @param: thresholds the Thresholds of the flight being analyzed
+        @return: list of (distinct values sorted ascending, position of every set's value among them) per field
+        '''
+        factored = self.factored.get(thresholds)
+        if factored is None:
+            factored = []
+            for field, _, _, direction in SWEEP_FIELDS:
+                values = np.array([direction * overrides.get(field, getattr(thresholds, field)) for overrides in self.sets], dtype=np.float64)
+                factored.append(np.unique(values, return_inverse=True))
+            # end for
+            self.factored[thresholds] = factored
+        return factored
+    # end def factor()
+
+    def failures(self, thresholds, approach):
+        '''
+        Evaluates the stability conditions of a final approach under every set at once.
+
+        A field's condition holds for every sample of the final approach at the values at or
+            above the sample that needs the highest one, so that sample's rank among the
+            field's distinct values decides it for every set with one broadcast comparison.
+            An approach costs a pass over its samples per field, plus one comparison per set.
+        @param: thresholds the Thresholds of the flight being analyzed
+        @param: approach the approach's dict, as filled in by analyzeFinal()
+        @return: dict of condition -> boolean array of whether it fails on the approach under every set
+        '''
+        failed = dict((condition, np.zeros(len(self.sets), dtype=bool)) for condition in CONDITIONS)
+        for (field, key, condition, direction), (values, positions) in zip(SWEEP_FIELDS, self.factor(thresholds)):
+            samples = np.asarray(approach[key], dtype=np.float64)
+            if len(samples) == 0:
+                continue  # No runway to judge F1 and F2 by, or no final approach at all
+            if key == 'CTR':
+                samples = np.abs(samples)
+            # A NaN sorts after every value, failing the condition under every set like it does in analyzeFinal()
+            needed = np.searchsorted(values, (direction * samples).max())
+            failed[condition] |= positions < needed
+        # end for
+        return failed
+    # end def failures()
+
+# end class ThresholdGrid
+
+
+class SweepSummary(object):
+    '''
+    How many approaches there were and how many of them were unstable, in all and by every
+        condition, under every set of a ThresholdGrid.
+    '''
+
+    def __init__(self, grid):
+        self.grid = grid
+        self.flights = 0
+        self.approaches = 0
+        self.unstable = np.zeros(len(grid), dtype=np.int64)
+        self.failed = dict((condition, np.zeros(len(grid), dtype=np.int64)) for condition in CONDITIONS)
+    # end def __init__()
+
+    def add(self, failed):
+        '''
+        @param: failed what ThresholdGrid.failures() returned for an approach
+        '''
+        self.approaches += 1
+        unstable = np.zeros(len(self.grid), dtype=bool)
+        for condition in CONDITIONS:
+            self.failed[condition] += failed[condition]
+            unstable |= failed[condition]
+        self.unstable += unstable
+    # end def add()
+
+    def rows(self):
+        '''
+        @return: list of the swept values, approaches, unstable approaches, their rate and the
+            approaches failing F1, F2, A and S of every set, headed by the column names
+        '''
+        rows = [self.grid.fields + ['approaches', 'unstable', 'unstable_rate'] + CONDITIONS]
+        for k, overrides in enumerate(self.grid.sets):
+            rows.append(
+                [overrides[field] for field in self.grid.fields] +
+                [self.approaches, int(self.unstable[k]), float(self.unstable[k]) / max(1, self.approaches)] +
+                [int(self.failed[condition][k]) for condition in CONDITIONS]
+            )
+        # end for
+        return rows
+    # end def rows()
+
+    def write(self, path):
+        '''
+        Writes rows() to a CSV file.
+        '''
+        with open(path, 'wb') as outfile:
+            csv.writer(outfile).writerows(self.rows())
+    # end def write()
+
+    def format(self):
+        '''
+        @return: rows() as a text table
+        '''
+        rows = self.rows()
+        rate = len(self.grid.fields) + 2  # Column of the unstable rate
+        widths = [max(10, len(name)) for name in rows[0]]
+        lines = [' '.join(name.rjust(width) for name, width in zip(rows[0], widths))]
+        for row in rows[1:]:
+            cells = ['%.1f%%' % (100 * value) if i == rate else '%g' % value for i, value in enumerate(row)]
+            lines.append(' '.join(cell.rjust(width) for cell, width in zip(cells, widths)))
+        # end for
+        return '\n'.join(lines)
+    # end def format()
+
+# end class SweepSummary
+
+
+class SweepAnalyzer(VectorizedFlightAnalyzer):
+    '''
+    VectorizedFlightAnalyzer that judges every final approach under all the sets of a
+        ThresholdGrid, adding them up in a SweepSummary instead of writing any results.
+    Every flight is analyzed with its own Thresholds, see setThresholds(), which the sets
+        override the swept fields of.
+    '''
+
+    def __init__(self, source, airports, grid, airportIndex=None, metrics=None):
+        VectorizedFlightAnalyzer.__init__(self, source, airports, skipOutput=True, airportIndex=airportIndex, metrics=metrics)
+        self.grid = grid
+        self.summary = SweepSummary(grid)
+    # end def __init__()
+
+    def analyze(self, flightID, aircraftType, data, skipAnalysis=False):
+        self.summary.flights += 1
+        return VectorizedFlightAnalyzer.analyze(self, flightID, aircraftType, data, skipAnalysis=skipAnalysis)
+    # end def analyze()
+
+    def analyzeFinal(self, thisApproachID, lo, hi, runway, frame=None):
+        VectorizedFlightAnalyzer.analyzeFinal(self, thisApproachID, lo, hi, runway, frame)
+        with self.metrics.timed('sweep'):
+            self.summary.add(self.grid.failures(self.thresholds, self.approaches[thisApproachID]))
+    # end def analyzeFinal()
+
+# end class SweepAnalyzer
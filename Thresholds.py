@@ -0,0 +1,114 @@
+from collections import namedtuple
+
+
+# Field of Thresholds -> its column of exceedance_thresholds
+COLUMNS = [
+    ('minIAS', 'approach_min_ias'),
+    ('maxIAS', 'approach_max_ias'),
+    ('maxHeadingError', 'approach_max_heading_error'),
+    ('minVSI', 'approach_min_vas'),
+    ('maxCrossTrackError', 'approach_max_crosstrack_error'),
+    ('minDistance', 'approach_min_distance'),
+    ('minAltitudeAGL', 'approach_min_altitude_agl'),
+    ('finalMaxAltitudeAGL', 'approach_final_max_altitude_agl'),
+    ('finalMinAltitudeAGL', 'approach_final_min_altitude_agl'),
+    ('fullStopSpeed', 'full_stop_speed_indicator'),
+    ('touchAndGoElevation', 'touch_and_go_elevation_indicator'),
+    ('runwaySelection', 'runway_selection_indicator'),
+]
+
+
+class Thresholds(namedtuple('Thresholds', [field for field, _ in COLUMNS])):
+    '''
+    The thresholds an approach is detected and judged stable by, for one aircraft type.
+    Immutable, so the analyzers can share one instance among any number of flights.
+    '''
+
+    __slots__ = ()
+
+    @classmethod
+    def fromRow(cls, row, default):
+        '''
+        @param: row dict of a row of exceedance_thresholds
+        @param: default the Thresholds to take the row's NULL columns from
+        @return: the Thresholds of the row, as floats whatever type the driver returned (e.g. MySQL's DECIMAL)
+        '''
+        return cls(*[
+            float(getattr(default, field) if row.get(column) is None else row[column])
+            for field, column in COLUMNS
+        ])
+    # end def fromRow()
+
+# end class Thresholds
+
+
+class ThresholdProfiles(object):
+    '''
+    Table of the Thresholds of every aircraft type, loaded from exceedance_thresholds in one
+        query, so that looking up the thresholds of a flight never goes to the data source.
+
+    The table is never modified. refreshed() only reads the version of the rows, a stamp the
+        database computes over all of them, and loads the rows again if it changed.
+    '''
+
+    def __init__(self, profiles, default, version=None):
+        '''
+        @param: profiles dict of aircraft type -> Thresholds
+        @param: default the Thresholds of aircraft types without a row
+        @param: version the stamp of the rows the profiles were built from, see DataSource.fetchThresholdsStamp()
+        '''
+        self.profiles = profiles
+        self.default = default
+        self.version = version
+    # end def __init__()
+
+    @classmethod
+    def load(cls, source, default):
+        '''
+        @param: source the DataSource to read exceedance_thresholds from
+        @param: default the Thresholds of aircraft types without a row, and of NULL columns
+        @return: the ThresholdProfiles of every row
+        '''
+        # Stamped first, so that rows changed in between are loaded again by the next refreshed()
+        stamp = version(source)
+        return cls.fromRows(source.fetchAllThresholds(), default, stamp)
+    # end def load()
+
+    @classmethod
+    def fromRows(cls, rows, default, version=None):
+        profiles = dict((row['aircraft_id'], Thresholds.fromRow(row, default)) for row in rows)
+        return cls(profiles, default, version)
+    # end def fromRows()
+
+    def refreshed(self, source):
+        '''
+        @param: source the DataSource to read exceedance_thresholds from
+        @return: these profiles if the rows did not change since they were loaded, or else the new ones
+        '''
+        stamp = version(source)
+        if stamp == self.version:
+            return self
+        return self.fromRows(source.fetchAllThresholds(), self.default, stamp)
+    # end def refreshed()
+
+    def forAircraft(self, aircraftType):
+        '''
+        @return: the Thresholds of the aircraft type, or the default ones if it has none
+        '''
+        return self.profiles.get(aircraftType, self.default)
+    # end def forAircraft()
+
+    def __len__(self):
+        return len(self.profiles)
+    # end def __len__()
+
+# end class ThresholdProfiles
+
+
+def version(source):
+    '''
+    @param: source the DataSource to read exceedance_thresholds from
+    @return: the version stamp of the rows, which changes with any of their values
+    '''
+    return source.fetchThresholdsStamp([column for _, column in COLUMNS])
+# end def version()
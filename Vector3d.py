@@ -25,6 +25,8 @@ class Vector3d(object):
      * @module vector3d
     '''
 
+    __slots__ = ('x', 'y', 'z')
+
     def __init__(self, x, y, z):
         '''
          * Creates a 3-d vector.
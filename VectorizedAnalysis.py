@@ -0,0 +1,353 @@
+import numpy as np
+from FlightAnalysis import (
+    FlightAnalyzer, EARTH_RADIUS_MILES, EARTH_RADIUS_FEET, LANDING_REARM_SAMPLES, DEFAULT_THRESHOLDS,
+    MAX_GROUND_SPEED, MAX_DESCENT_RATE, MAX_LOOK_AHEAD
+)
+from LatLon import LatLon
+import LatLonArray
+
+
+class VectorizedFlightAnalyzer(FlightAnalyzer):
+    '''
+    FlightAnalyzer that works on a FlightColumns instead of a list of row dicts.
+
+    The control flow follows FlightAnalyzer.analyzeApproaches() step for step, but the
+        per-sample quantities (nearest airport, distance to the airport, hAGL, heading
+        error, cross track error and the F1/F2/A/S stability conditions) are computed
+        as whole-array operations over the samples the loop would visit. The approaches
+        dict and the rows written to the DB are the same as the loop engine's, and so are
+        the events, which are only built when the EventSink wants them.
+    '''
+
+    def __init__(self, source, airports, skipOutput=False, airportIndex=None, writer=None, metrics=None, events=None,
+                 thresholds=DEFAULT_THRESHOLDS):
+        FlightAnalyzer.__init__(
+            self, source, airports, skipOutput=skipOutput, airportIndex=airportIndex, writer=writer, metrics=metrics, events=events,
+            thresholds=thresholds
+        )
+        self.airportAlts = self.airportIndex.alts
+        self.airportVectors = LatLonArray.toVectors(self.airportIndex.lats, self.airportIndex.lons)
+    # end def __init__()
+
+    def loadFlightData(self, columns):
+        '''
+        Attaches the n-vectors of the flight's positions and its approach candidates (see
+            approachCandidates()) to its FlightColumns, which analyze() works on directly.
+        '''
+        columns.vectors = LatLonArray.toVectors(columns.latitude, columns.longitude)
+        columns.candidates = self.approachCandidates(columns)
+        return columns
+    # end def loadFlightData()
+
+    def analyze(self, flightID, aircraftType, data, skipAnalysis=False):
+        self.sampleVectors = data.vectors
+        self.candidates = data.candidates
+        return FlightAnalyzer.analyze(self, flightID, aircraftType, data, skipAnalysis=skipAnalysis)
+    # end def analyze()
+
+    def airportsAround(self, data):
+        return self.airportIndex.around(data.latitude, data.longitude)
+    # end def airportsAround()
+
+    def findInitialTakeOff(self):
+        '''
+        This function will find the initial takeoff and return the first time value after the initial takeoff
+        @return the first time index after the initial takeoff
+        '''
+        data = self.flightData
+        airport = self.detectAirport(LatLon(data.latitude[0], data.longitude[0]))
+        hAGL = data.msl_altitude - airport.alt
+        if hAGL[0] >= 500:
+            return 0
+        above = np.flatnonzero(hAGL >= 500)
+        return self.dataLength if len(above) == 0 else int(above[0]) + 1
+    # end def findInitialTakeOff()
+
+    def analyzeApproaches(self, startingIndex):
+        '''
+        This function analyzes the flight data, see FlightAnalyzer.analyzeApproaches().
+        @param startingIndex the time index after the initial takeoff
+        '''
+        t = self.thresholds
+        data = self.flightData
+        i = startingIndex
+        while i < self.dataLength:
+            i, airportIdx, distance, hAGL = self.scanForApproach(i)
+            if i >= self.dataLength:
+                break
+
+            airport = self.airportIndex.airports[airportIdx]
+            airportVector = self.airportVectors[:, airportIdx]
+            msl = data.msl_altitude
+            if self.events.info:
+                self.events.emit(
+                    'approach_detected', flight=self.flightID, approach=self.approachID + 1, index=i,
+                    airport=airport.code, city=airport.city, state=airport.state
+                )
+
+            thisApproachID = self.getAndIncApproachID()
+            self.approaches[thisApproachID] = {}
+
+            # Descend until leaving the band between the final approach and
+            # approach altitudes
+            if hAGL > t.finalMaxAltitudeAGL and hAGL < t.minAltitudeAGL:
+                j = self.firstFalse(
+                    lambda lo, hi: (msl[lo:hi] - airport.alt > t.finalMaxAltitudeAGL) &
+                                   (msl[lo:hi] - airport.alt < t.minAltitudeAGL),
+                    i, self.dataLength
+                )
+                if j < self.dataLength:
+                    i = j + 1
+                    hAGL = float(msl[j] - airport.alt)
+                else:
+                    i = self.dataLength
+                    hAGL = float(msl[-1] - airport.alt)
+            # end if
+
+            start = max(i - 1, 0)  # See FlightAnalyzer.analyzeApproaches()
+
+            runway = self.detectRunway(LatLon(data.latitude[start], data.longitude[start]), data.heading[start], airport)
+            frame = self.runwayFrame(runway, airport)
+            if self.events.info:
+                self.events.emit(
+                    'runway_selected', flight=self.flightID, approach=thisApproachID + 1,
+                    runway=None if runway is None else runway.runwayCode
+                )
+
+            # Sample k of the final approach is only visited if the sample before
+            # it was still inside the gate; the first one is gated by the values
+            # from detecting the approach and descending to the final.
+            finalStart = i
+            if distance < t.minDistance and hAGL <= t.finalMaxAltitudeAGL and \
+                    hAGL >= t.finalMinAltitudeAGL and i < self.dataLength:
+                m = self.firstFalse(
+                    lambda lo, hi: self.inFinalGate(lo, hi, airport, airportVector, frame),
+                    finalStart, self.dataLength
+                )
+                i = min(m + 1, self.dataLength)
+            # end if
+
+            self.analyzeFinal(thisApproachID, finalStart, i, runway, frame)
+
+            end = max(start, i - 1)
+
+            self.approaches[thisApproachID]['airport-code'] = airport.code
+            self.approaches[thisApproachID]['runway-code'] = None if runway is None else runway.runwayCode
+            self.approaches[thisApproachID]['approach-start'] = start
+            self.approaches[thisApproachID]['approach-end'] = end
+
+            with self.metrics.timed('analyze_landing'):
+                i = self.analyzeLanding(end, airport, thisApproachID)
+            i += LANDING_REARM_SAMPLES
+        # end while
+    # end def analyzeApproaches()
+
+    def scanForApproach(self, i):
+        '''
+        Checks the samples from i onwards for the start of an approach, skipping the ones
+            that cannot start one (see FlightAnalyzer.lookAhead()), in chunks that double in
+            size like firstFalse()'s.
+
+        The look-ahead of every sample in a chunk, and so the next sample checked after it,
+            is computed at once (the samples are ordered by time); only following the chain
+            of checked samples from one to the next is left to Python. The nearest airports
+            of the checked approach candidates are then looked up together.
+        @param: i the first sample index to check
+        @return: (index, airport position, distance, hAGL) of the first sample close
+            and low enough to an airport, or (dataLength, None, None, None) if there is none
+        '''
+        t = self.thresholds
+        data = self.flightData
+        size = 64
+        while i < self.dataLength:
+            lo, hi = i, min(self.dataLength, i + size)
+            until = data.time[lo:hi] + self.lookAheads(lo, hi)
+            following = np.maximum(np.searchsorted(data.time, until), np.arange(lo + 1, hi + 1)).tolist()
+
+            checked = []
+            while i < hi:
+                checked.append(i)
+                i = following[i - lo]
+            # end while
+            checked = np.array(checked, dtype=np.intp)
+            checked = checked[self.candidates[checked]]
+
+            if len(checked) > 0:
+                nearest = self.flightAirports.nearestMany(data.latitude[checked], data.longitude[checked])
+                distances = LatLonArray.vectorDistances(
+                    self.sampleVectors[:, checked], self.airportVectors[:, nearest], EARTH_RADIUS_MILES
+                )
+                hAGLs = data.msl_altitude[checked] - self.airportAlts[nearest]
+                found = np.flatnonzero((distances < t.minDistance) & (hAGLs < t.minAltitudeAGL))
+                if len(found) > 0:
+                    k = found[0]
+                    return int(checked[k]), int(nearest[k]), float(distances[k]), float(hAGLs[k])
+            # end if
+            size *= 2
+        # end while
+        return self.dataLength, None, None, None
+    # end def scanForApproach()
+
+    def lookAheads(self, lo, hi):
+        '''
+        Vectorized form of FlightAnalyzer.lookAhead() for the samples [lo, hi).
+        @return: array of the seconds that can be skipped after every sample without missing an approach
+        '''
+        t = self.thresholds
+        data = self.flightData
+        highest = self.lookAheadGrid.highestMany(data.latitude[lo:hi], data.longitude[lo:hi])
+        seconds = (data.msl_altitude[lo:hi] - highest - t.minAltitudeAGL) / MAX_DESCENT_RATE * 60.0
+        near = np.flatnonzero(seconds < MAX_LOOK_AHEAD)
+        if len(near) > 0:
+            distances = self.airportIndex.distancesToNearest(self.sampleVectors[:, lo + near]) * EARTH_RADIUS_MILES
+            seconds[near] = np.maximum(seconds[near], (distances - t.minDistance) / MAX_GROUND_SPEED * 3600.0)
+        return np.minimum(seconds, MAX_LOOK_AHEAD)
+    # end def lookAheads()
+
+    def inFinalGate(self, lo, hi, airport, airportVector, frame=None):
+        '''
+        @param: frame the RunwayFrame to measure the distances to the airport in, see runwayFrame()
+        @return: boolean array of whether each sample in [lo, hi) is within the final approach gate
+        '''
+        t = self.thresholds
+        if frame is not None:
+            distances = frame.distancesToAirport(self.sampleVectors[:, lo:hi]) * EARTH_RADIUS_MILES
+        else:
+            distances = LatLonArray.vectorDistances(self.sampleVectors[:, lo:hi], airportVector[:, np.newaxis], EARTH_RADIUS_MILES)
+        hAGL = self.flightData.msl_altitude[lo:hi] - airport.alt
+        return (distances < t.minDistance) & \
+            (hAGL <= t.finalMaxAltitudeAGL) & (hAGL >= t.finalMinAltitudeAGL)
+    # end def inFinalGate()
+
+    def analyzeFinal(self, thisApproachID, lo, hi, runway, frame=None):
+        '''
+        Evaluates the stability conditions for the final approach samples [lo, hi)
+            and stores the unstable intervals and parameter values of the approach.
+        @param: frame the runway's RunwayFrame to measure the cross track errors in, see runwayFrame()
+        '''
+        t = self.thresholds
+        data = self.flightData
+        approach = self.approaches[thisApproachID]
+
+        airplaneHdg = data.heading[lo:hi]
+        airplaneIAS = data.indicated_airspeed[lo:hi]
+        airplaneVSI = data.vertical_airspeed[lo:hi]
+
+        if runway is not None:
+            headingError = 180 - np.abs(np.abs(runway.magHeading - airplaneHdg) - 180)
+            cond_F1 = headingError <= t.maxHeadingError
+            # The cross track error of each sample is taken at the position of the sample before it,
+            # or at its own if it is the flight's first
+            previous = np.maximum(np.arange(lo - 1, hi - 1), 0)
+            if frame is not None:
+                crossTrackError = frame.crossTracks(self.sampleVectors[:, previous]) * EARTH_RADIUS_FEET
+            else:
+                gc = runway.centerLine
+                crossTrackError = LatLonArray.crossTrackToGreatCircle(
+                    self.sampleVectors[:, previous], np.array([gc.x, gc.y, gc.z]), EARTH_RADIUS_FEET
+                )
+            cond_F2 = np.abs(crossTrackError) <= t.maxCrossTrackError
+        else:
+            cond_F1 = cond_F2 = np.ones(hi - lo, dtype=bool)
+        # end if/else
+
+        cond_A = (airplaneIAS >= t.minIAS) & (airplaneIAS <= t.maxIAS)
+        cond_S = airplaneVSI >= t.minVSI
+
+        airplaneIsUnstable = ~(cond_F1 & cond_F2 & cond_A & cond_S)
+
+        if self.events.debug:
+            for k in np.flatnonzero(airplaneIsUnstable).tolist():
+                self.events.emit(
+                    'unstable_sample', flight=self.flightID, approach=thisApproachID + 1, index=lo + k,
+                    F1=bool(cond_F1[k]), F2=bool(cond_F2[k]), A=bool(cond_A[k]), S=bool(cond_S[k]),
+                    runway_heading=None if runway is None else runway.magHeading, heading=float(airplaneHdg[k]),
+                    heading_error=None if runway is None else float(headingError[k]),
+                    crosstrack=None if runway is None else float(crossTrackError[k]),
+                    ias=float(airplaneIAS[k]), vsi=float(airplaneVSI[k])
+                )
+        # end if
+
+        approach['unstable'] = [(lo + first, lo + last) for first, last in runsOf(airplaneIsUnstable)]
+        approach['F1'] = headingError[~cond_F1].tolist() if runway is not None else []
+        approach['F2'] = crossTrackError[~cond_F2].tolist() if runway is not None else []
+        approach['A'] = airplaneIAS[~cond_A].tolist()
+        approach['S'] = airplaneVSI[~cond_S].tolist()
+        approach['HDG'] = headingError.tolist() if runway is not None else []
+        approach['CTR'] = crossTrackError.tolist() if runway is not None else []
+        approach['IAS'] = airplaneIAS.tolist()
+        approach['VSI'] = airplaneVSI.tolist()
+    # end def analyzeFinal()
+
+    def analyzeLanding(self, start, airport, thisApproachID):
+        '''
+        This function will analyze the time after the final approach and before the plane reaches a height of 150 feet (or until the flight ends if it is the final landing).
+        @param: start the time index when the approach ends and the landing begins.
+        @param: airport the airport that the airplane is attempting to land at
+        '''
+        t = self.thresholds
+        data = self.flightData
+        hAGL = data.msl_altitude - airport.alt
+        last = self.dataLength - 1
+
+        end = start
+        if start < last:
+            end = min(self.firstFalse(lambda lo, hi: hAGL[lo:hi] < t.minAltitudeAGL, start, last), last)
+
+        # The loop engine averages the previous five hAGLs once it has seen six
+        # samples past the start, and checks that average from the next sample on
+        fullStop = bool(np.any(data.indicated_airspeed[start:end] <= t.fullStopSpeed))
+        touchAndGo = False
+        if not fullStop and end > start + 6:
+            k = np.arange(start + 6, end)
+            avgElevation = (hAGL[k - 4] + hAGL[k - 3] + hAGL[k - 2] + hAGL[k - 1] + hAGL[k]) / 5
+            touchAndGo = bool(np.any(avgElevation <= t.touchAndGoElevation))
+        # end if
+
+        if fullStop:
+            self.approaches[thisApproachID]['landing-type'] = 'stop-and-go'
+        elif touchAndGo:
+            self.approaches[thisApproachID]['landing-type'] = 'touch-and-go'
+        else:
+            self.approaches[thisApproachID]['landing-type'] = 'go-around'
+
+        self.approaches[thisApproachID]['landing-start'] = start
+        self.approaches[thisApproachID]['landing-end'] = end
+        if self.events.info:
+            self.events.emit(
+                'landing_classified', flight=self.flightID, approach=thisApproachID + 1,
+                landing_type=self.approaches[thisApproachID]['landing-type'], start=start, end=end
+            )
+        return end
+    # end def analyzeLanding()
+
+    def firstFalse(self, predicate, lo, hi):
+        '''
+        Finds the first index in [lo, hi) for which predicate is False, evaluating it
+            on chunks that double in size so short segments stay cheap.
+        @param: predicate function of (lo, hi) returning a boolean array for the samples [lo, hi)
+        @return: the first failing index, or hi if there is none
+        '''
+        size = 64
+        while lo < hi:
+            top = min(hi, lo + size)
+            failures = np.flatnonzero(~predicate(lo, top))
+            if len(failures) > 0:
+                return lo + int(failures[0])
+            lo = top
+            size *= 2
+        return hi
+    # end def firstFalse()
+
+# end class VectorizedFlightAnalyzer
+
+
+def runsOf(mask):
+    '''
+    @return: list of (first, last) positions of every run of True values in mask
+    '''
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1) - 1
+    return zip(starts.tolist(), ends.tolist())
+# end def runsOf()
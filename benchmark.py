@@ -0,0 +1,363 @@
+#!/usr/bin/env python
+
+import argparse
+import logging
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import traceback
+import numpy as np
+import main
+import LatLonArray
+from DataSource import openDataSource
+from FlightAnalysis import (
+    FlightAnalyzer, EARTH_RADIUS_FEET, EARTH_RADIUS_MILES, APPROACH_MIN_DISTANCE, DEFAULT_THRESHOLDS,
+    APPROACH_FINAL_MAX_ALTITUDE_AGL, APPROACH_FINAL_MIN_ALTITUDE_AGL, RUNWAY_SELECTION_INDICATOR, RUNWAY_FRAME_TOLERANCE
+)
+from FlightGenerator import FlightGenerator, flightRows
+from RunwayFrame import RunwayFrame
+from ThresholdSweep import ThresholdGrid, SweepAnalyzer
+
+
+logger = logging.getLogger(__name__)
+
+SYNTHETIC_AIRCRAFT_TYPE = 1
+# The grid of threshold sets the sweep is timed with, around the defaults
+SWEEP_GRID = {
+    'maxHeadingError': [5, 10, 15, 20],
+    'maxCrossTrackError': [25, 50, 75, 100],
+    'minIAS': [50, 55, 60],
+    'maxIAS': [70, 75, 80],
+    'minVSI': [-1200, -1000, -800],
+}
+
+
+class CollectingWriter(object):
+    '''
+    Stands in for the ResultWriter, keeping the rows every flight would have written to the DB.
+    '''
+
+    def __init__(self):
+        self.approachRows = []
+    # end def __init__()
+
+    def add(self, flightID, approachRows):
+        self.approachRows.extend(approachRows)
+    # end def add()
+
+    def close(self):
+        return True
+    # end def close()
+
+# end class CollectingWriter
+
+
+def generateFlights(args):
+    '''
+    Generates the benchmark's flights, the same ones for the same arguments.
+    @return: generator of (flightID, Runway flown at, FlightColumns) tuples
+    '''
+    generator = FlightGenerator.forDatabase(main.airports, seed=args.seed, sampleRate=args.sample_rate)
+    for flightID in xrange(1, args.flights + 1):
+        runway, columns = generator.flight(circuits=args.circuits, cruiseMinutes=args.cruise_minutes)
+        yield flightID, runway, columns
+    # end for
+# end def generateFlights()
+
+
+def isolated(function, *args):
+    '''
+    Runs function in a child process, so the peak memory it reports is its own.
+        The child's stdout, where the pipeline's workers print that they are done, is discarded.
+    @return: what function returned
+    '''
+    results = multiprocessing.Queue()
+
+    def run():
+        sys.stdout = open(os.devnull, 'w')
+        try:
+            results.put((True, function(*args)))
+        except Exception:
+            results.put((False, traceback.format_exc()))
+    # end def run()
+
+    child = multiprocessing.Process(target=run)
+    child.start()
+    succeeded, result = results.get()
+    child.join()
+    if not succeeded:
+        raise RuntimeError("%s failed in a child process:\n%s" % (function.__name__, result))
+    return result
+# end def isolated()
+
+
+def peakMemory(who=resource.RUSAGE_SELF):
+    '''
+    @return: the peak resident set size, in kB, of this process or (RUSAGE_CHILDREN) of its largest waited for child
+    '''
+    return resource.getrusage(who).ru_maxrss
+# end def peakMemory()
+
+
+def benchmarkAnalyzer(engine, args):
+    '''
+    Analyzes the generated flights in this process, without any data source.
+    @return: (samples, seconds, peak memory in kB, approach rows) of the run
+    '''
+    main.loadAirportData()
+    flights = list(generateFlights(args))
+
+    writer = CollectingWriter()
+    analyzer = main.ENGINES[engine](None, main.airports, airportIndex=main.airportIndex, writer=writer)
+    samples = 0
+    start = time.time()
+    for flightID, _, columns in flights:
+        analyzer.analyze(flightID, SYNTHETIC_AIRCRAFT_TYPE, analyzer.loadFlightData(columns))
+        samples += len(columns)
+    # end for
+    return samples, time.time() - start, peakMemory(), writer.approachRows
+# end def benchmarkAnalyzer()
+
+
+def buildDatabase(path, args):
+    '''
+    Stores the generated flights in a new SQLite file.
+    @return: the number of samples stored
+    '''
+    main.loadAirportData()
+    source = openDataSource('sqlite:' + path)
+    samples = 0
+    with source.errors():
+        cursor = source.cursor()
+        for flightID, _, columns in generateFlights(args):
+            source.insertFlight(cursor, flightID, SYNTHETIC_AIRCRAFT_TYPE, flightRows(flightID, columns))
+            samples += len(columns)
+        # end for
+        source.connection.commit()
+    source.close()
+    return samples
+# end def buildDatabase()
+
+
+def benchmarkPipeline(engine, workers, path, args):
+    '''
+    Runs main() with workers Consumers over a copy of the database at path.
+    @return: (seconds, peak memory of the coordinator and of the largest Consumer in kB, approach rows) of the run
+    '''
+    copy = path + '.%s-%d' % (engine, workers)
+    shutil.copy(path, copy)
+    spec = 'sqlite:' + copy
+
+    main.NUM_CPUS = workers
+    main.globalSource = openDataSource(spec)
+    start = time.time()
+    main.main([], True, False, engine, chunkRows=args.chunk_rows, prefetch=args.prefetch, source=spec)
+    seconds = time.time() - start
+
+    source = main.globalSource
+    with source.errors():
+        approachRows = source.execute(source.cursor(), "SELECT * FROM approaches ORDER BY flight_id, approach_id;").fetchall()
+    source.close()
+    os.remove(copy)
+    return seconds, peakMemory(), peakMemory(resource.RUSAGE_CHILDREN), approachRows
+# end def benchmarkPipeline()
+
+
+def runwayFrameErrors(args):
+    '''
+    Measures how far the RunwayFrame of every generated flight's runway is off from the spherical
+        functions, over the flight's samples within APPROACH_MIN_DISTANCE of the runway's airport.
+    @return: (largest cross track error, largest distance error, largest bound from RunwayFrame.maxError()), in feet
+    '''
+    main.loadAirportData()
+    reach = float(APPROACH_MIN_DISTANCE) / EARTH_RADIUS_MILES
+    crossTrackError = distanceError = bound = 0.0
+    for _, runway, columns in generateFlights(args):
+        airport = main.airports[runway.airportCode]
+        frame = RunwayFrame(runway, airport)
+        a = airport.nVector
+        gc = runway.centerLine
+
+        vectors = LatLonArray.toVectors(columns.latitude, columns.longitude)
+        distances = LatLonArray.vectorDistances(vectors, np.array([[a.x], [a.y], [a.z]]), 1.0)
+        final = distances < reach
+        vectors, distances = vectors[:, final], distances[final]
+        if len(distances) == 0:
+            continue
+        crossTracks = LatLonArray.crossTrackToGreatCircle(vectors, np.array([gc.x, gc.y, gc.z]), 1.0)
+
+        crossTrackError = max(crossTrackError, float(np.abs(frame.crossTracks(vectors) - crossTracks).max()))
+        distanceError = max(distanceError, float(np.abs(frame.distancesToAirport(vectors) - distances).max()))
+        bound = max(bound, frame.maxError(reach))
+    # end for
+    return crossTrackError * EARTH_RADIUS_FEET, distanceError * EARTH_RADIUS_FEET, bound * EARTH_RADIUS_FEET
+# end def runwayFrameErrors()
+
+
+def runwaySelection(args, approachRows):
+    '''
+    Checks the runways the approaches were matched to against the runways the generated flights flew
+        at, and how many samples of their final approaches RunwayCorridors.assign() puts in the corridor
+        of the runway flown at.
+    @param: approachRows the approach rows an engine found in the generated flights
+    @return: (share of the approaches, share of the final approach samples) matched to the runway flown at
+    '''
+    main.loadAirportData()
+    analyzer = FlightAnalyzer(None, main.airports, airportIndex=main.airportIndex, writer=CollectingWriter())
+    reach = float(APPROACH_MIN_DISTANCE) / EARTH_RADIUS_MILES
+    flown = {}
+    samples = matched = 0
+    for flightID, runway, columns in generateFlights(args):
+        flown[flightID] = runway.runwayCode
+        airport = main.airports[runway.airportCode]
+        a = airport.nVector
+
+        vectors = LatLonArray.toVectors(columns.latitude, columns.longitude)
+        hAGL = columns.msl_altitude - airport.alt
+        final = (LatLonArray.vectorDistances(vectors, np.array([[a.x], [a.y], [a.z]]), 1.0) < reach) & \
+            (hAGL <= APPROACH_FINAL_MAX_ALTITUDE_AGL) & (hAGL >= APPROACH_FINAL_MIN_ALTITUDE_AGL)
+        assigned = analyzer.runwayCorridors(airport).assign(vectors[:, final], columns.heading[final], RUNWAY_SELECTION_INDICATOR)
+        samples += len(assigned)
+        matched += int(np.count_nonzero(assigned == airport.runways.index(runway)))
+    # end for
+
+    approaches = sum(1 for row in approachRows if row[3] == flown[row[0]])
+    return float(approaches) / max(1, len(approachRows)), float(matched) / max(1, samples)
+# end def runwaySelection()
+
+
+def benchmarkSweep(values, args):
+    '''
+    Sweeps a grid of threshold sets over the generated flights in this process.
+    @param: values the values of every swept field, see ThresholdGrid
+    @return: (samples, seconds, unstable approaches under the default thresholds) of the run
+    '''
+    main.loadAirportData()
+    flights = list(generateFlights(args))
+
+    grid = ThresholdGrid(values)
+    analyzer = SweepAnalyzer(None, main.airports, grid, airportIndex=main.airportIndex)
+    samples = 0
+    start = time.time()
+    for flightID, _, columns in flights:
+        analyzer.analyze(flightID, SYNTHETIC_AIRCRAFT_TYPE, analyzer.loadFlightData(columns))
+        samples += len(columns)
+    # end for
+    seconds = time.time() - start
+
+    defaults = [k for k, overrides in enumerate(grid.sets)
+                if all(value == getattr(DEFAULT_THRESHOLDS, field) for field, value in overrides.iteritems())]
+    return samples, seconds, int(analyzer.summary.unstable[defaults[0]])
+# end def benchmarkSweep()
+
+
+def checkResults(results):
+    '''
+    Logs a warning for every run whose approaches differ from the first run's.
+    @param: results list of (name, approach rows) tuples
+    '''
+    name, expected = results[0]
+    for other, approachRows in results[1:]:
+        if approachRows != expected:
+            logger.warning("%s found different approaches than %s", other, name)
+    # end for
+# end def checkResults()
+
+
+def benchmark(args):
+    print "%d flights of %d circuits%s at %g samples/s" % (
+        args.flights, args.circuits, " and %g minutes cross-country" % args.cruise_minutes if args.cruise_minutes > 0 else "", args.sample_rate
+    )
+
+    print
+    print "Analyzer only             samples/s   flights/s    peak RSS"
+    results = []
+    for engine in args.engines:
+        samples, seconds, peak, approachRows = isolated(benchmarkAnalyzer, engine, args)
+        print "  %-20s %12.0f %11.2f %9.1f MB" % (engine, samples / seconds, args.flights / seconds, peak / 1024.0)
+        results.append((engine, approachRows))
+    # end for
+    checkResults(results)
+
+    approaches, samples = isolated(runwaySelection, args, results[0][1])
+    print
+    print "Runway selection          approaches   final samples"
+    print "  at the flown runway %14.1f%% %14.1f%%" % (100 * approaches, 100 * samples)
+
+    print
+    print "Threshold sweep               sets   samples/s   flights/s"
+    unstable = sum(row[9] for row in results[0][1])
+    for values in ({}, SWEEP_GRID):
+        samples, seconds, sweptUnstable = isolated(benchmarkSweep, values, args)
+        sets = len(ThresholdGrid(values))
+        print "  %-20s %13d %11.0f %11.2f" % (
+            'grid around defaults' if values else 'defaults only', sets, samples / seconds, args.flights / seconds
+        )
+        if sweptUnstable != unstable:
+            logger.warning("The sweep of %d sets found %d unstable approaches under the defaults instead of %d", sets, sweptUnstable, unstable)
+    # end for
+
+    crossTrackError, distanceError, bound = isolated(runwayFrameErrors, args)
+    print
+    print "Runway frame error        cross track    distance       bound"
+    print "  within %-6g mi %18.6f %11.6f %11.6f ft" % (APPROACH_MIN_DISTANCE, crossTrackError, distanceError, bound)
+    if max(crossTrackError, distanceError) > RUNWAY_FRAME_TOLERANCE:
+        logger.warning("The runway frames are off by more than %g ft", RUNWAY_FRAME_TOLERANCE)
+
+    if args.no_pipeline:
+        return
+
+    directory = tempfile.mkdtemp(prefix='benchmark-')
+    try:
+        path = os.path.join(directory, 'flights.db')
+        samples = isolated(buildDatabase, path, args)
+
+        print
+        print "Pipeline   workers        samples/s   flights/s    peak RSS (coordinator, worker)"
+        results = []
+        for engine in args.engines:
+            for workers in args.workers:
+                seconds, coordinator, worker, approachRows = isolated(benchmarkPipeline, engine, workers, path, args)
+                print "  %-10s %7d %16.0f %11.2f %9.1f MB, %.1f MB" % (
+                    engine, workers, samples / seconds, args.flights / seconds, coordinator / 1024.0, worker / 1024.0
+                )
+                results.append(("%s with %d workers" % (engine, workers), approachRows))
+            # end for
+        # end for
+        checkResults(results)
+    finally:
+        shutil.rmtree(directory)
+# end def benchmark()
+
+
+def commaSeparated(kind):
+    return lambda value: [kind(item) for item in value.split(',')]
+# end def commaSeparated()
+
+
+'''
+Measures the throughput and memory of the analysis on synthetic flights of pattern work, first of
+    the engines alone and then of the whole pipeline (SQLite data source, Scheduler, Consumers and
+    ResultWriter) for every number of workers. E.g. to compare the engines on long flights:
+    benchmark.py -n 50 --circuits 10 --cruise-minutes 60 --sample-rate 4 -w 1,4
+'''
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark of the approach analysis on synthetic flights.')
+    parser.add_argument('-n', '--flights', type=int, default=20, help='number of flights to generate (default: 20)')
+    parser.add_argument('--circuits', type=int, default=6, help='traffic circuits per flight (default: 6)')
+    parser.add_argument('--cruise-minutes', type=float, default=0.0, help='length of a cross-country leg before the last circuit (default: none)')
+    parser.add_argument('--sample-rate', type=float, default=1.0, help='samples per second (default: 1)')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the generated flights (default: 0)')
+    parser.add_argument('-e', '--engines', type=commaSeparated(str), default=sorted(main.ENGINES.keys()), help='comma separated engines to compare (default: all)')
+    parser.add_argument('-w', '--workers', type=commaSeparated(int), default=[1, main.NUM_CPUS], help='comma separated numbers of workers to run the pipeline with (default: 1,%d)' % main.NUM_CPUS)
+    parser.add_argument('-c', '--chunk-rows', type=int, default=main.DEFAULT_CHUNK_ROWS, help='rows of flight data to hand a worker at a time (default: %d)' % main.DEFAULT_CHUNK_ROWS)
+    parser.add_argument('-p', '--prefetch', type=int, default=main.DEFAULT_PREFETCH, help='flights each worker fetches ahead (default: %d)' % main.DEFAULT_PREFETCH)
+    parser.add_argument('--no-pipeline', action='store_true', help='only benchmark the engines on their own')
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)  # Leave out main's progress logging
+    benchmark(args)
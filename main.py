@@ -1,120 +1,319 @@
 #!/usr/bin/env python
 
 import argparse
-import config.db_config as db_config
 import contextlib
 import logging
 import multiprocessing
-import MySQLdb as mysql
+import Queue
+import resource
+import signal
+import threading
 import time
-from Airport import Airport
-from FlightAnalysis import FlightAnalyzer
-from LatLon import LatLon
-from Runway import Runway
+from AirportDatabase import AirportDatabase
+from DataSource import openDataSource, DataSourceError, DEFAULT_SOURCE
+from Events import openEventSink, LEVELS as EVENT_LEVELS, INFO
+from FlightAnalysis import FlightAnalyzer, DEFAULT_THRESHOLDS
+from LiveAnalysis import LiveMonitor, DEFAULT_POLL_SECONDS, DEFAULT_IDLE_SECONDS
+from Metrics import StageMetrics, MetricsReporter, DEFAULT_METRICS_INTERVAL
+from Profiler import Profiler, prepareDirectory, mergeProfiles
+from ResultWriter import ResultWriter, DEFAULT_FLUSH_FLIGHTS, DEFAULT_FLUSH_SECONDS
+from Scheduler import Scheduler, DEFAULT_CHUNK_ROWS
+from StreamingAnalysis import StreamingFlightAnalyzer
+from ThresholdSweep import ThresholdGrid, SweepAnalyzer, SWEEP_FIELDS
+from Thresholds import ThresholdProfiles
+from VectorizedAnalysis import VectorizedFlightAnalyzer
 
 
 """ LOGGING SETUP """
 logging.basicConfig(level=logging.DEBUG, format="%(asctime)s - %(name)s - %(levelname)s - %(process)d - %(message)s")
 logger = logging.getLogger(__name__)
 
-""" IMPORT ENVIRONMENT-SPECIFIC CONFIGS """
-ENV = "dev"
-db_creds = db_config.credentials[ENV]
-
 """ SQL STATEMENTS """
 # fetchAirportDataSQL = "SELECT AirportCode, AirportName, City, StateCode, Latitude, Longitude, Elevation FROM dev_fdm_test.airports;"
 # fetchRunwayDataSQL = "SELECT AirportCode, Runway, tdze, magRunwayCourse, trueRunwayCourse, touchdownLat, touchdownLong FROM dev_fdm_test.airports_runways;"
-fetchFlightIDsSQL = "SELECT flight_id FROM flight_analyses WHERE approach_analysis = 0;"
-fetchAircraftTypeSQL = "SELECT aircraft_type FROM flight_id WHERE id = %s;"
-fetchFlightDataSQL = '''
-    SELECT
-        time, msl_altitude, indicated_airspeed, vertical_airspeed, heading, latitude, longitude, pitch_attitude, eng_1_rpm
-    FROM
-        main
-    WHERE
-        flight = %s
-    ORDER BY time ASC;
-'''
 
 """ GLOBAL VARIABLES """
-globalConn = None
-globalCursor = None
+globalSource = None
 globalFlightAnalyzer = None
 airports = {}
+airportIndex = None
 NUM_CPUS = multiprocessing.cpu_count()  # Set number of CPUs to use for multiprocessing
+DEFAULT_PREFETCH = 2  # Flights each Consumer fetches ahead of the one it is analyzing
+PREFETCH_POLL_SECONDS = 0.5  # How often a waiting Prefetcher checks whether it was stopped
+SWEEP_BATCH = 200  # Flights per fetch of a threshold sweep
+ENGINES = {
+    'loop': FlightAnalyzer,                  # walks the list of row dicts one sample at a time
+    'vectorized': VectorizedFlightAnalyzer,  # whole-array operations over NumPy columns
+    'streaming': StreamingFlightAnalyzer,    # state machine fed one sample at a time from the data source's cursor
+}
 
 
 class Consumer(multiprocessing.Process):
 
-    def __init__(self, task_queue, skipOutputToDB):
+    def __init__(self, workerID, inbox, outbox, skipOutputToDB, engine='loop', prefetch=DEFAULT_PREFETCH,
+                 flushFlights=DEFAULT_FLUSH_FLIGHTS, flushSeconds=DEFAULT_FLUSH_SECONDS, source=DEFAULT_SOURCE, profileDir=None,
+                 eventsFile=None, eventsLevel=INFO):
         multiprocessing.Process.__init__(self)
-        self.task_queue = task_queue
-        self.conn = mysql.connect(**db_creds)
-        self.cursor = self.conn.cursor(mysql.cursors.DictCursor)
-        self.flightAnalyzer = FlightAnalyzer(self.conn, self.cursor, airports, skipOutput=skipOutputToDB)
+        self.workerID = workerID
+        self.inbox = inbox  # Chunks of flight IDs from the Scheduler, None when there are no more
+        self.outbox = outbox  # (workerID, seconds spent) reported back after every chunk
+        self.prefetch = prefetch  # Flights fetched ahead of the one being analyzed, 0 to fetch in line
+        self.sourceSpec = source  # Every Consumer opens its own connections to the data source
+        self.skipOutputToDB = skipOutputToDB
+        self.engine = engine
+        self.flushFlights = flushFlights
+        self.flushSeconds = flushSeconds
+        self.profiler = Profiler(profileDir, 'worker-%d' % workerID)  # Does nothing without a profileDir
+        self.eventsFile = eventsFile  # JSON lines file the analysis events are appended to, None to discard them
+        self.eventsLevel = eventsLevel
     # end def __init__()
 
     def run(self):
-        while True:
-            next_task = self.task_queue.get()
-            if next_task is None:
-                print 'Tasks Complete! Exiting ...'
-                self.task_queue.task_done()
-                break
-            answer = next_task(connection=self.conn, analyzer=self.flightAnalyzer)
-            self.task_queue.task_done()
+        logger.info("Memory footprint at start: %s", formatFootprint(memoryFootprint()))
+
+        self.source = openDataSource(self.sourceSpec)
+        self.writer = ResultWriter(self.source, self.flushFlights, self.flushSeconds)
+        self.metrics = StageMetrics()  # Sent to the Scheduler and reset after every chunk
+        self.events = openEventSink(self.eventsFile, self.eventsLevel)
+        self.profiles = ThresholdProfiles.load(self.source, DEFAULT_THRESHOLDS)  # Thresholds of every aircraft type
+        self.flightAnalyzer = ENGINES[self.engine](
+            self.source, airports, skipOutput=self.skipOutputToDB, airportIndex=airportIndex, writer=self.writer,
+            metrics=self.metrics, events=self.events
+        )
+
+        # Turn a SIGTERM into an exception, so the buffered results are still written
+        signal.signal(signal.SIGTERM, raiseSystemExit)
+        self.profiler.start()
+        try:
+            self.consume()
+        finally:
+            self.writer.close()
+            self.source.close()
+            self.events.close()
+            self.profiler.stop()
+
+        print 'Tasks Complete! Exiting ...'
+        logger.info("Memory footprint at exit: %s", formatFootprint(memoryFootprint()))
     # end def run()
 
+    def consume(self):
+        '''
+        Analyzes the flights of every chunk the Scheduler sends, reporting back after each chunk.
+        '''
+        # A streaming engine reads every flight straight off the cursor, so there is nothing to fetch ahead
+        prefetch = 0 if self.flightAnalyzer.streaming else self.prefetch
+        if prefetch > 0:
+            tasks = Prefetcher(self.inbox, prefetch, self.sourceSpec, self.profiler, self.metrics)
+            tasks.start()
+        else:
+            tasks = fetchTasks(self.inbox, self.sourceSpec, self.metrics, self.flightAnalyzer.streaming)
+
+        busy = analyzing = waiting = 0.0
+        t0 = time.time()
+        try:
+            for task in tasks:
+                t1 = time.time()
+                waiting += t1 - t0
+                if task is None:  # End of a chunk
+                    self.writer.flushIfDue()
+                    self.events.flush()
+                    self.profiles = self.profiles.refreshed(self.source)
+                    self.outbox.put((self.workerID, busy, self.metrics.drain()))
+                    busy = 0.0
+                else:
+                    try:
+                        task.analyze(self.flightAnalyzer, self.profiles)
+                    except Exception:
+                        # Keep going, the rest of the chunk is still waiting on this worker
+                        logger.exception("Analysis failed for Flight ID [%s]", task.flightID)
+                        self.metrics.count('flights_failed')
+                    elapsed = time.time() - t1
+                    busy += elapsed
+                    analyzing += elapsed
+                t0 = time.time()
+            # end for
+        finally:
+            # Also when the analysis stopped early, so that the Prefetcher's profile is done before Profiler.stop()
+            if prefetch > 0:
+                tasks.stop()
+
+        logger.info("Spent %.2fs analyzing and %.2fs waiting for flight data", analyzing, waiting)
+    # end def consume()
+
 # end class Consumer
 
 
+class Prefetcher(threading.Thread):
+    '''
+    Thread that fetches the flights sent to a Consumer while the Consumer analyzes,
+        staying at most depth flights ahead of the analysis.
+    Iterating over it yields the same items as fetchTasks(). stop() ends the thread even
+        if the Consumer did not take all of them.
+    '''
+
+    DONE = object()
+
+    def __init__(self, inbox, depth, sourceSpec, profiler, metrics):
+        threading.Thread.__init__(self, name='Prefetcher')
+        self.daemon = True
+        self.inbox = inbox
+        self.sourceSpec = sourceSpec
+        self.profiler = profiler  # The Consumer's Profiler, which also profiles this thread
+        self.metrics = metrics
+        self.fetched = Queue.Queue(maxsize=depth)
+        self.failed = False
+        self.stopped = threading.Event()  # Set by stop()
+    # end def __init__()
+
+    def run(self):
+        with self.profiler.profiling():
+            tasks = fetchTasks(self.inbox, self.sourceSpec, self.metrics, stopped=self.stopped)
+            try:
+                for task in tasks:
+                    if not self.handOut(task):
+                        break
+                # end for
+            except Exception:
+                logger.exception("Prefetching flight data failed")
+                self.failed = True
+            finally:
+                tasks.close()
+                self.handOut(self.DONE)
+    # end def run()
+
+    def handOut(self, task):
+        '''
+        Waits for room in the fetched queue, or for stop().
+        @return: whether the task was handed out
+        '''
+        while not self.stopped.is_set():
+            try:
+                self.fetched.put(task, timeout=PREFETCH_POLL_SECONDS)
+                return True
+            except Queue.Full:
+                pass
+        # end while
+        return False
+    # end def handOut()
+
+    def stop(self):
+        '''
+        Stops fetching and waits for the thread to end.
+        '''
+        self.stopped.set()
+        self.join()
+    # end def stop()
+
+    def __iter__(self):
+        while True:
+            task = self.fetched.get()
+            if task is self.DONE:
+                break
+            yield task
+        # end while
+        if self.failed:
+            raise RuntimeError("Prefetcher stopped before all flights were fetched")
+    # end def __iter__()
+
+# end class Prefetcher
+
+
+def fetchTasks(inbox, sourceSpec, metrics, streaming=False, stopped=None):
+    '''
+    Fetches the flights of every chunk sent to inbox, on a connection of its own, until it receives None.
+    @param: inbox the queue of chunks of flight IDs
+    @param: sourceSpec the data source to fetch from, see openDataSource()
+    @param: metrics the StageMetrics to record the fetches' durations in
+    @param: streaming whether to hand out every flight as an iterator of its samples still
+        to be read from the cursor, which must be analyzed before the next Task is taken
+    @param: stopped threading.Event that ends the fetching while waiting for a chunk, if any
+    @return: generator of a Task for every flight that was fetched, and None after every chunk
+    '''
+    source = openDataSource(sourceSpec)
+    try:
+        while True:
+            flightIDs = receive(inbox, stopped)
+            if flightIDs is None:
+                break
+            try:
+                with metrics.timed('fetch_aircraft_types'):
+                    aircraftTypes = source.fetchAircraftTypes(flightIDs)
+                t0 = time.time()
+                # Closed along with this generator too, before the connection is
+                with contextlib.closing(source.streamSamples(flightIDs) if streaming else source.streamFlights(flightIDs)) as flights:
+                    for flightID, columns in flights:
+                        metrics.observe('fetch_flight', time.time() - t0)
+                        yield Task(flightID, aircraftTypes.get(flightID), columns)
+                        t0 = time.time()
+            except DataSourceError, e:
+                # The flights of the chunk that were not fetched stay unanalyzed
+                logging.exception("%s", e)
+                logging.error("Last Executed Query: %s", e.query)
+            yield None
+        # end while
+    finally:
+        source.close()
+# end def fetchTasks()
+
+
+def receive(inbox, stopped=None):
+    '''
+    @param: inbox the queue of chunks of flight IDs
+    @param: stopped threading.Event to stop waiting at, None to wait for as long as it takes
+    @return: the next chunk sent to inbox, or None if stopped was set first
+    '''
+    if stopped is None:
+        return inbox.get()
+    while not stopped.is_set():
+        try:
+            return inbox.get(timeout=PREFETCH_POLL_SECONDS)
+        except Queue.Empty:
+            pass
+    # end while
+    return None
+# end def receive()
+
+
 class Task(object):
 
-    def __init__(self, flightID):
+    def __init__(self, flightID, aircraftType, columns):
         self.flightID = flightID
+        self.aircraftType = aircraftType
+        self.columns = columns  # FlightColumns of the flight's data, or iterator of its samples for a streaming engine
     # end def __init__()
 
-    def __call__(self, connection=None, analyzer=None):
+    def analyze(self, analyzer, profiles):
+        '''
+        Analyzes the fetched flight.
+        @param: analyzer the FlightAnalyzer to analyze it with
+        @param: profiles the ThresholdProfiles to take the thresholds of the flight's aircraft type from
+        '''
         logging.info("Now Analyzing Flight ID [%s]", self.flightID)
+        analyzer.setThresholds(profiles.forAircraft(self.aircraftType))
 
-        cursor = connection.cursor(mysql.cursors.DictCursor)
-
-        try:
-            cursor.execute(fetchAircraftTypeSQL, (self.flightID,))
-            aircraftType = cursor.fetchone()['aircraft_type']
-
-            # Get the flight's data
-            cursor.execute(fetchFlightDataSQL, (self.flightID,))
-            rows = cursor.fetchall()
-
-            flightData = []
-            for row in rows:
-                # Before checking if flight data is valid, filter out data rows
-                # that contain NULL values
-                if None not in row.values():
-                    row['LatLon'] = LatLon(row['latitude'], row['longitude'])
-                    flightData.append(row)
-            # end for
+        with analyzer.metrics.timed('conversion'):
+            flightData = analyzer.loadFlightData(self.columns)
+        self.columns = None
 
-            approaches = analyzer.analyze(
-                self.flightID,
-                aircraftType,
-                flightData,
-                skipAnalysis=False  # not isFlightDataValid(flightData[:10])
-            )
+        approaches = analyzer.analyze(
+            self.flightID,
+            self.aircraftType,
+            flightData,
+            skipAnalysis=False  # not isFlightDataValid(flightData[:10])
+        )
 
-            logging.info("Processing Complete Flight ID [%s]", self.flightID)
-        except mysql.Error, e:
-            logging.exception("MySQL Error [%d]: %s", e.args[0], e.args[1])
-            logging.exception("Last Executed Query: %s", cursor._last_executed)
+        analyzer.metrics.count('flights_analyzed')
+        analyzer.metrics.count('samples_analyzed', analyzer.dataLength)
 
-        return -1
-    # end def __call__()
+        logging.info("Processing Complete Flight ID [%s]", self.flightID)
+    # end def analyze()
 
 # end class Task
 
 
-def main(flightIDs, runWithMultiProcess, skipOutputToDB):
+def main(flightIDs, runWithMultiProcess, skipOutputToDB, engine='loop', chunkRows=DEFAULT_CHUNK_ROWS, prefetch=DEFAULT_PREFETCH,
+         flushFlights=DEFAULT_FLUSH_FLIGHTS, flushSeconds=DEFAULT_FLUSH_SECONDS, source=DEFAULT_SOURCE, profileDir=None,
+         metricsFile=None, metricsInterval=DEFAULT_METRICS_INTERVAL, eventsFile=None, eventsLevel=INFO):
     '''
     Main function gets a list of all the files contained within the passed in
         folder name. Then scans through each file one-by-one in order to pass it
@@ -126,60 +325,135 @@ def main(flightIDs, runWithMultiProcess, skipOutputToDB):
     # fetch all flights that haven't been analyzed for approaches yet
     # Otherwise the ids passed into argv will only be analyzed
     if len(flightIDs) == 0:
-        globalCursor.execute(fetchFlightIDsSQL)
-        flights = globalCursor.fetchall()
-        flightIDs = [flight['flight_id'] for flight in flights]
+        flightIDs = globalSource.fetchFlightIDs()
         # flightIDs = [392706, 393230, 382486, 387607, 393246, 388639, 382496, 393769, 387627, 389165, 395316, 383544, 389178, 387765, 383556, 393289, 382538, 394766, 387160, 388186, 388192, 390247, 386666, 387181, 395374, 394355, 381046, 392824, 394362, 394365, 387201, 392836, 384647, 392334, 393837, 385690, 384674, 394927, 388638, 392886, 392898, 386765, 389844, 389850, 382172, 382178, 384307, 394475, 386800, 383219, 394998, 392955, 388354, 383749, 384269, 384270, 382741, 381218, 383781, 385836, 389421, 383790, 381233, 385331, 392504, 384326, 395599, 393554, 393046, 392538, 387949, 394933, 381812, 394127, 389521, 388498, 394645, 384412, 390048, 389027, 384420, 381349, 383403, 386486, 393655, 384441, 384445, 390082, 384965, 384460, 382928, 395219, 395220, 390052, 384476, 385645, 397800, 397803, 390131, 385012]
 
     logging.info('Number of Flights to Analyze: %4d', len(flightIDs))
 
+    flightSizes = globalSource.fetchFlightSizes(flightIDs)
+
     loadAirportData()
 
-    tasks = multiprocessing.JoinableQueue()
+    if profileDir is not None:
+        prepareDirectory(profileDir)
 
     # If running in parallel, create NUM_CPUS number of Consumers for
     #   processing tasks.
     # If running linearly, only create 1 Consumer for processing tasks.
     num_consumers = NUM_CPUS if runWithMultiProcess else 1
+    reporter = MetricsReporter(metricsFile, metricsInterval)
+    scheduler = Scheduler(num_consumers, chunkRows, reporter)
     consumers = []
     for i in xrange(num_consumers):
-        c = Consumer(tasks, skipOutputToDB)
+        c = Consumer(
+            i, scheduler.inboxes[i], scheduler.outbox, skipOutputToDB, engine, prefetch, flushFlights, flushSeconds, source, profileDir,
+            eventsFile, eventsLevel
+        )
         c.start()
         consumers.append(c)
 
-    # Push all the flight IDs onto the tasks Queue for processing
-    for flightID in flightIDs:
-        tasks.put(Task(flightID))
+    # Hand out the flights largest first until all of them are analyzed
+    scheduler.run(flightSizes, consumers)
+    scheduler.report()
+    reporter.report()
 
-    # Push None's onto Queue to signal to Consumers to stop consuming
-    for i in xrange(num_consumers):
-        tasks.put(None)
+    for c in consumers:
+        c.join()
 
-    # Cause main thread to wait for queue to be empty
-    tasks.join()
+    if profileDir is not None:
+        mergeProfiles(profileDir, [c.profiler.name for c in consumers])
 # end def main()
 
 
+def live(flightIDs, skipOutputToDB, source=DEFAULT_SOURCE, pollSeconds=DEFAULT_POLL_SECONDS, idleSeconds=DEFAULT_IDLE_SECONDS,
+         metricsFile=None, metricsInterval=DEFAULT_METRICS_INTERVAL, eventsFile=None, eventsLevel=INFO):
+    '''
+    Follows the flights still being ingested with a LiveMonitor, in this process, until
+        interrupted or, if flightIDs are given, until all of them are over.
+    The rows are read on a connection of their own, the results are written through globalSource.
+    '''
+    loadAirportData()
+
+    reader = openDataSource(source)
+    writer = ResultWriter(globalSource)  # Flushed after every poll
+    reporter = MetricsReporter(metricsFile, metricsInterval)
+    events = openEventSink(eventsFile, eventsLevel)
+    analyzer = StreamingFlightAnalyzer(
+        globalSource, airports, skipOutput=skipOutputToDB, airportIndex=airportIndex, writer=writer,
+        metrics=reporter.metrics, events=events
+    )
+    profiles = ThresholdProfiles.load(reader, DEFAULT_THRESHOLDS)
+    monitor = LiveMonitor(reader, analyzer, pollSeconds, idleSeconds, flightIDs or None, reporter, profiles)
+
+    # Turn a SIGTERM into an exception, so the approaches found so far are still written
+    signal.signal(signal.SIGTERM, raiseSystemExit)
+    logging.info("Following %s, polling every %gs", ', '.join(str(flightID) for flightID in flightIDs) if flightIDs else 'all unanalyzed flights', pollSeconds)
+    try:
+        monitor.run()
+    except (KeyboardInterrupt, SystemExit):
+        logging.info("Stopped following %d flights, which stay unanalyzed", len(monitor.flights))
+    finally:
+        writer.close()
+        reader.close()
+        events.close()
+        reporter.report()
+# end def live()
+
+
+def sweep(flightIDs, grid, source=DEFAULT_SOURCE, output=None, metricsFile=None, metricsInterval=DEFAULT_METRICS_INTERVAL):
+    '''
+    Analyzes the flights once, in this process, judging every final approach under all the
+        threshold sets of the grid, and prints how many approaches were unstable under each.
+        Nothing is written to the data source.
+    @param: flightIDs list of the flights to analyze, all the flights not analyzed yet if empty
+    @param: grid the ThresholdGrid to sweep
+    @param: output CSV file to also write the summary to, if any
+    '''
+    if len(flightIDs) == 0:
+        flightIDs = globalSource.fetchFlightIDs()
+    logging.info('Sweeping %d threshold sets over %d flights', len(grid), len(flightIDs))
+
+    loadAirportData()
+
+    reporter = MetricsReporter(metricsFile, metricsInterval)
+    analyzer = SweepAnalyzer(globalSource, airports, grid, airportIndex=airportIndex, metrics=reporter.metrics)
+    profiles = ThresholdProfiles.load(globalSource, DEFAULT_THRESHOLDS)
+
+    inbox = Queue.Queue()
+    for lo in xrange(0, len(flightIDs), SWEEP_BATCH):
+        inbox.put(flightIDs[lo:lo + SWEEP_BATCH])
+    inbox.put(None)
+
+    for task in fetchTasks(inbox, source, reporter.metrics):
+        if task is None:  # End of a batch
+            reporter.reportIfDue()
+            continue
+        try:
+            task.analyze(analyzer, profiles)
+        except Exception:
+            logger.exception("Analysis failed for Flight ID [%s]", task.flightID)
+            reporter.metrics.count('flights_failed')
+    # end for
+    reporter.report()
+
+    print analyzer.summary.format()
+    if output is not None:
+        analyzer.summary.write(output)
+# end def sweep()
+
+
 def loadAirportData():
     """
-    Populate a dictionary containing airport data for all airports throughout the U.S.
+    Load the airport data for all airports throughout the U.S. from the compiled airport
+        database, which is rebuilt from the CSVs first if they changed, along with the
+        spatial index used for nearest airport lookups.
+    The database is memory-mapped, so the Consumers forked afterwards share its pages.
     @author: Wyatt Hedrick
     """
-    with open('data/Airports.csv', 'r') as infile:
-        infile.readline()  # Trash line of data headers
-        for line in infile:
-            row = line.split(',')
-            #             code,   name,   city,  state,      latitude,     longitude,      altitude
-            a = Airport(row[0], row[1], row[2], row[3], float(row[4]), float(row[5]), float(row[6]))
-            airports[row[0]] = a  # Insert into airports dict with airportCode as key
-
-    with open('data/AirportsDetailed.csv', 'r') as infile:
-        infile.readline()  # Trash line of data headers
-        for line in infile:
-            row = line.split(',')
-            #     airportCode,      altitude, runwayCode,      magHdg,        trueHdg,      centerLat,      centerLon
-            r = Runway(row[2], float(row[6]), row[10], float(row[11]), float(row[12]), float(row[25]), float(row[26]))
-            airports[row[2]].addRunway(r)  # Add runway to corresponding airport
+    global airports, airportIndex
+
+    airports = AirportDatabase.load()
+    airportIndex = airports.index
 # end def loadAirportData()
 
 
@@ -191,6 +465,45 @@ def isFlightDataValid(data):
 # end def isFlightDataValid()
 
 
+def raiseSystemExit(signum, frame):
+    raise SystemExit("Received signal %d" % signum)
+# end def raiseSystemExit()
+
+
+def memoryFootprint():
+    '''
+    Measures this process's memory footprint, in kB, from /proc/self/smaps_rollup (or
+        /proc/self/smaps on kernels without it). PSS charges every shared page to the
+        processes sharing it in equal parts, so summing it over the Consumers gives
+        their real combined footprint, and private is what a process holds on its own.
+    Where /proc is unavailable, only the peak RSS is reported.
+    @return: dict with 'rss', 'pss', 'shared' and 'private' (or only 'maxrss')
+    '''
+    fields = {
+        'Rss': 'rss', 'Pss': 'pss',
+        'Shared_Clean': 'shared', 'Shared_Dirty': 'shared',
+        'Private_Clean': 'private', 'Private_Dirty': 'private',
+    }
+    for path in ('/proc/self/smaps_rollup', '/proc/self/smaps'):
+        try:
+            with open(path, 'r') as infile:
+                footprint = {'rss': 0, 'pss': 0, 'shared': 0, 'private': 0}
+                for line in infile:
+                    field, _, value = line.partition(':')
+                    if field in fields:
+                        footprint[fields[field]] += int(value.split()[0])
+            return footprint
+        except IOError:
+            continue
+    return {'maxrss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+# end def memoryFootprint()
+
+
+def formatFootprint(footprint):
+    return ', '.join("%s %d kB" % (key.upper(), footprint[key]) for key in sorted(footprint))
+# end def formatFootprint()
+
+
 @contextlib.contextmanager
 def stopwatch(msg):
     """ Context manager to print how long a block of code ran. """
@@ -206,7 +519,6 @@ def stopwatch(msg):
 '''
 This checks to see if the program is being run directly via command-line. If it is, then it calls
     the main function passing in the command-line arguments
-    # TODO Implement a command-line flag to have the program profile this program's run-time stats
 '''
 if __name__ == "__main__":
     # Parse command-line args
@@ -214,16 +526,45 @@ if __name__ == "__main__":
     parser.add_argument('flight_ids', metavar='flight_id', type=str, nargs='*', help='a flight_id to be analyzed')
     parser.add_argument('-m', '--multi-process', action='store_true', help='run program with multiple processes')
     parser.add_argument('--no-write', action='store_true', help='program will not write results to DB')
+    parser.add_argument('-c', '--chunk-rows', type=int, default=DEFAULT_CHUNK_ROWS, help='rows of flight data to hand a worker at a time (default: %d)' % DEFAULT_CHUNK_ROWS)
+    parser.add_argument('-p', '--prefetch', type=int, default=DEFAULT_PREFETCH, help='flights each worker fetches ahead of its analysis, 0 to fetch in line (default: %d)' % DEFAULT_PREFETCH)
+    parser.add_argument('--flush-flights', type=int, default=DEFAULT_FLUSH_FLIGHTS, help='flights whose results are written per transaction (default: %d)' % DEFAULT_FLUSH_FLIGHTS)
+    parser.add_argument('--flush-seconds', type=float, default=DEFAULT_FLUSH_SECONDS, help='longest time results wait to be written (default: %g)' % DEFAULT_FLUSH_SECONDS)
+    parser.add_argument('-s', '--source', default=DEFAULT_SOURCE, help="data source: mysql:<environment> or sqlite:<path> (default: %s)" % DEFAULT_SOURCE)
+    parser.add_argument('--profile', metavar='DIR', nargs='?', const='profile', help='profile the workers, writing their merged stats and collapsed stacks for flame graphs to DIR (default: profile)')
+    parser.add_argument('--metrics', metavar='FILE', help='write the per-stage timings and throughput to FILE in the Prometheus text format')
+    parser.add_argument('--metrics-interval', type=float, default=DEFAULT_METRICS_INTERVAL, help='seconds between two summaries of the metrics (default: %g)' % DEFAULT_METRICS_INTERVAL)
+    parser.add_argument('--events', metavar='FILE', help='append the approaches, landings and results found to FILE as JSON lines')
+    parser.add_argument('--events-level', choices=sorted(EVENT_LEVELS.keys()), default='info', help='debug adds an event for every unstable sample (default: info)')
+    parser.add_argument('--live', action='store_true', help='keep following the flights still being ingested, analyzing their new rows every poll (always the streaming engine, in one process)')
+    parser.add_argument('--poll-seconds', type=float, default=DEFAULT_POLL_SECONDS, help='with --live, seconds between two polls for new rows (default: %g)' % DEFAULT_POLL_SECONDS)
+    parser.add_argument('--idle-seconds', type=float, default=DEFAULT_IDLE_SECONDS, help='with --live, seconds without new rows after which a flight is over (default: %g)' % DEFAULT_IDLE_SECONDS)
+    parser.add_argument('--sweep', metavar='FIELD=VALUES', action='append', help='instead of writing results, count the unstable approaches under every combination of the comma separated values of the thresholds, e.g. --sweep maxHeadingError=5,10,15 (repeatable; fields: %s)' % ', '.join(field for field, _, _, _ in SWEEP_FIELDS))
+    parser.add_argument('--sweep-output', metavar='FILE', help='with --sweep, also write the summary to FILE as CSV')
+    parser.add_argument('-e', '--engine', choices=sorted(ENGINES.keys()), default='loop', help='approach detection engine to use (default: loop)')
     args = parser.parse_args()
+    if args.sweep:
+        try:
+            grid = ThresholdGrid.parse(args.sweep)
+        except ValueError, e:
+            parser.error(str(e))
 
     try:
-        globalConn = mysql.connect(**db_creds)
-        globalCursor = globalConn.cursor(mysql.cursors.DictCursor)
-
-        with stopwatch("Program Execution"):
-            main(args.flight_ids, args.multi_process, args.no_write)
-    except mysql.Error, e:
-        print "MySQL Error [%d]: %s\n" % (e.args[0], e.args[1])
+        globalSource = openDataSource(args.source)
+
+        if args.sweep:
+            with stopwatch("Threshold Sweep"):
+                sweep(args.flight_ids, grid, args.source, args.sweep_output, args.metrics, args.metrics_interval)
+        elif args.live:
+            live(args.flight_ids, args.no_write, args.source, args.poll_seconds, args.idle_seconds, args.metrics, args.metrics_interval,
+                 args.events, EVENT_LEVELS[args.events_level])
+        else:
+            with stopwatch("Program Execution"):
+                main(args.flight_ids, args.multi_process, args.no_write, args.engine, args.chunk_rows, args.prefetch,
+                     args.flush_flights, args.flush_seconds, args.source, args.profile, args.metrics, args.metrics_interval,
+                     args.events, EVENT_LEVELS[args.events_level])
+    except DataSourceError, e:
+        print "%s\n" % e
     finally:
-        if globalConn is not None:
-            globalConn.close()
+        if globalSource is not None:
+            globalSource.close()
@@ -0,0 +1,83 @@
+import contextlib
+import os
+import shutil
+import tempfile
+from AirportDatabase import AirportDatabase
+from FlightGenerator import FlightGenerator
+
+
+SYNTHETIC_AIRCRAFT_TYPE = 1
+
+database = None  # The AirportDatabase, loaded by the first test that needs it
+
+
+def airportDatabase():
+    '''
+    @return: the AirportDatabase, compiled from the CSVs first if they changed
+    '''
+    global database
+    if database is None:
+        database = AirportDatabase.load()
+    return database
+# end def airportDatabase()
+
+
+def generatedFlights(count=4, circuits=4, seed=0, sampleRate=1.0, cruiseMinutes=0.0):
+    '''
+    @return: list of (flightID, Runway flown at, FlightColumns) of count synthetic flights, the same for the same arguments
+    '''
+    generator = FlightGenerator.forDatabase(airportDatabase(), seed=seed, sampleRate=sampleRate)
+    return [
+        (flightID,) + generator.flight(circuits=circuits, cruiseMinutes=cruiseMinutes)
+        for flightID in xrange(1, count + 1)
+    ]
+# end def generatedFlights()
+
+
+@contextlib.contextmanager
+def temporaryDatabase():
+    '''
+    @return: context of the spec of a new SQLite file for openDataSource(), which is removed afterwards
+    '''
+    directory = tempfile.mkdtemp()
+    try:
+        yield 'sqlite:' + os.path.join(directory, 'flights.db')
+    finally:
+        shutil.rmtree(directory)
+# end def temporaryDatabase()
+
+
+class CollectingWriter(object):
+    '''
+    Stands in for the ResultWriter, keeping the rows every flight would have written to the DB.
+    '''
+
+    def __init__(self):
+        self.approachRows = []
+    # end def __init__()
+
+    def add(self, flightID, approachRows):
+        self.approachRows.extend(approachRows)
+    # end def add()
+
+    def close(self):
+        return True
+    # end def close()
+
+# end class CollectingWriter
+
+
+def analyzeAll(engine, flights, **kwargs):
+    '''
+    Analyzes the flights with a new analyzer of the given class, without any data source.
+    @param: engine the FlightAnalyzer class, e.g. main.ENGINES[name]
+    @param: flights what generatedFlights() returned
+    @return: the rows the analyzer would have written to the approaches table
+    '''
+    database = airportDatabase()
+    writer = CollectingWriter()
+    analyzer = engine(None, database, airportIndex=database.index, writer=writer, **kwargs)
+    for flightID, _, columns in flights:
+        analyzer.analyze(flightID, SYNTHETIC_AIRCRAFT_TYPE, analyzer.loadFlightData(columns))
+    return writer.approachRows
+# end def analyzeAll()
@@ -0,0 +1,137 @@
+import unittest
+import numpy as np
+from AirportIndex import KDTree
+import LatLonArray
+from LatLon import LatLon
+from tests.support import airportDatabase, generatedFlights
+
+
+def linearNearest(points, query, metric):
+    '''
+    @return: (distance, index) of the point closest to query, replacing the best one only on a strictly smaller distance
+    '''
+    best = [float('inf'), -1]
+    for idx in xrange(len(points[0])):
+        differences = [coordinate[idx] - q for coordinate, q in zip(points, query)]
+        if metric == 'l1':
+            distance = sum(abs(d) for d in differences)
+        else:
+            distance = sum(d * d for d in differences)
+        if distance < best[0]:
+            best = [distance, idx]
+    # end for
+    return best[0], best[1]
+# end def linearNearest()
+
+
+class KDTreeTest(unittest.TestCase):
+
+    def setUp(self):
+        random = np.random.RandomState(7)
+        # Points on a coarse grid, repeated, so that many queries are equally distant from several of them
+        grid = random.randint(0, 12, size=(2, 300)).astype(np.float64)
+        self.points = np.concatenate((grid, grid[:, :40], random.uniform(0, 12, size=(2, 100))), axis=1)
+        self.queries = np.concatenate((random.randint(-2, 14, size=(2, 200)), random.uniform(-2, 14, size=(2, 200))), axis=1)
+    # end def setUp()
+
+    def testNearestMatchesLinearScan(self):
+        for metric in ('l1', 'euclidean'):
+            tree = KDTree.build(self.points, metric)
+            for query in self.queries.T.tolist():
+                self.assertEqual(tree.nearest(query), linearNearest(self.points, query, metric), (metric, query))
+        # end for
+    # end def testNearestMatchesLinearScan()
+
+    def testTiesResolveToLowestIndex(self):
+        points = np.array([[1.0, 0.0, -1.0, 0.0] * 40, [0.0, 1.0, 0.0, -1.0] * 40])
+        tree = KDTree.build(points, 'l1')
+        self.assertEqual(tree.nearest((0.0, 0.0)), (1.0, 0))
+        self.assertEqual(tree.nearest((0.0, -0.5)), (0.5, 3))
+    # end def testTiesResolveToLowestIndex()
+
+    def testWithinBox(self):
+        tree = KDTree.build(self.points, 'l1')
+        lower, upper = (2.5, 3.0), (7.0, 9.5)
+        inside = np.flatnonzero((self.points[0] >= lower[0]) & (self.points[0] <= upper[0]) &
+                                (self.points[1] >= lower[1]) & (self.points[1] <= upper[1]))
+        self.assertEqual(sorted(tree.withinBox(lower, upper).tolist()), inside.tolist())
+    # end def testWithinBox()
+
+    def testEmpty(self):
+        self.assertEqual(KDTree.build([[], []]).nearest((0.0, 0.0)), (float('inf'), -1))
+    # end def testEmpty()
+
+# end class KDTreeTest
+
+
+class AirportIndexTest(unittest.TestCase):
+
+    def testAroundMatchesFullIndex(self):
+        index = airportDatabase().index
+        for _, _, columns in generatedFlights(count=3, circuits=2, seed=5, cruiseMinutes=20.0):
+            around = index.around(columns.latitude, columns.longitude)
+            self.assertLess(len(around), len(index))
+            for lat, lon in zip(columns.latitude[::10].tolist(), columns.longitude[::10].tolist()):
+                point = LatLon(lat, lon)
+                self.assertEqual(around.nearestPosition(point), index.nearestPosition(point), (lat, lon))
+            # end for
+            positions = index.nearestMany(columns.latitude, columns.longitude)
+            self.assertEqual(around.nearestMany(columns.latitude, columns.longitude).tolist(), positions.tolist())
+            self.assertEqual(
+                positions.tolist(),
+                [index.nearestPosition(LatLon(lat, lon)) for lat, lon in zip(columns.latitude.tolist(), columns.longitude.tolist())]
+            )
+        # end for
+    # end def testAroundMatchesFullIndex()
+
+    def testAroundKeepsWholeIndexWhenMostAirportsAreKept(self):
+        index = airportDatabase().index
+        self.assertIs(index.around(np.array([20.0, 60.0]), np.array([-160.0, -70.0])), index)
+        self.assertIs(index.around(np.array([]), np.array([])), index)
+    # end def testAroundKeepsWholeIndexWhenMostAirportsAreKept()
+
+    def testDistanceToNearest(self):
+        database = airportDatabase()
+        index = database.index
+        for lat, lon in [(47.95, -97.18), (40.0, -100.0), (64.8, -147.9), (25.0, -80.5)]:
+            point = LatLon(lat, lon)
+            closest = min(point.distanceTo(airport.centerLatLon, 1) for airport in index.airports)
+            self.assertAlmostEqual(index.distanceToNearest(point), closest, places=9)
+            self.assertAlmostEqual(point.distanceTo(index.nearest(point, greatCircle=True).centerLatLon, 1), closest, places=9)
+        # end for
+
+        # The engines skip the same samples only if the vectorized form gives the very same distances
+        for _, _, columns in generatedFlights(count=2, circuits=2, seed=5, cruiseMinutes=20.0):
+            vectors = LatLonArray.toVectors(columns.latitude, columns.longitude)
+            self.assertEqual(
+                index.distancesToNearest(vectors).tolist(),
+                [index.distanceToNearest(LatLon(lat, lon)) for lat, lon in zip(columns.latitude.tolist(), columns.longitude.tolist())]
+            )
+        # end for
+    # end def testDistanceToNearest()
+
+    def testCeilingGrid(self):
+        index = airportDatabase().index
+        reach = 5.0 / 3959
+        grid = index.ceilingGrid(reach)
+        self.assertIs(index.ceilingGrid(reach), grid)
+        random = np.random.RandomState(3)
+        # Points near airports, where the cells are kept, and anywhere, where most are not
+        near = random.randint(0, len(index), 300)
+        lats = np.concatenate((index.lats[near] + random.uniform(-0.2, 0.2, 300), random.uniform(-80, 80, 300)))
+        lons = np.concatenate((index.lons[near] + random.uniform(-0.2, 0.2, 300), random.uniform(-180, 180, 300)))
+
+        highest = grid.highestMany(lats, lons)
+        self.assertEqual(highest.tolist(), [grid.highestAt(lat, lon) for lat, lon in zip(lats.tolist(), lons.tolist())])
+        self.assertTrue(np.isinf(highest).any() and np.isfinite(highest).any())
+        for lat, lon, ceiling in zip(lats.tolist(), lons.tolist(), highest.tolist()):
+            within = LatLonArray.distanceTo(index.lats, index.lons, lat, lon, 1) <= reach
+            self.assertLessEqual(index.alts[within].max() if within.any() else -np.inf, ceiling, (lat, lon))
+        # end for
+    # end def testCeilingGrid()
+
+# end class AirportIndexTest
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+import numpy as np
+import LatLonArray
+from FlightAnalysis import FlightAnalyzer, DEFAULT_THRESHOLDS, EARTH_RADIUS_MILES
+from FlightColumns import FlightColumns
+from StreamingAnalysis import StreamingFlightAnalyzer
+from VectorizedAnalysis import VectorizedFlightAnalyzer
+from tests.support import airportDatabase, generatedFlights, analyzeAll
+
+
+class EnginesTest(unittest.TestCase):
+    '''
+    The vectorized and streaming engines must write the same rows as the loop engine.
+    '''
+
+    def assertSameRows(self, flights, **kwargs):
+        expected = analyzeAll(FlightAnalyzer, flights, **kwargs)
+        self.assertGreater(len(expected), 0)
+        for engine in (VectorizedFlightAnalyzer, StreamingFlightAnalyzer):
+            rows = analyzeAll(engine, flights, **kwargs)
+            self.assertEqual(len(rows), len(expected), engine.__name__)
+            for row, expectedRow in zip(rows, expected):
+                self.assertEqual(row, expectedRow, engine.__name__)
+        # end for
+        return expected
+    # end def assertSameRows()
+
+    def testPatternWork(self):
+        self.assertSameRows(generatedFlights(count=6, circuits=5, seed=1))
+    # end def testPatternWork()
+
+    def testCruiseBetweenCircuits(self):
+        self.assertSameRows(generatedFlights(count=3, circuits=3, seed=2, sampleRate=4.0, cruiseMinutes=30.0))
+    # end def testCruiseBetweenCircuits()
+
+    def testApproachDetectedOnFirstSample(self):
+        # A flight joined on final, 500 to 800 ft above the airport, under thresholds that
+        # detect an approach up to 1000 ft and 3 miles out: it starts at the first sample
+        flightID, runway, columns = generatedFlights(count=1, circuits=2, seed=4)[0]
+        airport = airportDatabase()[runway.airportCode]
+        hAGL = columns.msl_altitude - airport.alt
+        distance = LatLonArray.distanceTo(
+            columns.latitude, columns.longitude, airport.centerLatLon.lat, airport.centerLatLon.lon, EARTH_RADIUS_MILES
+        )
+        first = int(np.flatnonzero((hAGL >= 500) & (hAGL <= 800) & (columns.vertical_airspeed < 0) & (distance < 2))[0])
+        joined = [(flightID, runway, FlightColumns(**dict((name, getattr(columns, name)[first:]) for name in FlightColumns.COLUMNS)))]
+
+        inGate = DEFAULT_THRESHOLDS._replace(minDistance=3, minAltitudeAGL=1000, finalMaxAltitudeAGL=900)
+        rows = self.assertSameRows(joined, thresholds=inGate)
+        self.assertEqual(rows[0][4], 0)
+        self.assertGreater(rows[0][5], 0)
+
+        # Below the final approach gate the landing starts at the first sample too
+        belowGate = inGate._replace(finalMinAltitudeAGL=850)
+        rows = self.assertSameRows(joined, thresholds=belowGate)
+        self.assertEqual((rows[0][4], rows[0][5], rows[0][6]), (0, 0, 0))
+    # end def testApproachDetectedOnFirstSample()
+
+# end class EnginesTest
+
+
+if __name__ == '__main__':
+    unittest.main()
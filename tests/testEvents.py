@@ -0,0 +1,95 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from DataSource import insertKeysList
+from Events import openEventSink, EventSink, JSONLEventSink, DEBUG, INFO
+from FlightAnalysis import FlightAnalyzer
+from tests.support import generatedFlights, analyzeAll
+
+
+# Event type -> the fields of its lines besides event and pid
+FIELDS = {
+    'approach_detected': set(['flight', 'approach', 'index', 'airport', 'city', 'state']),
+    'runway_selected': set(['flight', 'approach', 'runway']),
+    'unstable_sample': set([
+        'flight', 'approach', 'index', 'F1', 'F2', 'A', 'S', 'runway_heading', 'heading', 'heading_error', 'crosstrack', 'ias', 'vsi'
+    ]),
+    'landing_classified': set(['flight', 'approach', 'landing_type', 'start', 'end']),
+    'approach_result': set(['flight', 'approach'] + insertKeysList[2:]),
+}
+
+
+class EventsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'events.jsonl')
+    # end def setUp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+    # end def tearDown()
+
+    def readEvents(self):
+        '''
+        @return: list of the dicts of the lines of the events file, checking every line is a JSON object
+        '''
+        events = []
+        with open(self.path) as lines:
+            for line in lines:
+                self.assertTrue(line.endswith('\n'))
+                event = json.loads(line)
+                self.assertIsInstance(event, dict)
+                events.append(event)
+        # end with
+        return events
+    # end def readEvents()
+
+    def testAnalysisEvents(self):
+        events = openEventSink(self.path, DEBUG)
+        events.bufferEvents = 7  # Flushed mid-flight too
+        rows = analyzeAll(FlightAnalyzer, generatedFlights(count=2, circuits=3, seed=8), events=events)
+        events.close()
+
+        lines = self.readEvents()
+        for event in lines:
+            self.assertEqual(set(event.keys()) - set(['event', 'pid']), FIELDS[event['event']], event)
+            self.assertEqual(event['pid'], os.getpid())
+        # end for
+        kinds = set(event['event'] for event in lines)
+        self.assertEqual(kinds, set(FIELDS.keys()))
+
+        # One result per row written, with the row's values under the columns' names
+        results = [event for event in lines if event['event'] == 'approach_result']
+        self.assertEqual(
+            [tuple([result['flight'], result['approach']] + [result[key] for key in insertKeysList[2:]]) for result in results],
+            [tuple(row) for row in rows]
+        )
+        for kind in ('approach_detected', 'runway_selected', 'landing_classified'):
+            self.assertEqual(len([event for event in lines if event['event'] == kind]), len(rows), kind)
+    # end def testAnalysisEvents()
+
+    def testLevelsAndAppending(self):
+        self.assertFalse(EventSink().info)
+        self.assertIsInstance(openEventSink(), EventSink)
+
+        events = JSONLEventSink(self.path, INFO)
+        self.assertTrue(events.info)
+        self.assertFalse(events.debug)
+        events.emit('approach_detected', flight=1, approach=1, index=5, airport='GFK', city=u'Grand Forks', state='ND')
+        events.close()
+
+        # A second sink appends to the file
+        events = JSONLEventSink(self.path, INFO)
+        events.emit('runway_selected', flight=1, approach=1, runway=None)
+        events.close()
+        self.assertEqual([(event['event'], event['flight']) for event in self.readEvents()], [('approach_detected', 1), ('runway_selected', 1)])
+    # end def testLevelsAndAppending()
+
+# end class EventsTest
+
+
+if __name__ == '__main__':
+    unittest.main()
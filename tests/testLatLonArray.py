@@ -0,0 +1,86 @@
+import unittest
+import numpy as np
+from numpy.testing import assert_allclose
+import LatLonArray
+from LatLon import LatLon
+
+
+class LatLonArrayTest(unittest.TestCase):
+
+    def setUp(self):
+        random = np.random.RandomState(11)
+        n = 200
+        self.lat1 = random.uniform(-89, 89, n)
+        self.lon1 = random.uniform(-180, 180, n)
+        self.lat2 = random.uniform(-89, 89, n)
+        self.lon2 = random.uniform(-180, 180, n)
+        self.bearings = random.uniform(0, 360, n)
+        self.distances = random.uniform(0, 5000000, n)
+        self.points1 = [LatLon(lat, lon) for lat, lon in zip(self.lat1.tolist(), self.lon1.tolist())]
+        self.points2 = [LatLon(lat, lon) for lat, lon in zip(self.lat2.tolist(), self.lon2.tolist())]
+    # end def setUp()
+
+    def testToVectors(self):
+        vectors = [p.toVector() for p in self.points1]
+        assert_allclose(
+            LatLonArray.toVectors(self.lat1, self.lon1),
+            [[v.x for v in vectors], [v.y for v in vectors], [v.z for v in vectors]], rtol=0, atol=1e-15
+        )
+        lats, lons = LatLonArray.toLatLons(LatLonArray.toVectors(self.lat1, self.lon1))
+        assert_allclose(lats, self.lat1, rtol=0, atol=1e-12)
+        assert_allclose(lons, self.lon1, rtol=0, atol=1e-12)
+    # end def testToVectors()
+
+    def testDistanceTo(self):
+        assert_allclose(
+            LatLonArray.distanceTo(self.lat1, self.lon1, self.lat2, self.lon2),
+            [p1.distanceTo(p2) for p1, p2 in zip(self.points1, self.points2)], rtol=1e-12, atol=1e-6
+        )
+        assert_allclose(
+            LatLonArray.distanceTo(self.lat1, self.lon1, self.lat2, self.lon2, 3959),
+            [p1.distanceTo(p2, 3959) for p1, p2 in zip(self.points1, self.points2)], rtol=1e-12, atol=1e-9
+        )
+    # end def testDistanceTo()
+
+    def testBearingTo(self):
+        assert_allclose(
+            LatLonArray.bearingTo(self.lat1, self.lon1, self.lat2, self.lon2),
+            [p1.bearingTo(p2) for p1, p2 in zip(self.points1, self.points2)], rtol=0, atol=1e-9
+        )
+    # end def testBearingTo()
+
+    def testDestinationPoint(self):
+        lats, lons = LatLonArray.destinationPoint(self.lat1, self.lon1, self.distances, self.bearings)
+        expected = [p.destinationPoint(d, b) for p, d, b in zip(self.points1, self.distances.tolist(), self.bearings.tolist())]
+        assert_allclose(lats, [p.lat for p in expected], rtol=0, atol=1e-9)
+        assert_allclose(lons, [p.lon for p in expected], rtol=0, atol=1e-9)
+    # end def testDestinationPoint()
+
+    def testCrossTrackDistanceTo(self):
+        start = self.points2[0]
+        expected = [p.crossTrackDistanceTo(start, self.bearings[0]) for p in self.points1]
+        assert_allclose(
+            LatLonArray.crossTrackDistanceTo(self.lat1, self.lon1, start.lat, start.lon, self.bearings[0]),
+            expected, rtol=1e-12, atol=1e-6
+        )
+
+        gc = start.greatCircle(self.bearings[0])
+        assert_allclose(LatLonArray.greatCircles(start.lat, start.lon, self.bearings[0]), [gc.x, gc.y, gc.z], rtol=0, atol=1e-15)
+        assert_allclose(
+            LatLonArray.crossTrackToGreatCircle(LatLonArray.toVectors(self.lat1, self.lon1), np.array([gc.x, gc.y, gc.z]), 20902231),
+            [p.crossTrackDistanceTo(start, self.bearings[0], 20902231) for p in self.points1], rtol=1e-12, atol=1e-6
+        )
+
+        # A path per point
+        assert_allclose(
+            LatLonArray.crossTrackDistanceTo(self.lat1, self.lon1, self.lat2, self.lon2, self.bearings),
+            [p1.crossTrackDistanceTo(p2, b) for p1, p2, b in zip(self.points1, self.points2, self.bearings.tolist())],
+            rtol=1e-12, atol=1e-6
+        )
+    # end def testCrossTrackDistanceTo()
+
+# end class LatLonArrayTest
+
+
+if __name__ == '__main__':
+    unittest.main()
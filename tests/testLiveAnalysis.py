@@ -0,0 +1,112 @@
+import unittest
+from DataSource import openDataSource
+from Events import EventSink, INFO
+from LiveAnalysis import LiveMonitor
+from ResultWriter import ResultWriter
+from StreamingAnalysis import StreamingFlightAnalyzer
+from tests.support import airportDatabase, generatedFlights, analyzeAll, temporaryDatabase, SYNTHETIC_AIRCRAFT_TYPE
+
+
+class CollectingEventSink(EventSink):
+    '''
+    Keeps the events emitted, as (event, fields) tuples.
+    '''
+
+    def __init__(self):
+        EventSink.__init__(self, INFO)
+        self.events = []
+    # end def __init__()
+
+    def emit(self, event, **fields):
+        self.events.append((event, fields))
+    # end def emit()
+
+# end class CollectingEventSink
+
+
+def mainRows(flightID, columns):
+    '''
+    @return: the rows of the main table of a generated flight, ordered like DataSource.FLIGHT_DATA_COLUMNS
+    '''
+    return zip(
+        [flightID] * len(columns.time), columns.time.tolist(), columns.msl_altitude.tolist(), columns.indicated_airspeed.tolist(),
+        columns.vertical_airspeed.tolist(), columns.heading.tolist(), columns.latitude.tolist(), columns.longitude.tolist(),
+        [0.0] * len(columns.time), [2400.0] * len(columns.time)
+    )
+# end def mainRows()
+
+
+class LiveMonitorTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.flights = generatedFlights(count=2, circuits=3, seed=6)
+        cls.expected = analyzeAll(StreamingFlightAnalyzer, cls.flights)
+    # end def setUpClass()
+
+    def follow(self, batches):
+        '''
+        Appends every batch of rows to main in a transaction of its own, polling after each, and
+            checks the approaches written and reported once the flights are over.
+        @param: batches list of lists of rows for the main table
+        '''
+        with temporaryDatabase() as spec:
+            target = openDataSource(spec)
+            reader = openDataSource(spec)
+            cursor = target.cursor()
+            for flightID, _, _ in self.flights:
+                target.insertFlight(cursor, flightID, SYNTHETIC_AIRCRAFT_TYPE, [])
+            target.connection.commit()
+
+            database = airportDatabase()
+            events = CollectingEventSink()
+            analyzer = StreamingFlightAnalyzer(target, database, airportIndex=database.index, writer=ResultWriter(target), events=events)
+            monitor = LiveMonitor(reader, analyzer, pollSeconds=0, idleSeconds=3600, flightIDs=[flightID for flightID, _, _ in self.flights])
+            for rows in batches:
+                target.appendRows(cursor, rows)
+                target.connection.commit()
+                monitor.poll()
+            # end for
+            self.assertEqual(reader.fetchFlightIDs(), [flightID for flightID, _, _ in self.flights])
+
+            # No new rows from now on: the flights are over
+            monitor.idleSeconds = 0
+            monitor.poll()
+            self.assertEqual(monitor.flightIDs, [])
+            self.assertEqual(reader.fetchFlightIDs(), [])
+
+            written = reader.execute(reader.cursor(), "SELECT * FROM approaches ORDER BY flight_id, approach_id;").fetchall()
+            self.assertEqual(written, self.expected)
+            results = [(fields['flight'], fields['approach']) for event, fields in events.events if event == 'approach_result']
+            self.assertEqual(sorted(results), [(row[0], row[1]) for row in self.expected])
+            reader.close()
+            target.close()
+    # end def follow()
+
+    def testBatches(self):
+        # Every flight's rows arrive in several batches, interleaved between the flights
+        rows = [mainRows(flightID, columns) for flightID, _, columns in self.flights]
+        batches = []
+        for lo in xrange(0, max(len(r) for r in rows), 700):
+            batches.extend(r[lo:lo + 700] for r in rows)
+        self.follow(batches)
+    # end def testBatches()
+
+    def testLateRows(self):
+        # Some rows are committed after rows of a later time were already read
+        rows = [mainRows(flightID, columns) for flightID, _, columns in self.flights]
+        batches = []
+        for lo in xrange(0, max(len(r) for r in rows), 700):
+            batches.extend(r[lo:lo + 690] for r in rows)
+            batches.extend(r[lo + 690:lo + 700] for r in rows)
+        late = batches[2:4]
+        del batches[2:4]
+        batches[5:5] = late
+        self.follow(batches)
+    # end def testLateRows()
+
+# end class LiveMonitorTest
+
+
+if __name__ == '__main__':
+    unittest.main()
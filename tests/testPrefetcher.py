@@ -0,0 +1,87 @@
+import os
+import Queue
+import shutil
+import tempfile
+import threading
+import unittest
+import main
+from DataSource import openDataSource
+from FlightAnalysis import FlightAnalyzer
+from Metrics import StageMetrics
+from Profiler import Profiler
+from tests.support import temporaryDatabase
+
+
+class InterruptedAnalyzer(FlightAnalyzer):
+    '''
+    Stands in for an analyzer whose worker gets a SIGTERM, see main.raiseSystemExit().
+    '''
+
+    def analyze(self, flightID, aircraftType, flightData, skipAnalysis=False):
+        raise SystemExit()
+    # end def analyze()
+
+# end class InterruptedAnalyzer
+
+
+def prefetchers():
+    return [thread for thread in threading.enumerate() if thread.name == 'Prefetcher']
+# end def prefetchers()
+
+
+class PrefetcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.context = temporaryDatabase()
+        self.spec = self.context.__enter__()
+        source = openDataSource(self.spec)
+        cursor = source.cursor()
+        for flightID in xrange(1, 6):
+            rows = [(flightID, float(t), 1000.0, 90.0, 0.0, 350.0, 47.9, -97.2, 0.0, 2400.0) for t in xrange(20)]
+            source.insertFlight(cursor, flightID, 1, rows)
+        source.connection.commit()
+        source.close()
+        self.directory = tempfile.mkdtemp()
+    # end def setUp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        self.context.__exit__(None, None, None)
+    # end def tearDown()
+
+    def testStopWhileWaiting(self):
+        # For the next chunk
+        inbox = Queue.Queue()
+        tasks = main.Prefetcher(inbox, 2, self.spec, Profiler(None, 'worker'), StageMetrics())
+        tasks.start()
+        tasks.stop()
+        self.assertFalse(tasks.is_alive())
+
+        # For the Consumer to take the flights fetched
+        inbox.put([1, 2, 3, 4, 5])
+        tasks = main.Prefetcher(inbox, 1, self.spec, Profiler(None, 'worker'), StageMetrics())
+        tasks.start()
+        self.assertEqual(next(iter(tasks)).flightID, 1)
+        tasks.stop()
+        self.assertFalse(tasks.is_alive())
+    # end def testStopWhileWaiting()
+
+    def testInterruptedConsumerStopsItsPrefetcher(self):
+        main.ENGINES['interrupted'] = InterruptedAnalyzer
+        try:
+            inbox = Queue.Queue()
+            inbox.put([1, 2, 3])
+            consumer = main.Consumer(1, inbox, Queue.Queue(), True, engine='interrupted', source=self.spec, profileDir=self.directory)
+            # Runs in this process: the Prefetcher is still waiting for the next chunk when the analysis is interrupted
+            self.assertRaises(SystemExit, consumer.run)
+        finally:
+            del main.ENGINES['interrupted']
+        self.assertEqual(prefetchers(), [])
+        self.assertTrue(os.path.exists(os.path.join(self.directory, 'worker-1.prof')))
+    # end def testInterruptedConsumerStopsItsPrefetcher()
+
+# end class PrefetcherTest
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import unittest
+from DataSource import openDataSource
+from ResultWriter import ResultWriter
+from tests.support import temporaryDatabase
+
+
+def approachRows(flightID, count):
+    '''
+    @return: count rows for the approaches table of the flight, ordered like DataSource.insertKeysList
+    '''
+    return [
+        (flightID, approachID, 'GFK', '35L', 10, 20, 20, 30, 'stop-and-go', 0, 1.5, None, 20.0, None, 70.0, None, -500.0, None)
+        for approachID in xrange(1, count + 1)
+    ]
+# end def approachRows()
+
+
+class ResultWriterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.context = temporaryDatabase()
+        spec = self.context.__enter__()
+        self.source = openDataSource(spec)
+        self.reader = openDataSource(spec)  # Only sees what was committed
+        cursor = self.source.cursor()
+        for flightID in xrange(1, 6):
+            self.source.insertFlight(cursor, flightID, 1, [])
+        self.source.connection.commit()
+    # end def setUp()
+
+    def tearDown(self):
+        self.reader.close()
+        self.source.close()
+        self.context.__exit__(None, None, None)
+    # end def tearDown()
+
+    def written(self):
+        '''
+        @return: (sorted analyzed flight IDs, number of approaches of every flight) as committed
+        '''
+        analyzed = set(range(1, 6)) - set(self.reader.fetchFlightIDs())
+        counts = self.reader.execute(self.reader.cursor(), "SELECT flight_id, COUNT(*) FROM approaches GROUP BY flight_id;").fetchall()
+        return sorted(analyzed), dict(counts)
+    # end def written()
+
+    def testFlushesAtFlushFlights(self):
+        writer = ResultWriter(self.source, flushFlights=3, flushSeconds=3600)
+        writer.add(1, approachRows(1, 2))
+        writer.add(2, [])
+        self.assertEqual(self.written(), ([], {}))
+
+        writer.add(3, approachRows(3, 4))
+        self.assertEqual(self.written(), ([1, 2, 3], {1: 2, 3: 4}))
+        self.assertTrue(writer.empty())
+    # end def testFlushesAtFlushFlights()
+
+    def testFlushesAfterFlushSeconds(self):
+        writer = ResultWriter(self.source, flushFlights=3, flushSeconds=3600)
+        writer.add(1, approachRows(1, 1))
+        writer.oldest -= 3600
+        writer.addApproaches(approachRows(2, 1))
+        self.assertEqual(self.written(), ([1], {1: 1, 2: 1}))
+    # end def testFlushesAfterFlushSeconds()
+
+    def testCloseFlushesTheRest(self):
+        writer = ResultWriter(self.source, flushFlights=3, flushSeconds=3600)
+        for flightID in xrange(1, 5):
+            writer.add(flightID, approachRows(flightID, flightID))
+        writer.addApproaches(approachRows(5, 2))
+        self.assertEqual(self.written(), ([1, 2, 3], {1: 1, 2: 2, 3: 3}))
+
+        self.assertTrue(writer.close())
+        # Flight 5 is still being analyzed, so its approaches are written but it stays unanalyzed
+        self.assertEqual(self.written(), ([1, 2, 3, 4], {1: 1, 2: 2, 3: 3, 4: 4, 5: 2}))
+        self.assertTrue(writer.empty())
+    # end def testCloseFlushesTheRest()
+
+    def testFailedInsertRollsBack(self):
+        writer = ResultWriter(self.source, flushFlights=2, flushSeconds=3600)
+        writer.add(1, approachRows(1, 3))
+        writer.add(2, [])
+
+        # The first INSERT statement of the flush succeeds and the second one violates flight_id NOT NULL
+        rows = approachRows(3, self.source.insertBatch + 10)
+        rows[-1] = (None,) + rows[-1][1:]
+        writer.add(3, [])
+        writer.addApproaches(rows)
+        self.assertFalse(writer.close())
+        self.assertEqual(self.written(), ([1, 2], {1: 3}))
+        self.assertTrue(writer.empty())
+
+        # The connection is left usable, with nothing of the failed transaction pending
+        writer.add(4, approachRows(4, 1))
+        self.assertTrue(writer.close())
+        self.assertEqual(self.written(), ([1, 2, 4], {1: 3, 4: 1}))
+    # end def testFailedInsertRollsBack()
+
+# end class ResultWriterTest
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import unittest
+import numpy as np
+import LatLonArray
+from Airport import Airport
+from FlightAnalysis import (
+    FlightAnalyzer, EARTH_RADIUS_MILES, EARTH_RADIUS_FEET, RUNWAY_CORRIDOR_LENGTH, RUNWAY_CORRIDOR_MARGIN, RUNWAY_SELECTION_INDICATOR
+)
+from LatLon import LatLon
+from Runway import Runway
+from RunwayCorridors import RunwayCorridors
+from tests.support import airportDatabase
+
+
+def corridorsOf(airport):
+    return RunwayCorridors(airport, float(RUNWAY_CORRIDOR_LENGTH) / EARTH_RADIUS_MILES, float(RUNWAY_CORRIDOR_MARGIN) / EARTH_RADIUS_FEET)
+# end def corridorsOf()
+
+
+def closestCenter(airport, point, heading):
+    '''
+    @return: the runway detectRunway() falls back on outside the corridors, the one with the
+        closest center (by |dLat| + |dLon|) among those within RUNWAY_SELECTION_INDICATOR of the heading
+    '''
+    runways = [r for r in airport.runways if 180 - abs(abs(r.magHeading - heading) - 180) <= RUNWAY_SELECTION_INDICATOR]
+    return min(runways, key=lambda r: abs(r.centerLatLon.lat - point.lat) + abs(r.centerLatLon.lon - point.lon))
+# end def closestCenter()
+
+
+def finalApproach(runway, miles):
+    '''
+    @return: LatLons on the runway's extended center line, the given miles before its center
+    '''
+    return [runway.centerLatLon.destinationPoint(float(d), runway.trueHeading + 180, EARTH_RADIUS_MILES) for d in miles]
+# end def finalApproach()
+
+
+def toVectors(points):
+    return LatLonArray.toVectors(np.array([p.lat for p in points]), np.array([p.lon for p in points]))
+# end def toVectors()
+
+
+def runway(code, heading, lat, lon, length, halfWidth):
+    '''
+    @return: a Runway of the test airport from lat (its threshold and center) to length degrees north, halfWidth degrees wide either side
+    '''
+    corners = [LatLon(lat + length, lon - halfWidth), LatLon(lat + length, lon + halfWidth), LatLon(lat, lon + halfWidth), LatLon(lat, lon - halfWidth)]
+    return Runway('TST', 800.0, code, heading, heading, lat, lon, corners=corners)
+# end def runway()
+
+
+class RunwayCorridorsTest(unittest.TestCase):
+
+    def testParallelRunwaysAtGFK(self):
+        airport = airportDatabase()['GFK']
+        corridors = corridorsOf(airport)
+        for code in ('35L', '35R', '17L', '17R'):
+            flown = [r for r in airport.runways if r.runwayCode == code][0]
+            points = finalApproach(flown, np.linspace(0.1, 1.2, 12))
+            headings = [flown.magHeading] * len(points)
+            assigned = corridors.assign(toVectors(points), headings, RUNWAY_SELECTION_INDICATOR)
+            self.assertEqual(assigned.tolist(), [airport.runways.index(flown)] * len(points), code)
+            # Off every runway's heading, or on the other side of the earth, no corridor matches
+            self.assertEqual(corridors.assign(toVectors(points), [flown.magHeading + 45] * len(points), RUNWAY_SELECTION_INDICATOR).tolist(), [-1] * len(points))
+            self.assertEqual(corridors.assign(-toVectors(points), headings, RUNWAY_SELECTION_INDICATOR).tolist(), [-1] * len(points))
+
+            analyzer = FlightAnalyzer(None, airportDatabase(), airportIndex=airportDatabase().index)
+            for point in points:
+                self.assertIs(corridors.runwayAt(point, flown.magHeading, RUNWAY_SELECTION_INDICATOR), flown)
+                self.assertIs(analyzer.detectRunway(point, flown.magHeading, airport), flown)
+        # end for
+    # end def testParallelRunwaysAtGFK()
+
+    def testStaggeredParallelRunways(self):
+        # 36L starts where 36R ends, 700 ft left of it: short of 36L, the closest runway center is 36R's
+        airport = Airport('TST', 'Test', 'Test', 'TT', 47.0, -97.0, 800.0)
+        north = runway('36L', 360.0, 47.0, -97.0, 0.02, 0.0005)
+        south = runway('36R', 360.0, 46.98, -96.997, 0.02, 0.0005)
+        airport.addRunway(north)
+        airport.addRunway(south)
+
+        points = finalApproach(north, np.linspace(0.8, 1.4, 7))
+        self.assertEqual(set(closestCenter(airport, p, 360.0).runwayCode for p in points), set(['36R']))
+
+        assigned = corridorsOf(airport).assign(toVectors(points), [360.0] * len(points), RUNWAY_SELECTION_INDICATOR)
+        self.assertEqual(assigned.tolist(), [0] * len(points))
+        assigned = corridorsOf(airport).assign(toVectors(finalApproach(south, [0.2, 0.6, 1.0])), [360.0] * 3, RUNWAY_SELECTION_INDICATOR)
+        self.assertEqual(assigned.tolist(), [1] * 3)
+    # end def testStaggeredParallelRunways()
+
+# end class RunwayCorridorsTest
+
+
+if __name__ == '__main__':
+    unittest.main()
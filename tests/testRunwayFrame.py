@@ -0,0 +1,108 @@
+import unittest
+import numpy as np
+from Airport import Airport
+from FlightAnalysis import (
+    FlightAnalyzer, DEFAULT_THRESHOLDS, EARTH_RADIUS_FEET, EARTH_RADIUS_MILES, APPROACH_MIN_DISTANCE, RUNWAY_FRAME_TOLERANCE
+)
+from Runway import Runway
+from RunwayFrame import RunwayFrame
+from tests.support import airportDatabase
+
+
+LATITUDES = [-70, -45, -15, 0, 30, 47.95, 64, 75]
+HEADINGS = [0, 45, 137, 270, 359]
+MILE_IN_FEET = float(EARTH_RADIUS_FEET) / EARTH_RADIUS_MILES
+
+
+def approachLayout(lat, heading, offset=0.5):
+    '''
+    @param: offset miles between the airport's center and the runway's center
+    @return: (Airport, Runway) with the runway's center offset miles from the airport's
+    '''
+    airport = Airport('T%g' % lat, 'Test', 'Test', 'TT', lat, -97.0, 800.0)
+    center = airport.centerLatLon.destinationPoint(offset, heading + 60, EARTH_RADIUS_MILES)
+    runway = Runway(airport.code, 800.0, '%02d' % (heading / 10), heading, heading, center.lat, center.lon)
+    airport.addRunway(runway)
+    return airport, runway
+# end def approachLayout()
+
+
+def approachPoints(airport, reach):
+    '''
+    @return: LatLons of a polar grid of points out to reach miles from the airport's center
+    '''
+    return [
+        airport.centerLatLon.destinationPoint(distance, bearing, EARTH_RADIUS_MILES)
+        for distance in np.linspace(0.0, reach, 9)
+        for bearing in xrange(0, 360, 15)
+    ]
+# end def approachPoints()
+
+
+class RunwayFrameTest(unittest.TestCase):
+
+    def testWithinToleranceOfSphericalFunctions(self):
+        reach = float(APPROACH_MIN_DISTANCE) / EARTH_RADIUS_MILES
+        for lat in LATITUDES:
+            for heading in HEADINGS:
+                airport, runway = approachLayout(lat, heading)
+                frame = RunwayFrame(runway, airport)
+                bound = frame.maxError(reach) * EARTH_RADIUS_FEET
+                self.assertLessEqual(bound, RUNWAY_FRAME_TOLERANCE)
+
+                for point in approachPoints(airport, APPROACH_MIN_DISTANCE):
+                    p = point.toVector()
+                    crossTrack = point.crossTrackDistanceTo(runway.centerLatLon, runway.trueHeading, EARTH_RADIUS_FEET)
+                    distance = point.distanceTo(airport.centerLatLon, EARTH_RADIUS_FEET)
+                    crossTrackError = abs(frame.crossTrack(p.x, p.y, p.z) * EARTH_RADIUS_FEET - crossTrack)
+                    distanceError = abs(frame.distanceToAirport(p.x, p.y, p.z) * EARTH_RADIUS_FEET - distance)
+                    self.assertLessEqual(crossTrackError, bound, (lat, heading, point.lat, point.lon))
+                    self.assertLessEqual(distanceError, bound, (lat, heading, point.lat, point.lon))
+                # end for
+            # end for
+        # end for
+    # end def testWithinToleranceOfSphericalFunctions()
+
+    def testVectorizedFormsMatch(self):
+        airport, runway = approachLayout(47.95, 137)
+        frame = RunwayFrame(runway, airport)
+        points = [point.toVector() for point in approachPoints(airport, APPROACH_MIN_DISTANCE)]
+        v = np.array([[p.x for p in points], [p.y for p in points], [p.z for p in points]])
+        np.testing.assert_allclose(frame.crossTracks(v), [frame.crossTrack(p.x, p.y, p.z) for p in points], rtol=0, atol=1e-15)
+        np.testing.assert_allclose(frame.distancesToAirport(v), [frame.distanceToAirport(p.x, p.y, p.z) for p in points], rtol=0, atol=1e-15)
+    # end def testVectorizedFormsMatch()
+
+    def testAnalyzerFallsBackBeyondTolerance(self):
+        database = airportDatabase()
+        analyzer = FlightAnalyzer(None, database, airportIndex=database.index)
+
+        airport, runway = approachLayout(47.95, 137)
+        self.assertIsNotNone(analyzer.runwayFrame(runway, airport))
+        self.assertIsNone(analyzer.runwayFrame(None, airport))
+
+        # A runway far from its airport's center, or a reach of many miles, is off by more than the tolerance
+        farAirport, farRunway = approachLayout(30, 270, offset=20.0)
+        self.assertGreater(RunwayFrame(farRunway, farAirport).maxError(float(APPROACH_MIN_DISTANCE) / EARTH_RADIUS_MILES) * EARTH_RADIUS_FEET,
+                           RUNWAY_FRAME_TOLERANCE)
+        self.assertIsNone(analyzer.runwayFrame(farRunway, farAirport))
+
+        analyzer.setThresholds(DEFAULT_THRESHOLDS._replace(minDistance=30))
+        self.assertIsNone(analyzer.runwayFrame(runway, airport))
+
+        # Without a frame the spherical functions are used
+        point = farAirport.centerLatLon.destinationPoint(3.0, 200, EARTH_RADIUS_MILES)
+        self.assertAlmostEqual(
+            analyzer.crossTrackToCenterLine(point, farRunway, None),
+            point.crossTrackDistanceTo(farRunway.centerLatLon, farRunway.trueHeading, EARTH_RADIUS_FEET), places=6
+        )
+        self.assertAlmostEqual(
+            analyzer.distanceToAirport(point, farAirport, None) * MILE_IN_FEET,
+            point.distanceTo(farAirport.centerLatLon, EARTH_RADIUS_FEET), places=3
+        )
+    # end def testAnalyzerFallsBackBeyondTolerance()
+
+# end class RunwayFrameTest
+
+
+if __name__ == '__main__':
+    unittest.main()
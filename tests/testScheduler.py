@@ -0,0 +1,62 @@
+import multiprocessing
+import time
+import unittest
+from Scheduler import Scheduler
+
+
+def exitAtOnce(inbox, outbox, worker):
+    pass
+# end def exitAtOnce()
+
+
+def neverReport(inbox, outbox, worker):
+    time.sleep(60)
+# end def neverReport()
+
+
+def reportEveryChunk(inbox, outbox, worker):
+    for flightIDs in iter(inbox.get, None):
+        outbox.put((worker, 0.0, None))
+# end def reportEveryChunk()
+
+
+class SchedulerTest(unittest.TestCase):
+    '''
+    Runs the Scheduler with stand-in workers, which get their inbox, the outbox and their number.
+    '''
+
+    def start(self, scheduler, targets):
+        workers = [
+            multiprocessing.Process(target=target, args=(scheduler.inboxes[n], scheduler.outbox, n))
+            for n, target in enumerate(targets)
+        ]
+        for worker in workers:
+            worker.start()
+        return workers
+    # end def start()
+
+    def testRunsEveryChunk(self):
+        scheduler = Scheduler(2, chunkRows=10)
+        workers = self.start(scheduler, [reportEveryChunk, reportEveryChunk])
+        scheduler.run([(flightID, flightID) for flightID in xrange(1, 20)], workers)
+        for worker in workers:
+            worker.join(5)
+            self.assertFalse(worker.is_alive())
+        self.assertEqual(sum(stats.flights for stats in scheduler.stats), 19)
+    # end def testRunsEveryChunk()
+
+    def testDeadWorkerStopsTheOthers(self):
+        scheduler = Scheduler(2, chunkRows=10)
+        workers = self.start(scheduler, [exitAtOnce, neverReport])
+        self.assertRaises(RuntimeError, scheduler.run, [(flightID, 10) for flightID in xrange(1, 9)], workers)
+        # The live worker was terminated instead of being left waiting for chunks
+        workers[1].join(5)
+        self.assertFalse(workers[1].is_alive())
+        workers[0].join(5)
+    # end def testDeadWorkerStopsTheOthers()
+
+# end class SchedulerTest
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+from FlightAnalysis import DEFAULT_THRESHOLDS
+from ThresholdSweep import ThresholdGrid, SweepAnalyzer, CONDITIONS
+from VectorizedAnalysis import VectorizedFlightAnalyzer
+from tests.support import airportDatabase, generatedFlights, analyzeAll, SYNTHETIC_AIRCRAFT_TYPE
+
+
+# Columns of an approaches row that are NULL unless the approach failed F1, F2, A and S, see approachRow()
+CONDITION_COLUMNS = dict(zip(CONDITIONS, [11, 13, 15, 17]))
+
+
+def sweep(flights, values):
+    '''
+    @return: the SweepSummary of sweeping the grid of the given values over the flights
+    '''
+    database = airportDatabase()
+    analyzer = SweepAnalyzer(None, database, ThresholdGrid(values), airportIndex=database.index)
+    for flightID, _, columns in flights:
+        analyzer.analyze(flightID, SYNTHETIC_AIRCRAFT_TYPE, analyzer.loadFlightData(columns))
+    return analyzer.summary
+# end def sweep()
+
+
+class ThresholdSweepTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.flights = generatedFlights(count=6, circuits=5, seed=3)
+    # end def setUpClass()
+
+    def assertMatchesRun(self, summary, k, thresholds):
+        '''
+        Checks set k of the summary against the rows of a plain vectorized run with the given thresholds.
+        '''
+        rows = analyzeAll(VectorizedFlightAnalyzer, self.flights, thresholds=thresholds)
+        self.assertEqual(summary.approaches, len(rows))
+        self.assertEqual(summary.unstable[k], sum(row[9] for row in rows))
+        for condition, column in CONDITION_COLUMNS.iteritems():
+            self.assertEqual(summary.failed[condition][k], sum(row[column] is not None for row in rows), condition)
+    # end def assertMatchesRun()
+
+    def testOnePointGridMatchesVectorizedRun(self):
+        summary = sweep(self.flights, {})
+        self.assertEqual(len(summary.grid), 1)
+        self.assertGreater(summary.unstable[0], 0)  # The flights have unstable finals to tell apart
+        self.assertMatchesRun(summary, 0, DEFAULT_THRESHOLDS)
+    # end def testOnePointGridMatchesVectorizedRun()
+
+    def testEverySetMatchesItsOwnRun(self):
+        values = {'maxHeadingError': [5, 15], 'maxCrossTrackError': [25], 'minIAS': [50, 60], 'minVSI': [-800]}
+        summary = sweep(self.flights, values)
+        self.assertEqual(len(summary.grid), 4)
+        for k, overrides in enumerate(summary.grid.sets):
+            self.assertMatchesRun(summary, k, DEFAULT_THRESHOLDS._replace(**overrides))
+    # end def testEverySetMatchesItsOwnRun()
+
+    def testUnknownFieldsAreRejected(self):
+        self.assertRaises(ValueError, ThresholdGrid.parse, ['minDistance=1,2'])
+        self.assertRaises(ValueError, ThresholdGrid.parse, ['maxIAS=fast'])
+    # end def testUnknownFieldsAreRejected()
+
+# end class ThresholdSweepTest
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import unittest
+from decimal import Decimal
+from DataSource import openDataSource
+from FlightAnalysis import DEFAULT_THRESHOLDS
+from Thresholds import Thresholds, ThresholdProfiles, COLUMNS
+from tests.support import temporaryDatabase
+
+
+def insertThresholds(source, aircraftType, **values):
+    '''
+    Inserts or replaces the aircraft type's row of exceedance_thresholds, with the given columns and the others NULL.
+    '''
+    columns = ['aircraft_id'] + sorted(values.keys())
+    source.execute(
+        source.cursor(), "REPLACE INTO exceedance_thresholds (%s) VALUES (%s);" % (', '.join(columns), ', '.join(['%s'] * len(columns))),
+        [aircraftType] + [values[column] for column in columns[1:]]
+    )
+    source.connection.commit()
+# end def insertThresholds()
+
+
+class ThresholdsTest(unittest.TestCase):
+
+    def testNullColumnsTakeTheDefault(self):
+        thresholds = Thresholds.fromRow({'aircraft_id': 7, 'approach_max_ias': 80, 'approach_min_vas': None}, DEFAULT_THRESHOLDS)
+        self.assertEqual(thresholds, DEFAULT_THRESHOLDS._replace(maxIAS=80))
+    # end def testNullColumnsTakeTheDefault()
+
+    def testValuesAreFloats(self):
+        # MySQLdb returns DECIMAL columns as Decimals, which do not mix with floats
+        row = dict((column, Decimal('2.5')) for _, column in COLUMNS)
+        row['approach_min_ias'] = None
+        thresholds = Thresholds.fromRow(row, DEFAULT_THRESHOLDS)
+        self.assertEqual(set(type(value) for value in thresholds), set([float]))
+        self.assertEqual(thresholds.minIAS, DEFAULT_THRESHOLDS.minIAS)
+        self.assertEqual(thresholds.minDistance + 1.5, 4.0)
+    # end def testValuesAreFloats()
+
+# end class ThresholdsTest
+
+
+class ThresholdProfilesTest(unittest.TestCase):
+
+    def testForAircraft(self):
+        profiles = ThresholdProfiles.fromRows([{'aircraft_id': 1, 'approach_min_ias': 60}], DEFAULT_THRESHOLDS)
+        self.assertEqual(len(profiles), 1)
+        self.assertEqual(profiles.forAircraft(1).minIAS, 60)
+        self.assertIs(profiles.forAircraft(2), DEFAULT_THRESHOLDS)
+        self.assertIs(profiles.forAircraft(None), DEFAULT_THRESHOLDS)
+    # end def testForAircraft()
+
+    def testRefreshed(self):
+        with temporaryDatabase() as spec:
+            source = openDataSource(spec)
+            insertThresholds(source, 1, approach_min_ias=60, approach_max_ias=80)
+            insertThresholds(source, 2, approach_max_heading_error=15)
+            profiles = ThresholdProfiles.load(source, DEFAULT_THRESHOLDS)
+            self.assertEqual(len(profiles), 2)
+
+            # Unchanged rows keep the very same profiles, so the analyzers keep their grids, without being read again
+            fetches = []
+            fetchAllThresholds = source.fetchAllThresholds
+            source.fetchAllThresholds = lambda: fetches.append(1) or fetchAllThresholds()
+            self.assertIs(profiles.refreshed(source), profiles)
+            self.assertEqual(fetches, [])
+
+            insertThresholds(source, 1, approach_min_ias=65, approach_max_ias=80)
+            refreshed = profiles.refreshed(source)
+            self.assertIsNot(refreshed, profiles)
+            self.assertEqual(refreshed.forAircraft(1).minIAS, 65)
+            self.assertEqual(refreshed.forAircraft(2).maxHeadingError, 15)
+            self.assertEqual(fetches, [1])
+            self.assertIs(refreshed.refreshed(source), refreshed)
+
+            # A column set to NULL, and a new row
+            insertThresholds(source, 1, approach_min_ias=65)
+            self.assertEqual(refreshed.refreshed(source).forAircraft(1).maxIAS, DEFAULT_THRESHOLDS.maxIAS)
+            insertThresholds(source, 3, approach_min_distance=2)
+            self.assertEqual(refreshed.refreshed(source).forAircraft(3).minDistance, 2)
+            source.close()
+    # end def testRefreshed()
+
+# end class ThresholdProfilesTest
+
+
+if __name__ == '__main__':
+    unittest.main()